@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from ai_service import call_openrouter_api
+from ai_service import call_openrouter_api, run_llm_task
 
 router = APIRouter()
 
@@ -28,7 +28,7 @@ async def chat_with_ai(request: ChatRequest):
             messages.insert(1, {"role": "assistant", "content": request.context})
         
         # 调用OpenRouter API
-        response_data = call_openrouter_api(messages)
+        response_data = await run_llm_task(call_openrouter_api, messages, task="chat")
         
         # 提取回复内容
         if response_data and "choices" in response_data and len(response_data["choices"]) > 0:
@@ -1,11 +1,19 @@
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Tuple
+import asyncio
+import functools
 import os
 import json
 import requests
 import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
-from logger_config import main_logger as logger, ai_response_logger
-from openai import OpenAI
+from logger_config import main_logger as logger, log_ai_response
+from openai import OpenAI, BadRequestError, RateLimitError, APIStatusError, APIConnectionError, APITimeoutError
+from rate_limiter import AdaptiveRateLimiter, RetryableError, parse_retry_after
+from response_parser import extract_json, remove_span, parse_markdown_tables
+from metrics import JSON_PARSE_FAILURES, LLM_CALLS, LLM_IN_FLIGHT, LLM_REQUEST_SECONDS, LLM_TOKENS, QUEUE_DEPTH
+from analysis_schema import GENERAL_INFO_FIELDS, build_json_schema, find_invalid_fields
 
 # 指定环境变量文件路径
 env_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -35,25 +43,188 @@ if not OPENAI_API_KEY:
 OPENAI_SERVICE_TYPE = os.getenv("OPENAI_SERVICE_TYPE")
 OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
 
-def call_openrouter_api(messages: List[Dict[str, str]]) -> Dict:
-    """调用DeepSeek API进行对话"""
-    try:
-        # 初始化OpenAI客户端，使用DeepSeek API
-        client = OpenAI(
+# 模型路由：每类任务使用各自的模型、温度和最大输出Token数，未配置时使用上面的全局配置
+# 任务类型：general_info（通用信息）、activity_data（活性数据）、batch（短文献批量分析）、chat（聊天）
+# escalation 为校验失败时升级使用的强模型
+MODEL_TASK_TYPES = ["general_info", "activity_data", "batch", "chat", "escalation"]
+
+def _load_model_route(task: str) -> Dict:
+    suffix = task.upper()
+    max_tokens = os.getenv(f"AI_MAX_TOKENS_{suffix}")
+    temperature = os.getenv(f"AI_TEMPERATURE_{suffix}")
+    return {
+        "model": os.getenv(f"AI_MODEL_{suffix}") or OPENAI_SERVICE_TYPE,
+        "temperature": float(temperature) if temperature else OPENAI_TEMPERATURE,
+        "max_tokens": int(max_tokens) if max_tokens else None
+    }
+
+MODEL_ROUTES = {task: _load_model_route(task) for task in MODEL_TASK_TYPES}
+# 只有显式配置了强模型时才会升级
+ESCALATION_ENABLED = bool(os.getenv("AI_MODEL_ESCALATION"))
+
+def get_model_route(task: str, escalate: bool = False) -> Dict:
+    """获取任务对应的模型配置
+
+    Args:
+        task: 任务类型
+        escalate: 是否升级到强模型（未配置 AI_MODEL_ESCALATION 时保持原模型）
+    """
+    route = dict(MODEL_ROUTES.get(task, MODEL_ROUTES["chat"]))
+    if escalate and ESCALATION_ENABLED:
+        escalation = MODEL_ROUTES["escalation"]
+        route["model"] = escalation["model"]
+        route["temperature"] = escalation["temperature"]
+        route["max_tokens"] = escalation["max_tokens"] or route["max_tokens"]
+    return route
+
+# 结构化输出模式：json_schema / json_object / none
+OPENAI_STRUCTURED_OUTPUT = os.getenv("OPENAI_STRUCTURED_OUTPUT", "json_object").lower()
+# 字段级重试次数，以及重试时附带的文献节选长度
+FIELD_RETRY_ATTEMPTS = int(os.getenv("FIELD_RETRY_ATTEMPTS", "1"))
+FIELD_RETRY_EXCERPT_CHARS = int(os.getenv("FIELD_RETRY_EXCERPT_CHARS", "12000"))
+
+# 接口限流配置：每分钟请求数/Token数（0表示不限制）、最大并发、重试与退避
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+
+# 短文献批量分析（可选）：单篇文本不超过 AI_BATCH_SHORT_DOC_CHARS 时与其他短文献合并为一次请求
+AI_BATCH_ENABLED = os.getenv("AI_BATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+AI_BATCH_MAX_DOCS = int(os.getenv("AI_BATCH_MAX_DOCS", "4"))
+AI_BATCH_MAX_CHARS = int(os.getenv("AI_BATCH_MAX_CHARS", "60000"))
+AI_BATCH_SHORT_DOC_CHARS = int(os.getenv("AI_BATCH_SHORT_DOC_CHARS", "20000"))
+AI_BATCH_WAIT_SECONDS = float(os.getenv("AI_BATCH_WAIT_SECONDS", "3"))
+# 等待批量分析结果的最长秒数，超时后回退到单篇分析
+AI_BATCH_RESULT_TIMEOUT = float(os.getenv("AI_BATCH_RESULT_TIMEOUT", "600"))
+
+# 接口拒绝 response_format 参数后不再重复尝试
+_structured_output_supported = True
+
+# 所有AI调用共享的限流器
+rate_limiter = AdaptiveRateLimiter(
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_retries=LLM_MAX_RETRIES,
+    backoff_base=LLM_BACKOFF_BASE,
+    backoff_max=LLM_BACKOFF_MAX
+)
+
+# AI调用专用线程池，线程数与并发上限一致：限流等待和退避只占用这里的线程，不影响默认线程池
+llm_executor = ThreadPoolExecutor(max_workers=max(1, LLM_MAX_CONCURRENCY), thread_name_prefix="llm")
+
+async def run_llm_task(func: Callable, *args, **kwargs):
+    """在AI调用专用线程池中执行同步的AI调用函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(llm_executor, functools.partial(func, *args, **kwargs))
+
+# 共享的OpenAI客户端，重试由限流器统一处理
+_client: Optional[OpenAI] = None
+
+def _get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        _client = OpenAI(
             api_key=OPENAI_API_KEY,
-            base_url=OPENAI_API_ENDPOINT
+            base_url=OPENAI_API_ENDPOINT,
+            max_retries=0
         )
+    return _client
+
+def _estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """粗略估算请求的Token数（中英文混合文本按每2个字符1个Token计算）"""
+    return sum(len(message.get("content") or "") for message in messages) // 2
+
+def _create_completion(client: OpenAI, **kwargs):
+    """发起一次请求，将可重试的错误转换为 RetryableError"""
+    try:
+        return client.chat.completions.create(**kwargs)
+    except RateLimitError as e:
+        raise RetryableError(f"429 限流: {str(e)}", parse_retry_after(e.response.headers.get("retry-after")), throttled=True)
+    except APIStatusError as e:
+        if e.status_code >= 500:
+            raise RetryableError(f"{e.status_code} 服务端错误: {str(e)}", parse_retry_after(e.response.headers.get("retry-after")))
+        raise
+    except (APIConnectionError, APITimeoutError) as e:
+        raise RetryableError(f"连接错误: {str(e)}")
+
+def _rejects_response_format(error: BadRequestError) -> bool:
+    """400错误是否是接口拒绝了 response_format 参数（其他400错误如上下文超长不属于此类）"""
+    details = f"{str(error)} {json.dumps(error.body, ensure_ascii=False, default=str) if error.body else ''}".lower()
+    return any(keyword in details for keyword in ("response_format", "json_schema", "json_object"))
+
+def _build_response_format(fields: List[str]) -> Optional[Dict]:
+    """根据配置构建结构化输出参数"""
+    if not _structured_output_supported:
+        return None
+    if OPENAI_STRUCTURED_OUTPUT == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "literature_analysis", "schema": build_json_schema(fields)}
+        }
+    if OPENAI_STRUCTURED_OUTPUT == "json_object":
+        return {"type": "json_object"}
+    return None
+
+def call_openrouter_api(messages: List[Dict[str, str]], response_format: Optional[Dict] = None,
+                        task: str = "chat", escalate: bool = False) -> Dict:
+    """调用DeepSeek API进行对话
+
+    Args:
+        messages: 对话消息列表
+        response_format: 可选的结构化输出参数，接口不支持时自动降级为普通输出
+        task: 任务类型，决定使用的模型、温度和最大输出Token数
+        escalate: 是否升级到强模型
+    """
+    try:
+        client = _get_client()
         
         # 调用DeepSeek API
-        response = client.chat.completions.create(
-            model=OPENAI_SERVICE_TYPE,
-            messages=messages,
-            temperature=OPENAI_TEMPERATURE,
-            stream=False
-        )
+        route = get_model_route(task, escalate)
+        request_kwargs = {
+            "model": route["model"],
+            "messages": messages,
+            "temperature": route["temperature"],
+            "stream": False
+        }
+        if route["max_tokens"]:
+            request_kwargs["max_tokens"] = route["max_tokens"]
+
+        def send_request():
+            global _structured_output_supported
+            # 每次实际请求的耗时，不含限流等待和退避
+            with LLM_REQUEST_SECONDS.labels(task).time():
+                if response_format and _structured_output_supported:
+                    try:
+                        return _create_completion(client, response_format=response_format, **request_kwargs)
+                    except BadRequestError as e:
+                        if not _rejects_response_format(e):
+                            raise
+                        logger.warning(f"接口不支持结构化输出 {response_format.get('type')}，降级为普通输出: {str(e)}")
+                        _structured_output_supported = False
+                return _create_completion(client, **request_kwargs)
+
+        try:
+            response = rate_limiter.call(
+                send_request,
+                estimated_tokens=_estimate_tokens(messages) + (route["max_tokens"] or 0),
+                usage_tokens=lambda result: result.usage.total_tokens if result.usage else 0
+            )
+        except Exception:
+            LLM_CALLS.labels(task, "error").inc()
+            raise
+        LLM_CALLS.labels(task, "success").inc()
+        if response.usage:
+            LLM_TOKENS.labels(task, "prompt").observe(response.usage.prompt_tokens or 0)
+            LLM_TOKENS.labels(task, "completion").observe(response.usage.completion_tokens or 0)
         
         # 转换响应格式以保持与原有代码的兼容性
         return {
+            "model": route["model"],
+            "task": task,
             "choices": [{
                 "message": {
                     "content": response.choices[0].message.content,
@@ -74,19 +245,8 @@ def call_openrouter_api(messages: List[Dict[str, str]]) -> Dict:
         logger.error(f"API call failed: {type(e).__name__} - {str(e)}", exc_info=True)
         raise
 
-def analyze_document_content(document_content: str) -> Dict:
-    """分析文档内容并返回结构化结果，通过两次AI调用分离活性数据。"""
-    logger.info("开始执行 ai_service.analyze_document_content (两步调用)")
-    
-    # 初始化最终结果
-    final_result = {}
-    activity_data_markdown_part = ""
-
-    # --- 第一次AI调用：获取除活性数据外的所有信息 --- 
-    try:
-        logger.info("准备第一次AI调用：提取通用信息")
-        prompt_general_info = f"""
-        请分析以下科研文献，提取除活性数据之外的关键信息：
+# 通用信息各字段的提取要求（单篇分析和批量分析共用）
+GENERAL_INFO_INSTRUCTIONS = """\
         1. 文献标题
         2. 作者列表
         3. 发表期刊/会议
@@ -99,7 +259,386 @@ def analyze_document_content(document_content: str) -> Dict:
         10. 主要founded发现
         11. 结论
         12. 实验价值与启示：你是一名从事热催化的研究者，这篇文献对你在催化剂的理解上，以及催化剂制备法上，以及表征手段上有哪些启示，你在这其中学到了什么，输出一段条理清晰的文字
-        请以纯粹的JSON格式返回结果，不包含任何额外的文本、解释或Markdown代码块（例如 ```json ）。结果必须是一个有效的JSON对象，包含以上所有字段。对于催化剂制备法、表征手段及结论、结论和实验价值与启示，请尽可能详细提取并结构化。
+"""
+
+# 活性数据表格中"活性数值"和"备注"列的填写规则
+ACTIVITY_VALUE_RULES = """\
+    关于"活性数值"列：
+    - 仅填写文本中明确给出的具体数值。如果活性数据是模糊描述（例如“低于A催化剂”、“高于B催化剂”、“没有明确数值”等），请将"活性数值"列留空。
+
+    关于"备注"列：
+    - 如果"活性数值"列因模糊描述而留空，请将该模糊描述或相关说明详细填写在"备注"列中。
+    - 对于有明确"活性数值"的行，"备注"列可以留空或填写其他相关补充信息。
+"""
+
+def _is_activity_json(value) -> bool:
+    """判断解析出的JSON是否为活性数据结构"""
+    if isinstance(value, dict):
+        return isinstance(value.get('活性数据'), list)
+    # 空数组或非对象元素多半是正文中的方括号，而不是活性数据
+    return isinstance(value, list) and bool(value) and all(isinstance(row, dict) for row in value)
+
+def _document_excerpt(document_content: str, limit: int = FIELD_RETRY_EXCERPT_CHARS) -> str:
+    """截取文献开头和结尾部分，供字段级重试使用"""
+    if len(document_content) <= limit:
+        return document_content
+    head = limit * 2 // 3
+    return f"{document_content[:head]}\n...（中间部分省略）...\n{document_content[-(limit - head):]}"
+
+def request_fields(document_content: str, invalid_fields: Dict[str, str], previous_response: str = "",
+                   attempts: int = FIELD_RETRY_ATTEMPTS,
+                   excerpt_chars: Optional[int] = FIELD_RETRY_EXCERPT_CHARS,
+                   task: str = "general_info") -> Dict:
+    """仅针对缺失或无效的字段发起小规模追加请求
+
+    Args:
+        document_content: 文献内容（默认只截取节选发送）
+        invalid_fields: 字段名到问题描述的映射
+        previous_response: 上一次AI响应，供模型修正格式时参考
+        attempts: 最多重试次数
+        excerpt_chars: 文献节选字符数，为None时发送完整文献
+        task: 原始请求的任务类型，重试时在该任务的基础上升级到强模型
+
+    Returns:
+        Dict: 校验通过的字段
+    """
+    repaired = {}
+    pending = dict(invalid_fields)
+    excerpt = document_content if excerpt_chars is None else _document_excerpt(document_content, excerpt_chars)
+    for attempt in range(attempts):
+        if not pending:
+            break
+        fields = list(pending)
+        logger.info(f"字段级重试 ({attempt + 1}/{attempts})：{fields}")
+        field_lines = "\n".join(f"- {field}：{reason}" for field, reason in pending.items())
+        schema = json.dumps(build_json_schema(fields), ensure_ascii=False)
+        previous_part = f"\n上一次的响应（可能格式有误，可参考其中已有内容）：\n{previous_response[:4000]}\n" if previous_response else ""
+        prompt_fields = f"""
+        上一次文献分析结果中以下字段缺失或不符合要求：
+{field_lines}
+        请仅重新提取这些字段，以纯粹的JSON对象返回，键名必须与上面的字段名完全一致，不要包含其他字段或任何额外文本。
+        字段要求（JSON Schema）：{schema}
+{previous_part}
+文献节选：
+        {excerpt}
+        """
+        messages_fields = [
+            {"role": "system", "content": "You are a professional chemistry literature analysis assistant"},
+            {"role": "user", "content": prompt_fields}
+        ]
+        try:
+            # 字段级重试说明前一次输出未通过校验，升级到强模型
+            response_fields = call_openrouter_api(messages_fields, _build_response_format(fields), task=task, escalate=True)
+            log_ai_response("Raw AI Response (Field Retry)", response_fields)
+            fields_content = response_fields["choices"][0]["message"]["content"]
+        except Exception as e:
+            logger.error(f"字段级重试调用失败: {str(e)}")
+            continue
+        parsed_fields, _ = extract_json(fields_content, lambda value: isinstance(value, dict))
+        if parsed_fields is None:
+            JSON_PARSE_FAILURES.labels("field_retry").inc()
+        still_invalid = find_invalid_fields(parsed_fields, fields)
+        for field in fields:
+            if field not in still_invalid:
+                repaired[field] = parsed_fields[field]
+        pending = still_invalid
+        previous_response = fields_content
+    if pending:
+        logger.warning(f"字段级重试后仍有字段缺失或无效: {pending}")
+    return repaired
+
+def parse_activity_response(activity_full_content: str) -> Tuple[Optional[List], str]:
+    """解析活性数据调用的响应，分离JSON活性数据和Markdown表格
+
+    Returns:
+        (活性数据列表，未解析出时为None, Markdown部分)
+    """
+    # 优先提取JSON部分：包含 '活性数据' 数组的对象，或直接返回的数组
+    activity_json, activity_json_span = extract_json(activity_full_content, _is_activity_json)
+    parsed_activity_json_data = None
+    if isinstance(activity_json, dict):
+        parsed_activity_json_data = activity_json['活性数据']
+    elif isinstance(activity_json, list):
+        parsed_activity_json_data = activity_json
+
+    # JSON之外的部分中提取Markdown表格
+    remaining_content = remove_span(activity_full_content, activity_json_span)
+    markdown_tables = parse_markdown_tables(remaining_content)
+    if markdown_tables:
+        activity_data_markdown_part = markdown_tables[0]["markdown"]
+    else:
+        # 没有表格时保留JSON之外的全部内容
+        activity_data_markdown_part = remaining_content
+
+    if parsed_activity_json_data is None:
+        JSON_PARSE_FAILURES.labels("activity_data").inc()
+        if markdown_tables and markdown_tables[0]["rows"]:
+            # JSON提取失败时使用Markdown表格中的行作为活性数据，避免整体丢弃
+            parsed_activity_json_data = markdown_tables[0]["rows"]
+            logger.warning("未能从AI响应中提取JSON部分，已使用Markdown表格中的活性数据。")
+        else:
+            logger.warning("未能从AI响应中提取JSON部分或Markdown表格，将整个响应视为Markdown。")
+
+    return parsed_activity_json_data, activity_data_markdown_part
+
+def extract_activity_data(document_content: str, escalate: bool = False) -> Tuple[Optional[List], str]:
+    """调用AI专门提取活性数据
+
+    Args:
+        document_content: 文献内容
+        escalate: 是否升级到强模型
+
+    Returns:
+        (活性数据列表，未解析出时为None, Markdown部分)
+    """
+    prompt_activity_data = f"""
+    请分析以下科研文献，专门提取“活性数据”。你需要严格按照以下格式输出两次活性数据：
+
+    1.  **JSON格式的活性数据**：首先，请提供一个独立的、完整的JSON结构（可以是一个JSON对象，其中包含一个名为 '活性数据' 的数组，或者直接是一个JSON数组），专门包含这些活性数据。确保此JSON结构可以被程序直接解析。
+
+    2.  **Markdown格式的活性数据表格**：接着，请提供一个独立的Markdown表格，详细列出活性数据，包括但不限于催化剂名称、活性数值、单位、测试温度、测试压力、主要结果和备注。
+{ACTIVITY_VALUE_RULES}
+    请确保表格数据准确、完整，并严格遵循上述规则。请确保Markdown表格的每一行（包括表头和分隔线）都以 `|` 开始和结束，例如：
+        ```
+        | 列1 |
+        |---|
+        | 值1 |
+        ```
+
+    请确保JSON结构和Markdown表格是严格分开的，并且都是完整和准确的。
+
+文献内容：
+    {document_content}
+    """
+    messages_activity = [
+        {"role": "system", "content": "You are a professional chemistry literature analysis assistant"},
+        {"role": "user", "content": prompt_activity_data}
+    ]
+
+    response_activity = call_openrouter_api(messages_activity, task="activity_data", escalate=escalate)
+    logger.info("第二次AI调用完成（活性数据）")
+    log_ai_response("Raw AI Response (Activity Data)", response_activity)
+
+    activity_full_content = response_activity["choices"][0]["message"]["content"]
+    return parse_activity_response(activity_full_content)
+
+def analyze_items(document_content: str, items: List[str]) -> Dict:
+    """仅针对指定的分析项目发起定向请求，用于部分重新分析
+
+    Args:
+        document_content: 文献内容
+        items: 需要重新提取的分析项目
+
+    Returns:
+        Dict: 成功提取且校验通过的项目；提取到活性数据时同时包含 activity_data_markdown
+    """
+    logger.info(f"开始执行 ai_service.analyze_items，项目: {items}")
+    result = {}
+    general_items = [item for item in items if item in GENERAL_INFO_FIELDS]
+    if general_items:
+        result.update(request_fields(
+            document_content,
+            {item: "上次分析中被跳过，需要重新提取" for item in general_items},
+            attempts=FIELD_RETRY_ATTEMPTS + 1,
+            excerpt_chars=None
+        ))
+    if "活性数据" in items:
+        try:
+            activity_data, activity_markdown = extract_activity_data(document_content)
+            if isinstance(activity_data, list) and activity_data:
+                result["活性数据"] = activity_data
+                result["activity_data_markdown"] = activity_markdown
+        except Exception as e:
+            logger.error(f"定向提取活性数据失败: {str(e)}", exc_info=True)
+    logger.info(f"定向分析完成，成功提取的项目: {list(result)}")
+    return result
+
+_BATCH_SECTION_RE = re.compile(r'^\s*<<<文献\s*(\d+)>>>\s*$', re.MULTILINE)
+
+def _split_batch_response(content: str) -> Dict[int, str]:
+    """按 <<<文献 N>>> 分隔标记拆分批量响应"""
+    sections = {}
+    markers = list(_BATCH_SECTION_RE.finditer(content))
+    for idx, marker in enumerate(markers):
+        end = markers[idx + 1].start() if idx + 1 < len(markers) else len(content)
+        sections[int(marker.group(1))] = content[marker.end():end]
+    return sections
+
+def _parse_batch_section(section: str) -> Optional[Dict]:
+    """解析批量响应中单篇文献的部分，无法解析时返回None"""
+    parsed, json_span = extract_json(section, lambda value: isinstance(value, dict))
+    if parsed is None:
+        JSON_PARSE_FAILURES.labels("batch").inc()
+        return None
+    result = dict(parsed)
+    activity_data = result.get("活性数据")
+    markdown_tables = parse_markdown_tables(remove_span(section, json_span))
+    if not isinstance(activity_data, list):
+        activity_data = markdown_tables[0]["rows"] if markdown_tables else []
+    result["活性数据"] = activity_data
+    result["activity_data_markdown"] = markdown_tables[0]["markdown"] if markdown_tables else ""
+    return result
+
+def analyze_document_batch(documents: List[str]) -> List[Optional[Dict]]:
+    """将多篇短文献合并为一次AI请求进行分析
+
+    每篇文献用分隔标记包裹，响应按标记拆分回各篇文献。某篇文献的部分缺失或
+    无法解析时，对应位置返回None，由调用方回退到单篇分析。
+
+    Args:
+        documents: 文献内容列表
+
+    Returns:
+        List[Optional[Dict]]: 与输入顺序一致的分析结果
+    """
+    logger.info(f"开始执行 ai_service.analyze_document_batch，文献数: {len(documents)}")
+    documents_part = "\n\n".join(
+        f"=====文献 {idx} 开始=====\n{content}\n=====文献 {idx} 结束====="
+        for idx, content in enumerate(documents, start=1)
+    )
+    prompt_batch = f"""
+        以下包含 {len(documents)} 篇科研文献，每篇以"=====文献 N 开始====="和"=====文献 N 结束====="分隔。请逐篇独立分析，不要混用不同文献的信息。
+        每篇文献需要提取以下信息：
+{GENERAL_INFO_INSTRUCTIONS}
+        13. 活性数据：包含活性数据的数组，每一项为一个对象
+{ACTIVITY_VALUE_RULES}
+        输出格式要求：
+        - 每篇文献的结果以单独一行 <<<文献 N>>> 开头（N为文献编号），按编号顺序输出全部 {len(documents)} 篇。
+        - 标记之后先给出一个完整的JSON对象，键名严格使用：{json.dumps(GENERAL_INFO_FIELDS + ["活性数据"], ensure_ascii=False)}。
+        - JSON对象之后给出该文献活性数据的Markdown表格，每一行（包括表头和分隔线）都以 `|` 开始和结束。
+
+{documents_part}
+        """
+    messages_batch = [
+        {"role": "system", "content": "You are a professional chemistry literature analysis assistant"},
+        {"role": "user", "content": prompt_batch}
+    ]
+    try:
+        response_batch = call_openrouter_api(messages_batch, task="batch")
+        log_ai_response("Raw AI Response (Batch)", response_batch)
+        batch_content = response_batch["choices"][0]["message"]["content"]
+    except Exception as e:
+        logger.error(f"批量分析调用失败，全部回退到单篇分析: {str(e)}")
+        return [None] * len(documents)
+
+    sections = _split_batch_response(batch_content)
+    results = []
+    for idx in range(1, len(documents) + 1):
+        result = _parse_batch_section(sections[idx]) if idx in sections else None
+        if result is not None and not any(field in result for field in GENERAL_INFO_FIELDS):
+            result = None
+        if result is None:
+            logger.warning(f"批量分析中文献 {idx} 的结果缺失或无法解析，将回退到单篇分析")
+        else:
+            invalid_fields = find_invalid_fields(result, GENERAL_INFO_FIELDS)
+            if invalid_fields:
+                logger.warning(f"批量分析中文献 {idx} 缺失或无效的字段: {invalid_fields}")
+                result.update(request_fields(documents[idx - 1], invalid_fields, sections[idx], task="batch"))
+        results.append(result)
+    return results
+
+class _DocumentBatcher:
+    """收集并发提交的短文献，凑满一批或等待超时后合并为一次请求
+
+    合并后的请求在专用线程池中执行，不占用提交文献的线程或计时器线程。
+    """
+
+    def __init__(self, max_docs: int, max_chars: int, wait_seconds: float, workers: int = 1):
+        self.max_docs = max(1, max_docs)
+        self.max_chars = max_chars
+        self.wait_seconds = wait_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ai-batch")
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, Future]] = []
+        self._pending_chars = 0
+        self._timer: Optional[threading.Timer] = None
+
+    def _take_pending(self) -> List[Tuple[str, Future]]:
+        batch = self._pending
+        self._pending = []
+        self._pending_chars = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush_on_timeout(self):
+        with self._lock:
+            batch = self._take_pending()
+        self._executor.submit(self._run, batch)
+
+    def _run(self, batch: List[Tuple[str, Future]]):
+        if not batch:
+            return
+        if len(batch) == 1:
+            # 只有一篇时没有合并的收益，直接交给单篇分析
+            batch[0][1].set_result(None)
+            return
+        try:
+            results = analyze_document_batch([content for content, _ in batch])
+        except Exception as e:
+            logger.error(f"批量分析出错: {str(e)}", exc_info=True)
+            results = [None] * len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def submit(self, document_content: str) -> Future:
+        """提交一篇短文献，返回的Future结果为None时表示需要回退到单篇分析"""
+        future = Future()
+        ready = []
+        with self._lock:
+            if self._pending and self._pending_chars + len(document_content) > self.max_chars:
+                ready.append(self._take_pending())
+            self._pending.append((document_content, future))
+            self._pending_chars += len(document_content)
+            if len(self._pending) >= self.max_docs:
+                ready.append(self._take_pending())
+            elif self._timer is None:
+                self._timer = threading.Timer(self.wait_seconds, self._flush_on_timeout)
+                self._timer.daemon = True
+                self._timer.start()
+        for batch in ready:
+            self._executor.submit(self._run, batch)
+        return future
+
+_document_batcher = _DocumentBatcher(AI_BATCH_MAX_DOCS, AI_BATCH_MAX_CHARS, AI_BATCH_WAIT_SECONDS, LLM_MAX_CONCURRENCY)
+
+# 输出 /metrics 时读取的队列状态
+LLM_IN_FLIGHT.set_function(lambda: rate_limiter.concurrency.in_flight)
+QUEUE_DEPTH.labels("ai_batch").set_function(lambda: len(_document_batcher._pending))
+
+def analyze_document_content(document_content: str, batch: Optional[bool] = None) -> Dict:
+    """分析文档内容并返回结构化结果，通过两次AI调用分离活性数据。
+
+    batch为True（或未指定且启用了 AI_BATCH_ENABLED）时，短文献会与同时提交的其他
+    短文献合并为一次请求；合并结果中该文献无法解析时回退到单篇的两次调用。
+    """
+    if batch is None:
+        batch = AI_BATCH_ENABLED
+    if batch and len(document_content) <= AI_BATCH_SHORT_DOC_CHARS:
+        try:
+            batch_result = _document_batcher.submit(document_content).result(timeout=AI_BATCH_RESULT_TIMEOUT)
+        except FutureTimeoutError:
+            logger.warning(f"等待批量分析结果超过 {AI_BATCH_RESULT_TIMEOUT} 秒")
+            batch_result = None
+        if batch_result is not None:
+            logger.info("文档已通过批量分析完成")
+            return batch_result
+        logger.info("批量分析未得到该文档的结果，回退到单篇分析")
+
+    logger.info("开始执行 ai_service.analyze_document_content (两步调用)")
+    
+    # 初始化最终结果
+    final_result = {}
+    activity_data_markdown_part = ""
+
+    # --- 第一次AI调用：获取除活性数据外的所有信息 --- 
+    try:
+        logger.info("准备第一次AI调用：提取通用信息")
+        prompt_general_info = f"""
+        请分析以下科研文献，提取除活性数据之外的关键信息：
+{GENERAL_INFO_INSTRUCTIONS}
+        请以纯粹的JSON格式返回结果，不包含任何额外的文本、解释或Markdown代码块（例如 ```json ）。结果必须是一个有效的JSON对象，包含以上所有字段，键名严格使用：{json.dumps(GENERAL_INFO_FIELDS, ensure_ascii=False)}。对于催化剂制备法、表征手段及结论、结论和实验价值与启示，请尽可能详细提取并结构化。
 
 文献内容：
         {document_content}
@@ -109,42 +648,28 @@ def analyze_document_content(document_content: str) -> Dict:
             {"role": "user", "content": prompt_general_info}
         ]
         
-        response_general = call_openrouter_api(messages_general)
-        logger.info(f"第一次AI调用完成. AI原始响应 (通用信息): {json.dumps(response_general, ensure_ascii=False)}")
-        ai_response_logger.info(f"Raw AI Response (General Info): {json.dumps(response_general, ensure_ascii=False)}")
+        response_general = call_openrouter_api(messages_general, _build_response_format(GENERAL_INFO_FIELDS), task="general_info")
+        logger.info("第一次AI调用完成（通用信息）")
+        log_ai_response("Raw AI Response (General Info)", response_general)
 
         general_content = response_general["choices"][0]["message"]["content"]
         
-        # 解析第一次调用的JSON结果
-        parsed_general_json = None
-        json_match_markdown_general = re.search(r'```json\s*([\s\S]*?)\s*```', general_content)
-        if json_match_markdown_general:
-            parsed_general_json_str = json_match_markdown_general.group(1)
-            try:
-                parsed_general_json = json.loads(parsed_general_json_str)
-            except json.JSONDecodeError as e:
-                logger.warning(f"解析第一次调用Markdown代码块中JSON失败: {e}")
-        
+        # 解析第一次调用的JSON结果（单遍扫描，兼容代码块、尾随逗号和截断输出）
+        parsed_general_json, _ = extract_json(general_content, lambda value: isinstance(value, dict))
         if parsed_general_json is None:
-            json_match_regex_general = re.search(r'\{.*\}', general_content, re.DOTALL)
-            if json_match_regex_general:
-                try:
-                    parsed_general_json = json.loads(json_match_regex_general.group(0))
-                except json.JSONDecodeError as e:
-                    logger.warning(f"解析第一次调用Regex匹配JSON失败: {e}")
+            JSON_PARSE_FAILURES.labels("general_info").inc()
+            logger.warning(f"未能从第一次调用内容中解析出JSON对象，将对全部字段进行字段级重试. 内容: {general_content[:200]}...")
+        else:
+            final_result.update(parsed_general_json)
 
-        if parsed_general_json is None:
-            try:
-                parsed_general_json = json.loads(general_content)
-            except json.JSONDecodeError as e:
-                logger.error(f"直接解析第一次调用内容为JSON失败: {e}. 内容: {general_content[:200]}...")
-                raise Exception("第一次AI响应 (通用信息) 解析失败")
-
-        if not isinstance(parsed_general_json, dict):
-            logger.error(f"第一次AI响应 (通用信息) 解析结果不是字典: {parsed_general_json}")
-            raise Exception("第一次AI响应 (通用信息) 解析结果不是预期的字典格式")
-        
-        final_result.update(parsed_general_json)
+        # 按Schema校验，仅对缺失或无效的字段发起追加请求
+        invalid_general_fields = find_invalid_fields(parsed_general_json, GENERAL_INFO_FIELDS)
+        if invalid_general_fields:
+            logger.warning(f"第一次AI响应 (通用信息) 中缺失或无效的字段: {invalid_general_fields}")
+            final_result.update(request_fields(document_content, invalid_general_fields, general_content))
+
+        if not any(field in final_result for field in GENERAL_INFO_FIELDS):
+            raise Exception("第一次AI响应 (通用信息) 解析失败")
         logger.info("第一次AI调用 (通用信息) 解析成功并合并到结果中.")
 
     except Exception as e:
@@ -157,101 +682,10 @@ def analyze_document_content(document_content: str) -> Dict:
     # --- 第二次AI调用：专门提取活性数据 --- 
     try:
         logger.info("准备第二次AI调用：提取活性数据")
-        prompt_activity_data = f"""
-        请分析以下科研文献，专门提取“活性数据”。你需要严格按照以下格式输出两次活性数据：
-
-        1.  **JSON格式的活性数据**：首先，请提供一个独立的、完整的JSON结构（可以是一个JSON对象，其中包含一个名为 '活性数据' 的数组，或者直接是一个JSON数组），专门包含这些活性数据。确保此JSON结构可以被程序直接解析。
-
-        2.  **Markdown格式的活性数据表格**：接着，请提供一个独立的Markdown表格，详细列出活性数据，包括但不限于催化剂名称、活性数值、单位、测试温度、测试压力、主要结果和备注。
-        关于"活性数值"列：
-        - 仅填写文本中明确给出的具体数值。如果活性数据是模糊描述（例如“低于A催化剂”、“高于B催化剂”、“没有明确数值”等），请将"活性数值"列留空。
-
-        关于"备注"列：
-        - 如果"活性数值"列因模糊描述而留空，请将该模糊描述或相关说明详细填写在"备注"列中。
-        - 对于有明确"活性数值"的行，"备注"列可以留空或填写其他相关补充信息。
-
-        请确保表格数据准确、完整，并严格遵循上述规则。请确保Markdown表格的每一行（包括表头和分隔线）都以 `|` 开始和结束，例如：
-            ```
-            | 列1 |
-            |---|
-            | 值1 |
-            ```
-
-        请确保JSON结构和Markdown表格是严格分开的，并且都是完整和准确的。
-
-文献内容：
-        {document_content}
-        """
-        messages_activity = [
-            {"role": "system", "content": "You are a professional chemistry literature analysis assistant"},
-            {"role": "user", "content": prompt_activity_data}
-        ]
-
-        response_activity = call_openrouter_api(messages_activity)
-        logger.info(f"第二次AI调用完成. AI原始响应 (活性数据): {json.dumps(response_activity, ensure_ascii=False)}")
-        ai_response_logger.info(f"Raw AI Response (Activity Data): {json.dumps(response_activity, ensure_ascii=False)}")
-
-        activity_full_content = response_activity["choices"][0]["message"]["content"]
-        
-        parsed_activity_json_data = None
-        activity_data_markdown_part = ""
-
-        # 优先尝试提取JSON部分
-        json_match_markdown_activity = re.search(r'```json\s*([\s\S]*?)\s*```', activity_full_content)
-        if json_match_markdown_activity:
-            parsed_activity_json_str = json_match_markdown_activity.group(1)
-            try:
-                temp_json = json.loads(parsed_activity_json_str)
-                if '活性数据' in temp_json and isinstance(temp_json['活性数据'], list):
-                    parsed_activity_json_data = temp_json['活性数据']
-                elif isinstance(temp_json, list): # 如果直接返回数组
-                     parsed_activity_json_data = temp_json
-                # 成功解析JSON后，尝试提取剩余的Markdown部分
-                activity_data_markdown_part = activity_full_content.replace(json_match_markdown_activity.group(0), '').strip()
-            except json.JSONDecodeError as e:
-                logger.warning(f"解析第二次调用Markdown代码块中JSON失败: {e}")
-        
-        # 如果没有从 ```json ``` 中提取到，尝试直接从内容中匹配JSON对象或数组
-        if parsed_activity_json_data is None:
-            json_match_regex_activity = re.search(r'\{.*\}', activity_full_content, re.DOTALL) # 匹配整个对象
-            if json_match_regex_activity:
-                try:
-                    temp_json = json.loads(json_match_regex_activity.group(0))
-                    if '活性数据' in temp_json and isinstance(temp_json['活性数据'], list):
-                        parsed_activity_json_data = temp_json['活性数据']
-                    elif isinstance(temp_json, list): # 如果直接返回数组
-                        parsed_activity_json_data = temp_json
-                    # 成功解析JSON后，尝试提取剩余的Markdown部分
-                    activity_data_markdown_part = activity_full_content.replace(json_match_regex_activity.group(0), '').strip()
-                except json.JSONDecodeError as e:
-                    logger.warning(f"解析第二次调用Regex匹配JSON失败: {e}")
-            else: # 尝试匹配JSON数组
-                json_array_match_activity = re.search(r'\[.*\]', activity_full_content, re.DOTALL)
-                if json_array_match_activity:
-                    try:
-                        parsed_activity_json_data = json.loads(json_array_match_activity.group(0))
-                        # 成功解析JSON后，尝试提取剩余的Markdown部分
-                        activity_data_markdown_part = activity_full_content.replace(json_array_match_activity.group(0), '').strip()
-                    except json.JSONDecodeError as e:
-                         logger.warning(f"解析第二次调用Regex匹配JSON数组失败: {e}")
-
-        # 如果JSON部分未成功提取，则将整个内容视为Markdown
-        if parsed_activity_json_data is None:
-            # 尝试从完整内容中提取Markdown表格，即使JSON提取失败
-            markdown_table_match_direct = re.search(r'\n\s*\|.*\|\s*\n\s*\|\s*[-]+\s*\|.*\n([\s\S]*?)(?=\n\s*[^|]|$)', activity_full_content)
-            if markdown_table_match_direct:
-                activity_data_markdown_part = markdown_table_match_direct.group(0).strip()
-            else:
-                activity_data_markdown_part = activity_full_content.strip()
-            logger.warning("未能从AI响应中提取JSON部分，将整个响应视为Markdown，或尝试直接提取Markdown表格。")
-        else:
-            # 如果JSON提取成功，activity_data_markdown_part 已经是JSON之后的部分
-            # 再次尝试从这部分中提取Markdown表格
-            markdown_table_match_after_json = re.search(r'\n\s*\|.*\|\s*\n\s*\|\s*[-]+\s*\|.*\n([\s\S]*?)(?=\n\s*[^|]|$)', activity_data_markdown_part)
-            if markdown_table_match_after_json:
-                activity_data_markdown_part = markdown_table_match_after_json.group(0).strip()
-            # 如果没有匹配到，则 activity_data_markdown_part 保持原样 (JSON之后的所有内容)
-            # 这可能意味着AI没有严格按照JSON后跟Markdown表格的格式输出
+        parsed_activity_json_data, activity_data_markdown_part = extract_activity_data(document_content)
+        if parsed_activity_json_data is None and ESCALATION_ENABLED:
+            logger.warning("活性数据未通过校验，升级到强模型重新提取")
+            parsed_activity_json_data, activity_data_markdown_part = extract_activity_data(document_content, escalate=True)
 
         logger.info(f"第二次调用分离后的JSON部分（前200字符）：{str(parsed_activity_json_data)[:200]}...")
         logger.info(f"第二次调用分离后的Markdown部分（前200字符）：{activity_data_markdown_part[:200]}...")
@@ -271,5 +705,5 @@ def analyze_document_content(document_content: str) -> Dict:
     # 将Markdown部分添加到最终结果中
     final_result['activity_data_markdown'] = activity_data_markdown_part
 
-    logger.info(f"AI响应最终解析后的结构化结果: {json.dumps(final_result, ensure_ascii=False)}")
+    logger.info(f"AI响应解析完成，结构化结果包含 {len(final_result)} 个字段")
     return final_result
\ No newline at end of file
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""分析结果的整理与保存
+
+网页上传后的后台分析和命令行批量导入（ingest.py）共用这里的逻辑，
+保证两条路径写入数据库的分析结果完全一致。
+"""
+import json
+from datetime import datetime
+from typing import Dict, Iterable
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+
+from analysis_schema import ANALYSIS_ITEMS
+from logger_config import main_logger
+from models import ActivityValue, Analysis, AnalysisHistory, Document
+from unit_normalizer import normalize_activity_data
+
+
+def apply_analysis_result(analysis: Analysis, result_json: Dict):
+    """将分析结果写入Analysis记录的结构化字段和content字段"""
+    analysis.title = result_json.get("文献标题", "")
+    analysis.authors = json.dumps(result_json.get("作者列表", []), ensure_ascii=False)
+    analysis.publication = result_json.get("发表期刊/会议", "")
+    analysis.year = result_json.get("发表年份", "")
+    analysis.abstract = result_json.get("摘要", "")
+    analysis.keywords = json.dumps(result_json.get("关键词", []), ensure_ascii=False)
+    analysis.content = json.dumps(result_json, ensure_ascii=False)
+
+
+def select_analysis_items(analysis_json: Dict, items: Iterable[str] = ANALYSIS_ITEMS) -> Dict:
+    """从AI响应中取出各分析项目的数据，响应中没有的项目视为跳过"""
+    return {item: analysis_json[item] for item in items if analysis_json.get(item) is not None}
+
+
+async def store_activity_values(db: AsyncSession, document_id: int, result_json: Dict):
+    """根据分析结果中的活性数据重新生成该文档的标准化活性数据（随调用方的事务提交）"""
+    rows = normalize_activity_data({document_id: result_json.get("活性数据")})
+    await db.execute(delete(ActivityValue).where(ActivityValue.document_id == document_id))
+    if rows:
+        await db.execute(insert(ActivityValue), rows)
+
+
+async def save_analysis_result(db: AsyncSession, document_id: int, analysis_json: Dict, result_json: Dict):
+    """保存文档的分析结果并将文档标记为已分析
+
+    每篇文档只保留一条当前结果，重新分析时旧结果移入历史表；
+    AI识别出催化反应类型时同时更新文档分类。
+
+    Args:
+        db: 数据库会话
+        document_id: 文档ID
+        analysis_json: AI的原始响应
+        result_json: 整理后的分析结果
+    """
+    ai_reaction_type = result_json.get("催化反应类型", "")
+    main_logger.info(f"文档 {document_id} AI识别的反应类型: {ai_reaction_type}")
+
+    analysis = await db.scalar(
+        select(Analysis).where(Analysis.document_id == document_id)
+        .options(undefer(Analysis.content), undefer(Analysis.raw_ai_response))
+    )
+    if analysis:
+        db.add(AnalysisHistory.from_analysis(analysis))
+        analysis.created_at = datetime.now()
+    else:
+        analysis = Analysis(document_id=document_id)
+        db.add(analysis)
+    analysis.raw_ai_response = json.dumps(analysis_json, ensure_ascii=False)  # 保存原始AI响应
+    apply_analysis_result(analysis, result_json)
+    await store_activity_values(db, document_id, result_json)
+    await db.commit()
+
+    # 更新文档状态和AI识别的反应类型
+    document = await db.get(Document, document_id)
+    if document:
+        document.status = "analyzed"
+        # 如果AI成功识别了反应类型，则更新文档的category字段
+        if ai_reaction_type and ai_reaction_type.strip():
+            document.category = ai_reaction_type
+            main_logger.info(f"文档 {document_id} 的分类已更新为: {ai_reaction_type}")
+        else:
+            # 如果AI没有识别出反应类型，保持category为空
+            document.category = ""
+            main_logger.info(f"文档 {document_id} 未能识别出催化反应类型，分类保持为空")
+        await db.commit()
+
+
+async def reuse_analysis(db: AsyncSession, document_id: int, source_document_id: int):
+    """将另一篇文档（如同一论文的其他版本）的分析结果复制给该文档，不再调用AI
+
+    Raises:
+        ValueError: 来源文档没有分析结果
+    """
+    source = await db.scalar(
+        select(Analysis).where(Analysis.document_id == source_document_id)
+        .options(undefer(Analysis.content), undefer(Analysis.raw_ai_response))
+    )
+    if source is None or not source.content:
+        raise ValueError(f"文档 {source_document_id} 没有可复用的分析结果")
+    result_json = json.loads(source.content)
+    analysis_json = json.loads(source.raw_ai_response) if source.raw_ai_response else result_json
+    main_logger.info(f"文档 {document_id} 复用文档 {source_document_id} 的分析结果")
+    await save_analysis_result(db, document_id, analysis_json, result_json)
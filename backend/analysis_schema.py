@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""文献分析结果的JSON Schema定义与校验
+
+定义13个分析项目的字段结构，用于请求结构化输出以及校验AI返回的结果。
+校验只实现本项目用到的JSON Schema子集（type、enum、items、minLength），
+不依赖额外的第三方库。
+"""
+from typing import Any, Dict, List, Optional
+
+# 分析项目列表（顺序即进度展示顺序）
+ANALYSIS_ITEMS = [
+    "文献标题",
+    "作者列表",
+    "发表期刊/会议",
+    "发表年份",
+    "摘要",
+    "关键词",
+    "催化反应类型",
+    "活性数据",
+    "催化剂制备方法",
+    "表征手段及结论",
+    "主要founded发现",
+    "结论",
+    "实验价值与启示"
+]
+
+# 催化反应类型的可选值
+REACTION_TYPES = [
+    "合成氨", "甲烷干重整", "一氧化碳加氢", "甲醇合成", "乙炔加氢",
+    "一氧化碳氧化", "烯烃聚合", "石油催化裂化", "费托合成", "选择性催化还原"
+]
+
+_TEXT = {"type": "string", "minLength": 1}
+_TEXT_LIST = {"type": "array", "items": {"type": "string"}}
+# 需要详细提取并结构化的字段，允许文本、对象或列表
+_DETAILED = {"type": ["string", "object", "array"], "minLength": 1}
+
+FIELD_SCHEMAS: Dict[str, Dict] = {
+    "文献标题": _TEXT,
+    "作者列表": _TEXT_LIST,
+    "发表期刊/会议": _TEXT,
+    "发表年份": {"type": ["string", "integer"]},
+    "摘要": _TEXT,
+    "关键词": _TEXT_LIST,
+    "催化反应类型": {"type": "string", "enum": REACTION_TYPES},
+    "活性数据": {"type": "array", "items": {"type": "object"}},
+    "催化剂制备方法": _DETAILED,
+    "表征手段及结论": _DETAILED,
+    "主要founded发现": _DETAILED,
+    "结论": _DETAILED,
+    "实验价值与启示": _DETAILED,
+}
+
+# 第一次AI调用（通用信息）负责的字段
+GENERAL_INFO_FIELDS = [item for item in ANALYSIS_ITEMS if item != "活性数据"]
+
+_TYPE_CHECKS = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+}
+
+
+def build_json_schema(fields: List[str]) -> Dict:
+    """构建指定字段的JSON Schema
+
+    Args:
+        fields: 字段名列表
+
+    Returns:
+        Dict: JSON Schema对象
+    """
+    return {
+        "type": "object",
+        "properties": {field: FIELD_SCHEMAS[field] for field in fields},
+        "required": list(fields)
+    }
+
+
+def _validate(value: Any, schema: Dict) -> Optional[str]:
+    expected = schema.get("type")
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_TYPE_CHECKS[t](value) for t in types):
+            return f"类型应为 {'/'.join(types)}，实际为 {type(value).__name__}"
+    if "enum" in schema and value not in schema["enum"]:
+        return f"取值 {value!r} 不在可选范围内"
+    min_length = schema.get("minLength")
+    if min_length:
+        if isinstance(value, str):
+            value_length = len(value.strip())
+        elif isinstance(value, (list, dict)):
+            value_length = len(value)
+        else:
+            value_length = min_length
+        if value_length < min_length:
+            return "内容为空"
+    item_schema = schema.get("items")
+    if item_schema and isinstance(value, list):
+        for idx, item in enumerate(value):
+            error = _validate(item, item_schema)
+            if error:
+                return f"第{idx + 1}项{error}"
+    return None
+
+
+def validate_field(name: str, value: Any) -> Optional[str]:
+    """校验单个字段
+
+    Returns:
+        Optional[str]: 校验失败时返回错误描述，成功时返回None
+    """
+    schema = FIELD_SCHEMAS.get(name)
+    if schema is None:
+        return None
+    return _validate(value, schema)
+
+
+def find_invalid_fields(data: Optional[Dict], fields: List[str]) -> Dict[str, str]:
+    """找出缺失或不符合Schema的字段
+
+    Args:
+        data: AI返回并解析后的结果
+        fields: 需要校验的字段名列表
+
+    Returns:
+        Dict[str, str]: 字段名到错误描述的映射
+    """
+    if not isinstance(data, dict):
+        return {field: "缺失" for field in fields}
+    invalid = {}
+    for field in fields:
+        if field not in data or data[field] is None:
+            invalid[field] = "缺失"
+            continue
+        error = validate_field(field, data[field])
+        if error:
+            invalid[field] = error
+    return invalid
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""AI响应解析微基准
+
+读取 logs/analysis_responses.log 中记录的原始AI响应，对比旧的正则提取方式
+与 response_parser 的单遍扫描解析在耗时和成功率上的差异。
+
+用法:
+    python bench_response_parser.py [日志文件路径] [--repeat N]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from response_parser import extract_json, parse_markdown_tables
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'analysis_responses.log')
+_RAW_RESPONSE_MARKER = re.compile(r'Raw AI Response \((General Info|Activity Data)\): ')
+_LEGACY_TABLE_RE = r'\n\s*\|.*\|\s*\n\s*\|\s*[-]+\s*\|.*\n([\s\S]*?)(?=\n\s*[^|]|$)'
+
+
+def load_responses(log_path):
+    """从日志中读取 (类型, 响应文本) 列表"""
+    responses = []
+    with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = _RAW_RESPONSE_MARKER.search(line)
+            if not match:
+                continue
+            try:
+                payload = json.loads(line[match.end():])
+                content = payload["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError, TypeError):
+                continue
+            if content:
+                responses.append((match.group(1), content))
+    return responses
+
+
+def legacy_parse(content):
+    """旧版 analyze_document_content 中的正则提取逻辑"""
+    parsed = None
+    fenced = re.search(r'```json\s*([\s\S]*?)\s*```', content)
+    if fenced:
+        try:
+            parsed = json.loads(fenced.group(1))
+        except json.JSONDecodeError:
+            pass
+    if parsed is None:
+        obj = re.search(r'\{.*\}', content, re.DOTALL)
+        if obj:
+            try:
+                parsed = json.loads(obj.group(0))
+            except json.JSONDecodeError:
+                pass
+        else:
+            arr = re.search(r'\[.*\]', content, re.DOTALL)
+            if arr:
+                try:
+                    parsed = json.loads(arr.group(0))
+                except json.JSONDecodeError:
+                    pass
+    re.search(_LEGACY_TABLE_RE, content)
+    return parsed
+
+
+def scanner_parse(content):
+    """基于 response_parser 的提取逻辑"""
+    parsed, _ = extract_json(content, lambda value: isinstance(value, (dict, list)))
+    parse_markdown_tables(content)
+    return parsed
+
+
+def run(responses, parser, repeat):
+    successes = sum(1 for _, content in responses if parser(content) is not None)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, content in responses:
+            parser(content)
+    elapsed = time.perf_counter() - start
+    return elapsed, successes
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="AI响应解析微基准")
+    arg_parser.add_argument("log_file", nargs="?", default=DEFAULT_LOG, help="AI响应日志文件路径")
+    arg_parser.add_argument("--repeat", type=int, default=20, help="每种解析方式重复次数")
+    args = arg_parser.parse_args()
+
+    if not os.path.exists(args.log_file):
+        print(f"❌ 日志文件 {args.log_file} 不存在")
+        sys.exit(1)
+
+    responses = load_responses(args.log_file)
+    if not responses:
+        print(f"❌ 日志文件 {args.log_file} 中没有可用的原始AI响应")
+        sys.exit(1)
+
+    total_chars = sum(len(content) for _, content in responses)
+    print(f"响应数: {len(responses)}，总字符数: {total_chars}，重复次数: {args.repeat}")
+    for name, parser in (("正则提取(旧)", legacy_parse), ("单遍扫描(新)", scanner_parse)):
+        elapsed, successes = run(responses, parser, args.repeat)
+        per_response = elapsed / (len(responses) * args.repeat) * 1000
+        print(f"{name}: 总耗时 {elapsed:.3f}s，平均 {per_response:.3f}ms/响应，"
+              f"成功解析 {successes}/{len(responses)}")
+
+
+if __name__ == "__main__":
+    main()
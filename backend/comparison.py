@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""多文献活性数据对比
+
+基于标准化活性数据（activity_values 表，见 unit_normalizer.py）在服务端完成
+分组统计和绘图数据准备，浏览器只接收少量已汇总的数据：
+
+- 按催化剂、催化反应类型或文献分组，用 NumPy 计算每组的数量、最小值、最大值、中位数和平均值
+- 每组数据按横轴排序后用 LTTB（Largest-Triangle-Three-Buckets）降采样，
+  点数不超过图表的像素宽度，曲线形状基本不变
+"""
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 坐标轴 -> (名称, 单位)；活性数值的单位由数据决定
+AXES = {
+    "activity_value": ("活性数值", None),
+    "temperature_c": ("测试温度", "°C"),
+    "pressure_mpa": ("测试压力", "MPa"),
+    "year": ("发表年份", None),
+}
+GROUPINGS = {"catalyst": "催化剂", "category": "催化反应类型", "document": "文献"}
+# 图表宽度（像素）的取值范围，即每组最多返回的点数
+MIN_WIDTH = 10
+MAX_WIDTH = 5000
+# 默认最多返回的分组数，按数据条数从多到少保留
+DEFAULT_MAX_GROUPS = 50
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets 降采样
+
+    Args:
+        x: 横坐标，已按升序排列
+        y: 纵坐标
+        threshold: 保留的点数
+
+    Returns:
+        np.ndarray: 保留的点的下标，包含首尾两点
+    """
+    n = len(x)
+    if threshold >= n or n <= 2:
+        return np.arange(n)
+    threshold = max(threshold, 3)
+    # 除首尾两点外的数据平均分成 threshold-2 个桶，每个桶保留一个点
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x = x[edges[bucket + 1]:edges[bucket + 2]].mean()
+            next_y = y[edges[bucket + 1]:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        # 与上一个保留点、下一个桶的平均点组成的三角形面积最大的点
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def _floats(values: Sequence) -> np.ndarray:
+    """转换为浮点数组，缺失值和无法转换的值为NaN"""
+    result = np.full(len(values), np.nan)
+    for index, value in enumerate(values):
+        try:
+            result[index] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return result
+
+
+def _group_keys(rows: Sequence, group_by: str) -> List[str]:
+    if group_by == "catalyst":
+        return [(row.catalyst or "").strip() or "未命名催化剂" for row in rows]
+    if group_by == "category":
+        return [(row.category or "").strip() or "未分类" for row in rows]
+    # 不同文献可能同名，按文档ID分组
+    return [f"{row.name}（ID {row.document_id}）" for row in rows]
+
+
+def _axis_values(rows: Sequence, axis: str) -> np.ndarray:
+    return _floats([getattr(row, axis) for row in rows])
+
+
+def _round(values: np.ndarray) -> List[float]:
+    return [float(f"{value:.6g}") for value in values]
+
+
+def compare_activity(rows: Sequence, x_axis: str, y_axis: str, group_by: str, width: int = 800,
+                     activity_unit: Optional[str] = None, max_groups: int = DEFAULT_MAX_GROUPS) -> Dict:
+    """分组统计活性数据并生成降采样后的绘图数据
+
+    Args:
+        rows: 活性数据，需要有 document_id、name、category、catalyst、activity_unit 及各坐标轴字段
+        x_axis: 横轴，AXES 中的一项
+        y_axis: 纵轴，AXES 中的一项，分组统计针对纵轴
+        group_by: 分组方式，GROUPINGS 中的一项
+        width: 图表宽度（像素），每组最多返回的点数
+        activity_unit: 坐标轴包含活性数值时只使用该单位的数据，默认使用数据最多的单位
+        max_groups: 最多返回的分组数
+
+    Returns:
+        Dict: 坐标轴信息、可选的活性单位、分组统计和每组的绘图数据
+
+    Raises:
+        ValueError: 坐标轴或分组方式不支持，或 max_groups 小于1
+    """
+    for axis in (x_axis, y_axis):
+        if axis not in AXES:
+            raise ValueError(f"不支持的坐标轴: {axis}")
+    if group_by not in GROUPINGS:
+        raise ValueError(f"不支持的分组方式: {group_by}")
+    # 负数会被切片当作“去掉最后几组”，0 会返回空结果
+    if max_groups < 1:
+        raise ValueError(f"max_groups 必须不小于1: {max_groups}")
+    width = min(max(width, MIN_WIDTH), MAX_WIDTH)
+
+    # 不同单位的活性数值不能放在一起比较
+    uses_activity = "activity_value" in (x_axis, y_axis)
+    unit_counts = Counter(row.activity_unit for row in rows if row.activity_unit and row.activity_value is not None)
+    if uses_activity:
+        # 未指定或所选文献中没有该单位时，使用数据最多的单位
+        if activity_unit not in unit_counts and unit_counts:
+            activity_unit = unit_counts.most_common(1)[0][0]
+        rows = [row for row in rows if row.activity_unit == activity_unit]
+
+    x = _axis_values(rows, x_axis)
+    y = _axis_values(rows, y_axis)
+    valid = np.isfinite(x) & np.isfinite(y)
+    keys = np.array(_group_keys(rows, group_by), dtype=object)[valid]
+    x, y = x[valid], y[valid]
+
+    result = {
+        "x_axis": {"key": x_axis, "label": AXES[x_axis][0], "unit": activity_unit if x_axis == "activity_value" else AXES[x_axis][1]},
+        "y_axis": {"key": y_axis, "label": AXES[y_axis][0], "unit": activity_unit if y_axis == "activity_value" else AXES[y_axis][1]},
+        "group_by": group_by,
+        "activity_unit": activity_unit if uses_activity else None,
+        "activity_units": [{"unit": unit, "count": count} for unit, count in unit_counts.most_common()],
+        "total_points": int(len(x)),
+        "groups": [],
+        "omitted_groups": 0,
+    }
+    if not len(x):
+        return result
+
+    names, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    # 按 (分组, 纵坐标) 排序后，每组的最值和中位数可直接按位置取出
+    y_sorted = y[np.lexsort((y, inverse))]
+    minimum = y_sorted[starts]
+    maximum = y_sorted[starts + counts - 1]
+    median = (y_sorted[starts + (counts - 1) // 2] + y_sorted[starts + counts // 2]) / 2
+    mean = np.bincount(inverse, weights=y) / counts
+    # 按 (分组, 横坐标) 排序，用于生成每组的曲线
+    by_x = np.lexsort((y, x, inverse))
+    x_by_group, y_by_group = x[by_x], y[by_x]
+
+    order = np.argsort(-counts, kind="stable")
+    kept = order[:max_groups]
+    result["omitted_groups"] = int(len(order) - len(kept))
+    for group in kept:
+        start, end = starts[group], starts[group] + counts[group]
+        group_x, group_y = x_by_group[start:end], y_by_group[start:end]
+        indices = lttb(group_x, group_y, width)
+        result["groups"].append({
+            "name": names[group],
+            "count": int(counts[group]),
+            "min": float(f"{minimum[group]:.6g}"),
+            "max": float(f"{maximum[group]:.6g}"),
+            "median": float(f"{median[group]:.6g}"),
+            "mean": float(f"{mean[group]:.6g}"),
+            "x": _round(group_x[indices]),
+            "y": _round(group_y[indices]),
+        })
+    return result
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""数据库空间占用报告
+
+统计数据库文件大小，以及压缩存储的大字段的实际占用和解压后的原始大小，
+用于对比压缩前后的数据库体积。加 --vacuum 时整理数据库文件并显示整理前后的文件大小。
+
+用法:
+    python db_size_report.py [--vacuum]
+"""
+import argparse
+import os
+import zlib
+
+from sqlalchemy import inspect, text
+
+from migrations import COMPRESSED_COLUMNS
+from models import engine
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def database_file_size() -> int:
+    """数据库文件（含WAL文件）的大小"""
+    path = engine.url.database
+    if engine.dialect.name != "sqlite" or not path or path == ":memory:":
+        return 0
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def column_sizes():
+    """各大字段的 (表名, 字段名, 行数, 存储字节数, 原始字节数)"""
+    results = []
+    with engine.connect() as conn:
+        for table, columns in COMPRESSED_COLUMNS.items():
+            # 尚未执行迁移的数据库可能没有该表
+            if not inspect(conn).has_table(table):
+                continue
+            for column in columns:
+                stored = original = count = 0
+                rows = conn.execute(text(f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL"))
+                for (value,) in rows:
+                    count += 1
+                    if isinstance(value, str):
+                        size = len(value.encode("utf-8"))
+                        stored += size
+                        original += size
+                        continue
+                    stored += len(value)
+                    try:
+                        original += len(zlib.decompress(value))
+                    except zlib.error:
+                        original += len(value)
+                results.append((table, column, count, stored, original))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库空间占用报告")
+    parser.add_argument("--vacuum", action="store_true", help="执行 VACUUM 整理数据库文件")
+    args = parser.parse_args()
+
+    print(f"数据库: {engine.url.render_as_string(hide_password=True)}")
+    print(f"文件大小: {_format_size(database_file_size())}")
+    total_stored = total_original = 0
+    for table, column, count, stored, original in column_sizes():
+        ratio = stored / original * 100 if original else 100
+        print(f"  {table}.{column}: {count} 行，原始 {_format_size(original)}，"
+              f"存储 {_format_size(stored)}（{ratio:.0f}%）")
+        total_stored += stored
+        total_original += original
+    print(f"大字段合计: 原始 {_format_size(total_original)} -> 存储 {_format_size(total_stored)}")
+
+    if args.vacuum:
+        before = database_file_size()
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+            if engine.dialect.name == "sqlite":
+                conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"VACUUM: {_format_size(before)} -> {_format_size(database_file_size())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,24 @@
 import os
+import glob
+import json
+import shutil
+import subprocess
+import time
 import PyPDF2
+from datetime import datetime
 from docx import Document
 from typing import Dict, Optional
 
 from logger_config import doc_logger
+from metrics import EXTRACTION_SECONDS, EXTRACTION_SECONDS_PER_PAGE
+
+# 提取文本缓存目录，文件名格式：{document_id}_{时间戳}.json
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+# 上传PDF时是否转换为线性化（Fast Web View）格式，需要系统安装 qpdf
+PDF_LINEARIZE = os.getenv("PDF_LINEARIZE", "true").lower() == "true"
+QPDF_PATH = os.getenv("QPDF_PATH") or shutil.which("qpdf")
+LINEARIZE_TIMEOUT = 120
 
 class DocumentProcessor:
     """文档处理器，用于解析PDF和Word文档内容"""
@@ -33,9 +48,14 @@ class DocumentProcessor:
                 # 提取所有页面的文本
                 text_content = []
                 doc_logger.debug("开始遍历PDF页面")
+                started = time.perf_counter()
                 for i, page in enumerate(pdf_reader.pages):
                     doc_logger.debug(f"正在处理第 {i+1} 页")
                     text_content.append(page.extract_text())
+                elapsed = time.perf_counter() - started
+                EXTRACTION_SECONDS.labels("pdf").observe(elapsed)
+                if text_content:
+                    EXTRACTION_SECONDS_PER_PAGE.observe(elapsed / len(text_content))
                 doc_logger.debug("所有页面文本提取完成")
                 
                 # 合并所有页面的文本
@@ -60,6 +80,7 @@ class DocumentProcessor:
         try:
             doc_logger.info(f"开始提取Word文档内容: {file_path}")
             # 打开Word文档
+            started = time.perf_counter()
             doc = Document(file_path)
             
             # 提取所有段落的文本
@@ -72,6 +93,7 @@ class DocumentProcessor:
             
             # 合并所有段落的文本
             result = '\n'.join(text_content)
+            EXTRACTION_SECONDS.labels("docx").observe(time.perf_counter() - started)
             doc_logger.info(f"Word文档内容提取成功，文本长度: {len(result)}")
             return result
         except Exception as e:
@@ -130,4 +152,121 @@ class DocumentProcessor:
             return processed_text
         except Exception as e:
             doc_logger.error(f"处理文档时发生错误: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def save_text_cache(document_id: int, file_path: str, text: str) -> Optional[str]:
+        """将提取的文本写入缓存
+
+        Args:
+            document_id: 文档ID
+            file_path: 原始文件路径
+            text: 提取的文本内容
+
+        Returns:
+            str: 缓存文件路径，写入失败时返回None
+        """
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            now = datetime.now()
+            cache_path = os.path.join(CACHE_DIR, f"{document_id}_{now.strftime('%Y%m%d_%H%M%S')}.json")
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "document_id": document_id,
+                    "original_file_path": file_path,
+                    "processed_text": text,
+                    "created_at": now.isoformat()
+                }, f, ensure_ascii=False, indent=2)
+            doc_logger.info(f"文档 {document_id} 的提取文本已缓存到 {cache_path}")
+            return cache_path
+        except Exception as e:
+            doc_logger.error(f"写入文档 {document_id} 的文本缓存失败: {str(e)}")
+            return None
+
+    @staticmethod
+    def load_text_cache(document_id: int, file_path: Optional[str] = None) -> Optional[str]:
+        """读取文档最新的文本缓存
+
+        缓存对应的原始文件路径不一致，或原始文件在缓存之后被修改时视为失效。
+
+        Args:
+            document_id: 文档ID
+            file_path: 原始文件路径，用于校验缓存是否属于该文件
+
+        Returns:
+            str: 缓存的文本内容，没有可用缓存时返回None
+        """
+        for cache_path in sorted(glob.glob(os.path.join(CACHE_DIR, f"{document_id}_*.json")), reverse=True):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached.get("document_id") != document_id:
+                    continue
+                if file_path is not None:
+                    if os.path.abspath(cached.get("original_file_path", "")) != os.path.abspath(file_path):
+                        continue
+                    created_at = datetime.fromisoformat(cached["created_at"]).timestamp()
+                    if os.path.exists(file_path) and os.path.getmtime(file_path) > created_at:
+                        continue
+                text = cached.get("processed_text")
+                if text:
+                    doc_logger.info(f"使用文档 {document_id} 的文本缓存: {cache_path}")
+                    return text
+            except Exception as e:
+                doc_logger.warning(f"读取文本缓存 {cache_path} 失败: {str(e)}")
+        return None
+
+    @staticmethod
+    def linearize_pdf(file_path: str) -> bool:
+        """将PDF原地转换为线性化格式，使浏览器按需加载页面时第一页能尽快显示
+
+        qpdf 不可用、文件已线性化或转换失败时保持原文件不变。
+
+        Args:
+            file_path: PDF文件路径
+
+        Returns:
+            bool: 是否写入了线性化文件
+        """
+        if not PDF_LINEARIZE or not QPDF_PATH:
+            return False
+        temp_path = file_path + ".linearized"
+        try:
+            # 退出码0表示已经是线性化文件
+            if subprocess.run([QPDF_PATH, "--is-linearized", file_path],
+                              capture_output=True, timeout=LINEARIZE_TIMEOUT).returncode == 0:
+                return False
+            result = subprocess.run([QPDF_PATH, "--linearize", file_path, temp_path],
+                                    capture_output=True, timeout=LINEARIZE_TIMEOUT)
+            # 退出码3表示有警告但已成功输出
+            if result.returncode not in (0, 3) or not os.path.exists(temp_path):
+                doc_logger.warning(f"线性化PDF失败: {file_path} {result.stderr.decode(errors='replace').strip()}")
+                return False
+            os.replace(temp_path, file_path)
+            doc_logger.info(f"PDF已线性化: {file_path}")
+            return True
+        except (OSError, subprocess.SubprocessError) as e:
+            doc_logger.warning(f"线性化PDF时出错: {file_path} {str(e)}")
+            return False
+        finally:
+            # 失败或超时时删除写了一半的临时文件（成功时已被替换为原文件）
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def get_document_text(self, file_path: str, document_id: int) -> Optional[str]:
+        """获取文档文本，优先使用缓存，缓存不存在时提取并写入缓存
+
+        Args:
+            file_path: 文档文件路径
+            document_id: 文档ID
+
+        Returns:
+            str: 文档文本内容
+        """
+        cached_text = DocumentProcessor.load_text_cache(document_id, file_path)
+        if cached_text:
+            return cached_text
+        processed_text = self.process_document(file_path, document_id)
+        if processed_text:
+            DocumentProcessor.save_text_cache(document_id, file_path, processed_text)
+        return processed_text
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""分析结果与活性数据导出
+
+从数据库分批读取分析结果，逐行转换为 CSV、NDJSON 或 Parquet，边读边输出，
+内存占用与导出的数据量无关。接口 /api/export/{dataset} 和命令行共用这里的实现。
+
+数据集:
+    analyses  每篇文献一行：基本信息及各分析项目
+    activity  每条活性数据一行，附带所属文献的信息
+
+Parquet 需要安装 pyarrow（可选依赖），未安装时只支持 CSV 和 NDJSON。
+
+用法:
+    python exporter.py activity --format csv -o activity.csv --category 合成氨 --year-from 2020
+    python exporter.py analyses --format ndjson --document-id 1 --document-id 2 > analyses.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from analysis_schema import ANALYSIS_ITEMS
+from models import Analysis, Document, SessionLocal
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# 每批从数据库读取的分析结果数
+EXPORT_BATCH_SIZE = 200
+# CSV/NDJSON 累计到该字节数后输出一次
+EXPORT_FLUSH_SIZE = 64 * 1024
+# Parquet 每个行组的行数
+PARQUET_ROW_GROUP_SIZE = 5000
+
+# 格式 -> (Content-Type, 扩展名)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+_DOCUMENT_COLUMNS = ["document_id", "document_name", "category", "year"]
+# 分析项目中已作为文献信息输出的字段
+_ANALYSIS_BASE_ITEMS = {"发表年份", "催化反应类型"}
+ACTIVITY_FIELDS = ["催化剂名称", "活性数值", "单位", "测试温度", "测试压力", "主要结果", "备注"]
+EXPORT_COLUMNS = {
+    "analyses": _DOCUMENT_COLUMNS + [item for item in ANALYSIS_ITEMS if item not in _ANALYSIS_BASE_ITEMS],
+    "activity": _DOCUMENT_COLUMNS + ACTIVITY_FIELDS,
+}
+
+
+class ExportFilters:
+    """导出的筛选条件，未指定的条件不筛选
+
+    Args:
+        categories: 催化反应类型
+        year_from: 起始发表年份（含）
+        year_to: 截止发表年份（含）
+        document_ids: 文档ID
+    """
+
+    def __init__(self, categories: Optional[List[str]] = None, year_from: Optional[int] = None,
+                 year_to: Optional[int] = None, document_ids: Optional[List[int]] = None):
+        self.categories = categories or []
+        self.year_from = year_from
+        self.year_to = year_to
+        self.document_ids = document_ids or []
+
+    def apply(self, statement):
+        if self.categories:
+            statement = statement.where(Document.category.in_(self.categories))
+        # 年份以字符串保存，四位年份按字符串比较即可
+        if self.year_from is not None:
+            statement = statement.where(Analysis.year >= str(self.year_from))
+        if self.year_to is not None:
+            statement = statement.where(Analysis.year <= str(self.year_to))
+        if self.document_ids:
+            statement = statement.where(Analysis.document_id.in_(self.document_ids))
+        return statement
+
+
+def parquet_available() -> bool:
+    return pyarrow is not None
+
+
+def _iter_analyses(filters: ExportFilters) -> Iterator[Dict]:
+    """按文档ID顺序分批读取分析结果"""
+    statement = filters.apply(
+        select(Analysis.document_id, Document.name, Document.category, Analysis.year, Analysis.content)
+        .join(Document, Document.id == Analysis.document_id)
+        .order_by(Analysis.document_id)
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    with SessionLocal() as db:
+        for row in db.execute(statement):
+            try:
+                content = json.loads(row.content) if row.content else {}
+            except ValueError:
+                content = {}
+            yield {
+                "document_id": row.document_id,
+                "document_name": row.name,
+                "category": row.category,
+                "year": row.year,
+                "content": content if isinstance(content, dict) else {},
+            }
+
+
+def iter_rows(dataset: str, filters: ExportFilters) -> Iterator[Dict]:
+    """逐行生成导出数据，键与 EXPORT_COLUMNS[dataset] 一致"""
+    for analysis in _iter_analyses(filters):
+        base = {column: analysis[column] for column in _DOCUMENT_COLUMNS}
+        content = analysis["content"]
+        if dataset == "analyses":
+            yield {**base, **{item: content.get(item) for item in EXPORT_COLUMNS["analyses"][len(base):]}}
+            continue
+        entries = content.get("活性数据")
+        if not isinstance(entries, list):
+            continue
+        for entry in entries:
+            if isinstance(entry, dict):
+                yield {**base, **{field: entry.get(field) for field in ACTIVITY_FIELDS}}
+
+
+def _cell(value) -> str:
+    """CSV单元格：列表用分号连接，其他复杂结构保存为JSON"""
+    if value is None:
+        return ""
+    if isinstance(value, list) and all(isinstance(item, (str, int, float)) for item in value):
+        return "; ".join(str(item) for item in value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _iter_csv(dataset: str, rows: Iterator[Dict]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 带BOM，Excel 和 Origin 能正确识别中文
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS[dataset])
+    for row in rows:
+        writer.writerow([_cell(value) for value in row.values()])
+        if buffer.tell() >= EXPORT_FLUSH_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _iter_ndjson(rows: Iterator[Dict]) -> Iterator[bytes]:
+    chunk: List[str] = []
+    size = 0
+    for row in rows:
+        line = json.dumps(row, ensure_ascii=False) + "\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_FLUSH_SIZE:
+            yield "".join(chunk).encode("utf-8")
+            chunk, size = [], 0
+    yield "".join(chunk).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集 Parquet 写入的字节，由生成器取走后输出"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _iter_parquet(dataset: str, rows: Iterator[Dict]) -> Iterator[bytes]:
+    columns = EXPORT_COLUMNS[dataset]
+    schema = pyarrow.schema([
+        (column, pyarrow.int64() if column == "document_id" else pyarrow.string()) for column in columns
+    ])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+
+    def flush(batch: List[Dict]):
+        arrays = {column: [row[column] if column == "document_id" else
+                           (None if row[column] is None else _cell(row[column])) for row in batch]
+                  for column in columns}
+        writer.write_table(pyarrow.Table.from_pydict(arrays, schema=schema))
+
+    batch: List[Dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= PARQUET_ROW_GROUP_SIZE:
+            flush(batch)
+            batch = []
+            yield sink.take()
+    if batch:
+        flush(batch)
+    writer.close()
+    yield sink.take()
+
+
+def iter_export(dataset: str, export_format: str, filters: ExportFilters) -> Iterator[bytes]:
+    """按指定格式逐块生成导出文件内容
+
+    Args:
+        dataset: 数据集，analyses 或 activity
+        export_format: csv、ndjson 或 parquet
+        filters: 筛选条件
+
+    Raises:
+        ValueError: 数据集或格式不支持
+        RuntimeError: 导出 Parquet 但未安装 pyarrow
+    """
+    if dataset not in EXPORT_COLUMNS:
+        raise ValueError(f"不支持的数据集: {dataset}")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {export_format}")
+    if export_format == "parquet" and not parquet_available():
+        raise RuntimeError("导出 Parquet 需要安装 pyarrow")
+    rows = iter_rows(dataset, filters)
+    if export_format == "csv":
+        return _iter_csv(dataset, rows)
+    if export_format == "ndjson":
+        return _iter_ndjson(rows)
+    return _iter_parquet(dataset, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出分析结果或活性数据")
+    parser.add_argument("dataset", choices=sorted(EXPORT_COLUMNS), help="analyses: 每篇文献一行；activity: 每条活性数据一行")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv", help="导出格式（默认csv）")
+    parser.add_argument("-o", "--output", help="输出文件，默认输出到标准输出")
+    parser.add_argument("--category", action="append", help="催化反应类型，可重复指定")
+    parser.add_argument("--year-from", type=int, help="起始发表年份（含）")
+    parser.add_argument("--year-to", type=int, help="截止发表年份（含）")
+    parser.add_argument("--document-id", type=int, action="append", help="文档ID，可重复指定")
+    args = parser.parse_args()
+
+    filters = ExportFilters(args.category, args.year_from, args.year_to, args.document_id)
+    try:
+        chunks = iter_export(args.dataset, args.format, filters)
+    except RuntimeError as e:
+        parser.error(str(e))
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""HTTP中间件与条件请求工具
+
+中间件直接实现ASGI接口（不使用 BaseHTTPMiddleware），只包装 send 回调，
+不会为每个请求额外创建任务或复制请求体：
+
+- SecurityHeadersMiddleware: 添加安全响应头；路由未指定缓存策略时默认禁止缓存
+- CompressionMiddleware: 对较大的JSON/文本响应进行gzip压缩
+
+条件请求（ETag / Last-Modified / 304）由路由根据数据库中的元数据计算，
+在读取大字段之前即可判断客户端缓存是否仍然有效。RangeFileResponse 支持
+按字节范围返回文件（206），服务器支持时使用零拷贝发送。
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+# 路由未设置 Cache-Control 时使用的默认值
+DEFAULT_CACHE_CONTROL = "no-store, no-cache, must-revalidate, proxy-revalidate"
+# 带校验器的响应：允许缓存，但每次使用前必须向服务端确认
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# 小于该字节数的响应不压缩
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LEVEL = 6
+_COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/x-ndjson")
+
+
+class SecurityHeadersMiddleware:
+    """添加安全响应头，路由未指定 Cache-Control 时默认禁止缓存"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if "cache-control" not in headers:
+                    headers["Cache-Control"] = DEFAULT_CACHE_CONTROL
+                headers["X-Content-Type-Options"] = "nosniff"
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class CompressionMiddleware:
+    """对较大的JSON/文本响应进行gzip压缩
+
+    只处理一次性返回完整响应体的响应；流式响应、已编码的响应和非文本类型
+    （如PDF下载）原样传递。压缩后的表示在ETag后追加 -gzip 以区分。
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, level: int = COMPRESSION_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(_COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # 等待响应体，确定是否值得压缩
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if start_message is None:
+                await send(message)
+                return
+            headers = MutableHeaders(scope=start_message)
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # 流式或较小的响应不压缩
+                passthrough = True
+            else:
+                body = gzip.compress(body, compresslevel=self.level)
+                headers["Content-Encoding"] = "gzip"
+                headers["Content-Length"] = str(len(body))
+                etag = headers.get("etag")
+                if etag and etag.endswith('"'):
+                    headers["ETag"] = etag[:-1] + '-gzip"'
+                message = {"type": "http.response.body", "body": body, "more_body": False}
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            start_message = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+def make_etag(*parts) -> str:
+    """根据资源的元数据生成强ETag"""
+    digest = hashlib.sha1(json.dumps(parts, default=str, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def _etag_values(header: str) -> Iterable[str]:
+    for value in header.split(","):
+        value = value.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        # 压缩后的表示与原始表示对应同一资源版本
+        if value.endswith('-gzip"'):
+            value = value[:-len('-gzip"')] + '"'
+        yield value
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """条件请求相关的响应头"""
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(_to_timestamp(last_modified), usegmt=True)
+    return headers
+
+
+def _to_timestamp(value: datetime) -> float:
+    # 数据库中保存的是本地时间
+    return value.timestamp() if value.tzinfo else value.astimezone().timestamp()
+
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """客户端缓存仍然有效时返回304响应，否则返回None
+
+    优先比较 If-None-Match；请求中没有 If-None-Match 时才比较 If-Modified-Since。
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*" or etag in _etag_values(if_none_match):
+            return Response(status_code=304, headers=cache_headers(etag, last_modified))
+        return None
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP日期精确到秒
+        if int(_to_timestamp(last_modified)) <= int(since.timestamp()):
+            return Response(status_code=304, headers=cache_headers(etag, last_modified))
+    return None
+
+
+# 文件分块读取大小（服务器不支持零拷贝时）
+FILE_CHUNK_SIZE = 256 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """请求的字节范围超出文件大小"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """解析单个字节范围的 Range 请求头
+
+    Returns:
+        (起始位置, 结束位置)，包含结束位置；没有 Range、格式无法识别或请求多个范围时
+        返回None，按完整文件响应
+
+    Raises:
+        RangeNotSatisfiable: 范围超出文件大小
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # 后缀范围：最后N个字节
+        length = int(end)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """支持 Range 请求的文件响应
+
+    请求包含有效的 Range 时返回 206 和对应的字节；If-Range 与当前版本不一致时
+    返回完整文件。服务器支持 ASGI zerocopysend 扩展时由服务器直接 sendfile，
+    否则在线程中分块读取。
+
+    Args:
+        path: 文件路径
+        request: 当前请求，用于读取 Range / If-Range
+        stat_result: 文件的 os.stat 结果
+        media_type: 文件类型
+        filename: 下载文件名
+        inline: 是否在浏览器中直接打开（否则作为附件下载）
+        headers: 额外的响应头（如ETag、Last-Modified）
+    """
+
+    def __init__(self, path: str, request: Request, stat_result: os.stat_result, media_type: str,
+                 filename: Optional[str] = None, inline: bool = False, headers: Optional[Dict[str, str]] = None):
+        super().__init__(content=None, status_code=200, headers=headers, media_type=media_type)
+        self.path = path
+        self.size = stat_result.st_size
+        self.send_body = request.method != "HEAD"
+        self.range: Optional[Tuple[int, int]] = None
+
+        self.headers["Accept-Ranges"] = "bytes"
+        if filename:
+            disposition = "inline" if inline else "attachment"
+            quoted = quote(filename)
+            if quoted != filename:
+                self.headers["Content-Disposition"] = f"{disposition}; filename*=utf-8''{quoted}"
+            else:
+                self.headers["Content-Disposition"] = f'{disposition}; filename="{filename}"'
+
+        if self._range_applies(request):
+            try:
+                self.range = parse_range(request.headers.get("range"), self.size)
+            except RangeNotSatisfiable:
+                self.status_code = 416
+                self.send_body = False
+                self.headers["Content-Range"] = f"bytes */{self.size}"
+                self.headers["Content-Length"] = "0"
+                return
+        if self.range:
+            start, end = self.range
+            self.status_code = 206
+            self.headers["Content-Range"] = f"bytes {start}-{end}/{self.size}"
+            self.headers["Content-Length"] = str(end - start + 1)
+        else:
+            self.headers["Content-Length"] = str(self.size)
+
+    def _range_applies(self, request: Request) -> bool:
+        """If-Range 与当前ETag或Last-Modified一致（或未提供）时才按范围响应"""
+        if_range = request.headers.get("if-range")
+        if not if_range:
+            return True
+        return if_range in (self.headers.get("etag"), self.headers.get("last-modified"))
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        start, end = self.range or (0, self.size - 1)
+        count = end - start + 1
+        if count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file.fileno(),
+                            "offset": start, "count": count, "more_body": False})
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(start)
+            remaining = count
+            while remaining > 0:
+                chunk = await file.read(min(FILE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # 文件在发送过程中被截断
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""命令行批量导入文献
+
+遍历目录中的PDF和Word文档，登记到数据库后提取文本并进行AI分析，不经过网页上传。
+文本提取和AI分析复用 DocumentProcessor 与 analyze_document_content，
+分析结果与网页上传完全一致。
+
+- 默认直接登记原文件路径，不复制文件（在网页中删除文档时不会删除原文件）；加 --copy 时复制到 uploads 目录
+- 文本提取在多个进程中并行执行，AI分析的并发数由 --workers 指定
+- 中断后重新执行同一命令即可继续：已分析的文档跳过，未完成的文档重新分析，
+  内容相同的文件（SHA-256一致）不会重复登记
+- 与已分析的文献疑似重复（同一论文的不同版本）时，按 --on-duplicate 暂停、复用已有结果或照常分析
+
+用法:
+    python ingest.py D:\\papers --workers 4
+    python ingest.py D:\\papers --extract-only      # 只提取并缓存文本
+    python ingest.py D:\\papers --retry-errors      # 同时重新分析之前失败的文档
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy import select
+
+from ai_service import analyze_document_content, run_llm_task
+from analysis_results import reuse_analysis, save_analysis_result, select_analysis_items
+from document_processor import DocumentProcessor
+from logger_config import main_logger
+from migrations import run_migrations
+from models import AsyncSessionLocal, Document, async_engine
+from near_duplicates import DUPLICATE_ACTIONS, NEAR_DUPLICATE_ACTION, check_near_duplicates
+from upload_stream import FILE_TYPES
+
+uploads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+# 每次提交登记的文档数
+REGISTER_BATCH_SIZE = 100
+# 进度统计输出间隔（秒）
+STATS_INTERVAL = 10
+
+
+def find_documents(directory: str, recursive: bool = True) -> List[str]:
+    """查找目录中支持的文档，按路径排序"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in FILE_TYPES and not name.startswith("~$"):
+                paths.append(os.path.abspath(os.path.join(root, name)))
+        if not recursive:
+            break
+    return paths
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def extract_text(path: str, document_id: int) -> Optional[str]:
+    """在子进程中提取文档文本（写入文本缓存）"""
+    return DocumentProcessor().get_document_text(path, document_id)
+
+
+class IngestStats:
+    """导入过程的吞吐量统计"""
+
+    def __init__(self, total: int, extract_only: bool = False):
+        self.total = total
+        # 只提取文本时以提取完成计为处理完成
+        self.extract_only = extract_only
+        self.started_at = time.time()
+        self.extracted = 0
+        self.extracted_bytes = 0
+        self.analyzed = 0
+        self.failed = 0
+        # 疑似重复、暂停等待确认的文档
+        self.held = 0
+
+    @property
+    def finished(self) -> int:
+        return (self.extracted if self.extract_only else self.analyzed) + self.failed + self.held
+
+    def report(self, final: bool = False) -> str:
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        rate = self.finished / elapsed * 60
+        remaining = self.total - self.finished
+        eta = f"，预计剩余 {remaining / rate:.0f} 分钟" if rate and remaining and not final else ""
+        return (f"[{'完成' if final else '进度'}] {self.finished}/{self.total} 篇"
+                f"（成功 {self.analyzed}，失败 {self.failed}，疑似重复 {self.held}），已提取 {self.extracted} 篇 "
+                f"{self.extracted_bytes / 1024 / 1024 / elapsed:.2f}MB/s，"
+                f"{rate:.1f} 篇/分钟，用时 {elapsed:.0f}秒{eta}")
+
+
+async def register_documents(paths: List[str], copy: bool) -> Dict[str, int]:
+    """登记文档，已登记的文件（路径或内容相同）沿用原记录
+
+    Returns:
+        Dict[str, int]: 文件路径 -> 文档ID
+    """
+    # 文件路径 -> 文档ID或本次新建的文档（提交后才有ID）
+    registered: Dict[str, Union[int, Document]] = {}
+    async with AsyncSessionLocal() as db:
+        known_paths = dict((await db.execute(select(Document.path, Document.id))).all())
+        known_hashes: Dict[str, Union[int, Document]] = dict((await db.execute(
+            select(Document.content_hash, Document.id).where(Document.content_hash.is_not(None))
+        )).all())
+        uncommitted = 0
+        for path in paths:
+            if path in known_paths:
+                registered[path] = known_paths[path]
+                continue
+            content_hash = await asyncio.to_thread(file_sha256, path)
+            if content_hash in known_hashes:
+                print(f"跳过重复文件: {path}")
+                registered[path] = known_hashes[content_hash]
+                continue
+            stored_path = path
+            extension = os.path.splitext(path)[1].lower()
+            if copy:
+                stored_path = os.path.join(uploads_dir, f"{uuid.uuid4()}{extension}")
+                await asyncio.to_thread(shutil.copyfile, path, stored_path)
+                if extension == ".pdf":
+                    await asyncio.to_thread(DocumentProcessor.linearize_pdf, stored_path)
+            document = Document(
+                name=os.path.basename(path),
+                type=FILE_TYPES[extension],
+                path=stored_path,
+                content_hash=content_hash,
+                category="",  # 初始为空，等待AI分析后填入催化反应类型
+                status="uploaded"
+            )
+            db.add(document)
+            registered[path] = known_hashes[content_hash] = document
+            uncommitted += 1
+            if uncommitted >= REGISTER_BATCH_SIZE:
+                await db.commit()
+                uncommitted = 0
+        await db.commit()
+    return {path: value if isinstance(value, int) else value.id for path, value in registered.items()}
+
+
+async def ingest_document(document_id: int, pool: ProcessPoolExecutor, ai_semaphore: asyncio.Semaphore,
+                          stats: IngestStats, extract_only: bool, on_duplicate: str = NEAR_DUPLICATE_ACTION):
+    """提取并分析一篇文档，失败时将文档标记为错误"""
+    loop = asyncio.get_running_loop()
+    async with AsyncSessionLocal() as db:
+        document = await db.get(Document, document_id)
+        path = document.path
+        try:
+            if not extract_only:
+                document.status = "processing"
+                await db.commit()
+            text = await loop.run_in_executor(pool, extract_text, path, document_id)
+            if not text:
+                raise Exception("无法提取文档内容，请检查文件格式是否正确")
+            stats.extracted += 1
+            stats.extracted_bytes += os.path.getsize(path)
+            # 只提取文本时也保存签名，之后可以直接检查重复
+            duplicates = await check_near_duplicates(db, document_id, text)
+            if not extract_only and duplicates and on_duplicate == "hold":
+                document.status = "duplicate"
+                await db.commit()
+                stats.held += 1
+                print(f"疑似重复: {path} 与文档 {duplicates[0]['document_id']}（{duplicates[0]['name']}）"
+                      f"相似度 {duplicates[0]['similarity']:.2f}，已暂停")
+                return
+            if not extract_only and duplicates and on_duplicate == "reuse":
+                await reuse_analysis(db, document_id, duplicates[0]["document_id"])
+            elif not extract_only:
+                async with ai_semaphore:
+                    analysis_json = await run_llm_task(analyze_document_content, text)
+                await save_analysis_result(db, document_id, analysis_json, select_analysis_items(analysis_json))
+            if not extract_only:
+                stats.analyzed += 1
+        except Exception as e:
+            stats.failed += 1
+            main_logger.error(f"导入文档 {document_id} 失败（{path}）: {str(e)}")
+            print(f"失败: {path}: {str(e)}")
+            if not extract_only:
+                await db.rollback()
+                document = await db.get(Document, document_id)
+                document.status = "error"
+                await db.commit()
+
+
+async def report_periodically(stats: IngestStats):
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        print(stats.report(), flush=True)
+
+
+async def ingest(args) -> int:
+    paths = find_documents(args.directory, recursive=not args.no_recursive)
+    print(f"在 {args.directory} 中找到 {len(paths)} 个文档")
+    registered = await register_documents(paths, args.copy)
+
+    # 已分析的文档跳过；之前中断（uploaded/processing）的文档重新处理
+    statuses = {"uploaded", "processing"} | ({"error"} if args.retry_errors else set())
+    if args.extract_only:
+        statuses |= {"analyzed"}
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(Document.id, Document.status).where(Document.id.in_(set(registered.values())))
+        )).all()
+    todo = sorted(row.id for row in rows if row.status in statuses)
+    if args.limit:
+        todo = todo[:args.limit]
+    print(f"已登记 {len(set(registered.values()))} 篇，本次处理 {len(todo)} 篇")
+    if not todo:
+        return 0
+
+    stats = IngestStats(len(todo), args.extract_only)
+    ai_semaphore = asyncio.Semaphore(args.workers)
+    # 同时处理的文档数有上限，避免提前提取的文本全部堆积在内存中
+    in_flight = asyncio.Semaphore(args.workers + args.extract_workers)
+
+    async def run_one(document_id: int):
+        async with in_flight:
+            await ingest_document(document_id, pool, ai_semaphore, stats, args.extract_only, args.on_duplicate)
+
+    reporter = asyncio.create_task(report_periodically(stats))
+    try:
+        with ProcessPoolExecutor(max_workers=args.extract_workers) as pool:
+            await asyncio.gather(*(run_one(document_id) for document_id in todo))
+    finally:
+        reporter.cancel()
+        print(stats.report(final=True))
+    return 1 if stats.failed else 0
+
+
+async def main_async(args) -> int:
+    try:
+        return await ingest(args)
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="命令行批量导入文献")
+    parser.add_argument("directory", help="文献所在目录")
+    parser.add_argument("--workers", type=int, default=4, help="同时进行AI分析的文档数（默认4）")
+    parser.add_argument("--extract-workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="提取文本的进程数（默认CPU核数-1）")
+    parser.add_argument("--copy", action="store_true", help="将文件复制到 uploads 目录，而不是登记原路径")
+    parser.add_argument("--no-recursive", action="store_true", help="不遍历子目录")
+    parser.add_argument("--extract-only", action="store_true", help="只提取并缓存文本，不进行AI分析")
+    parser.add_argument("--retry-errors", action="store_true", help="重新分析之前失败的文档")
+    parser.add_argument("--on-duplicate", choices=DUPLICATE_ACTIONS, default=NEAR_DUPLICATE_ACTION,
+                        help="与已分析的文献疑似重复时：hold 暂停、reuse 复用已有分析结果、analyze 照常分析"
+                             f"（默认{NEAR_DUPLICATE_ACTION}）")
+    parser.add_argument("--limit", type=int, default=0, help="本次最多处理的文档数")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"目录不存在: {args.directory}")
+    os.makedirs(uploads_dir, exist_ok=True)
+    run_migrations()
+    try:
+        sys.exit(asyncio.run(main_async(args)))
+    except KeyboardInterrupt:
+        print("已中断，重新执行同一命令即可继续")
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,10 +13,10 @@ os.makedirs(uploads_dir, exist_ok=True)
 os.makedirs(results_dir, exist_ok=True)
 
 # 初始化数据库表结构
-from models import Base, engine, create_tables
+from migrations import run_migrations
 
-# 确保数据库表被创建
-create_tables()
+# 执行数据库结构迁移，已有数据库会原地升级
+run_migrations()
 
 print("数据库初始化成功！")
 print(f"当前工作目录: {os.getcwd()}")
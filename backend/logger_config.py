@@ -1,23 +1,111 @@
-import os
+import atexit
+import gzip
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 日志级别
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# 单条日志消息的最大字符数，超出部分截断（0 表示不截断）
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "4000"))
+# AI原始响应在文本日志中只保留前若干字符，完整内容写入压缩归档
+AI_RESPONSE_PREVIEW_CHARS = int(os.getenv("AI_RESPONSE_PREVIEW_CHARS", "500"))
+# 完整AI响应归档（按天保存为 gzip 压缩的 NDJSON）及保留天数（0 表示不清理）
+AI_RESPONSE_ARCHIVE = os.getenv("AI_RESPONSE_ARCHIVE", "true").lower() in ("1", "true", "yes")
+AI_RESPONSE_ARCHIVE_DAYS = int(os.getenv("AI_RESPONSE_ARCHIVE_DAYS", "30"))
+
+_listeners = []
+
+
+def _truncate(text: str, limit: int) -> str:
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}...（已截断，共 {len(text)} 字符）"
+
+
+class TruncatingFormatter(logging.Formatter):
+    """截断过长的日志消息；带 payload 的记录只输出其开头部分"""
+
+    def format(self, record):
+        text = super().format(record)
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            preview = json.dumps(payload, ensure_ascii=False)
+            text = f"{text}: {_truncate(preview, AI_RESPONSE_PREVIEW_CHARS)}"
+        return _truncate(text, LOG_MAX_MESSAGE_CHARS)
+
+
+class ArchiveHandler(logging.Handler):
+    """把带 payload 的记录完整写入按天分割的 gzip 压缩 NDJSON 文件
+
+    每条记录追加为一个独立的 gzip 成员，文件可直接用 gzip 或 zcat 读取。
+    """
+
+    def __init__(self, archive_dir: str, keep_days: int = AI_RESPONSE_ARCHIVE_DAYS):
+        super().__init__()
+        self.archive_dir = archive_dir
+        self.keep_days = keep_days
+        self.current_date = None
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def _remove_expired(self):
+        if self.keep_days <= 0:
+            return
+        expire_before = time.time() - self.keep_days * 86400
+        for name in os.listdir(self.archive_dir):
+            path = os.path.join(self.archive_dir, name)
+            if name.endswith(".ndjson.gz") and os.path.getmtime(path) < expire_before:
+                os.remove(path)
+
+    def emit(self, record):
+        payload = getattr(record, "payload", None)
+        if payload is None:
+            return
+        try:
+            date = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d")
+            if date != self.current_date:
+                self.current_date = date
+                self._remove_expired()
+            line = json.dumps({
+                "time": datetime.fromtimestamp(record.created).isoformat(timespec="seconds"),
+                "label": record.getMessage(),
+                "document_id": getattr(record, "document_id", None),
+                "payload": payload,
+            }, ensure_ascii=False)
+            with gzip.open(os.path.join(self.archive_dir, f"{date}.ndjson.gz"), "at", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except Exception:
+            self.handleError(record)
+
 
-def setup_logger(name, log_file, level=logging.INFO):
+def setup_logger(name, log_file, level=LOG_LEVEL, archive_dir=None):
     """设置日志记录器
-    
+
+    记录器只挂一个 QueueHandler，调用方只把记录放入队列；文件、控制台和归档的写入
+    由后台线程中的 QueueListener 完成，不会阻塞事件循环。
+
     Args:
         name: 日志记录器名称
         log_file: 日志文件路径
         level: 日志级别
+        archive_dir: 完整 payload 的压缩归档目录，为None时不归档
     """
     # 创建日志目录
     log_dir = os.path.dirname(log_file)
     os.makedirs(log_dir, exist_ok=True)
-    
+
     # 创建日志记录器
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    
+
     # 创建文件处理器
     file_handler = RotatingFileHandler(
         log_file,
@@ -25,25 +113,48 @@ def setup_logger(name, log_file, level=logging.INFO):
         backupCount=5,
         encoding='utf-8'
     )
-    file_handler.setLevel(level)
-    
+
     # 创建控制台处理器
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(level)
-    
+
     # 设置日志格式
-    formatter = logging.Formatter(
+    formatter = TruncatingFormatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
-    
-    # 添加处理器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+    handlers = [file_handler, console_handler]
+    if archive_dir:
+        handlers.append(ArchiveHandler(archive_dir))
+
+    # 记录器与后台线程之间的队列
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    logger.addHandler(QueueHandler(log_queue))
+
     return logger
 
+
+def stop_logging():
+    """写完队列中剩余的日志并停止后台线程（进程退出时自动调用）"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(stop_logging)
+
+
+def log_ai_response(label: str, payload, document_id=None):
+    """记录AI原始响应
+
+    文本日志中只保留开头部分（AI_RESPONSE_PREVIEW_CHARS），完整内容写入压缩归档。
+    序列化和写入都在日志线程中完成。
+    """
+    ai_response_logger.info(label, extra={"payload": payload, "document_id": document_id})
+
+
 # 创建日志目录
 log_dir = os.path.join(os.path.dirname(__file__), 'logs')
 os.makedirs(log_dir, exist_ok=True)
@@ -63,5 +174,6 @@ main_logger = setup_logger(
 # 设置AI分析响应日志记录器
 ai_response_logger = setup_logger(
     'ai_response',
-    os.path.join(log_dir, 'analysis_responses.log')
-)
\ No newline at end of file
+    os.path.join(log_dir, 'analysis_responses.log'),
+    archive_dir=os.path.join(log_dir, 'ai_responses') if AI_RESPONSE_ARCHIVE else None
+)
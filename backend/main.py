@@ -2,7 +2,6 @@
 import sys
 import codecs
 import os
-import shutil
 import json
 import uuid
 import asyncio
@@ -11,18 +10,33 @@ import re
 import requests
 from datetime import datetime
 from typing import List, Optional, Dict
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Form, HTTPException, Query, Depends, BackgroundTasks, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+from sqlalchemy import select, func
+from sqlalchemy.orm import undefer
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
 from dotenv import load_dotenv
-from models import Document, Analysis, get_db, create_tables
+from models import Document, Analysis, AnalysisHistory, ActivityValue, AsyncSessionLocal, async_engine, get_async_db
+from migrations import run_migrations
 
 from websocket_service import progress_manager
-from ai_service import call_openrouter_api, analyze_document_content
+from ai_service import call_openrouter_api, analyze_document_content, analyze_items, run_llm_task
+from analysis_schema import find_invalid_fields
 from document_processor import DocumentProcessor
-from logger_config import main_logger, ai_response_logger
+from upload_stream import UploadError, save_upload_batch, save_upload_stream
+from page_cache import (PageNotFound, PdfUnreadable, ThumbnailUnavailable, clamp_thumbnail_width,
+                        clear_page_cache, get_page_count, get_page_text, get_page_thumbnail)
+from logger_config import main_logger, log_ai_response
+from analysis_results import apply_analysis_result, reuse_analysis, save_analysis_result, store_activity_values
+from near_duplicates import (DUPLICATE_ACTIONS, NEAR_DUPLICATE_ACTION, NEAR_DUPLICATE_THRESHOLD, check_near_duplicates,
+                             find_duplicate_groups, find_near_duplicates, load_signatures, signature_from_bytes)
+from exporter import EXPORT_FORMATS, ExportFilters, iter_export
+from comparison import DEFAULT_MAX_GROUPS, compare_activity
+from metrics import ANALYSIS_JOBS, CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
 
 # from pagination_service import PaginationService, VirtualScrollService
 # from file_optimizer import file_optimizer, streaming_processor
@@ -32,22 +46,13 @@ app = FastAPI(title="文献分析工具API", description="用于文献上传、
 
 
 
-# 配置CORS和安全响应头中间件
+# 配置CORS、安全响应头和响应压缩中间件
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from http_middleware import SecurityHeadersMiddleware, CompressionMiddleware, RangeFileResponse, make_etag, cache_headers, not_modified
 
 # 导入AI聊天路由
 from ai_chat import router as chat_router
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        # 添加安全响应头
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, proxy-revalidate'
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        return response
-
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -55,9 +60,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # PDF.js 跨域按范围加载文件时需要读取这些响应头
+    expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "Content-Encoding", "ETag"],
 )
 
-# 添加安全响应头中间件
+# 添加响应压缩和安全响应头中间件
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
 
 # 注册AI聊天路由
@@ -69,28 +77,52 @@ results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"
 os.makedirs(uploads_dir, exist_ok=True)
 os.makedirs(results_dir, exist_ok=True)
 
+def is_uploaded_file(path: Optional[str]) -> bool:
+    """文件是否保存在上传目录中（由本服务管理，可以随文档一起删除）"""
+    if not path:
+        return False
+    try:
+        return os.path.commonpath([os.path.realpath(path), os.path.realpath(uploads_dir)]) == os.path.realpath(uploads_dir)
+    except ValueError:
+        # 不同盘符等无法比较的路径
+        return False
+
 # 挂载静态文件目录
 app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
 app.mount("/results", StaticFiles(directory=results_dir), name="results")
 
-# 创建数据库表
-create_tables()
+# 执行数据库结构迁移（创建表、索引等）
+run_migrations()
+
+@app.on_event("shutdown")
+async def close_database_connections():
+    """关闭连接池中的异步数据库连接（aiosqlite连接各自占用一个线程）"""
+    await async_engine.dispose()
 
 # 工具函数：调用AI服务进行文献分析
 # 导入所需的模块和变量
 from websocket_service import progress_manager
 
-async def analyze_document_with_ai(document_path: str, document_id: int):
-    """使用AI服务分析文档内容，并实时更新分析进度"""
+async def analyze_document_with_ai(document_path: str, document_id: int, on_duplicate: Optional[str] = None):
+    """使用AI服务分析文档内容，并实时更新分析进度
+
+    调用AI之前检查是否与已分析的文献疑似重复（同一论文的不同版本），
+    on_duplicate 为 hold 时暂停等待确认，为 reuse 时复用已有分析结果，为 analyze 时照常分析；
+    未指定时使用 NEAR_DUPLICATE_ACTION。
+    """
+    on_duplicate = on_duplicate or NEAR_DUPLICATE_ACTION
     db = None # 初始化db为None
+    ANALYSIS_JOBS.labels("running").inc()
+    # 先初始化进度，之后任何一步失败都能在进度中记录错误
+    progress_manager.init_progress(document_id)
     try:
-        db = next(get_db()) # 在函数内部获取新的数据库会话
+        db = AsyncSessionLocal() # 在函数内部获取新的数据库会话
         main_logger.info(f"开始分析文档 {document_id}")
         # 获取分析项目列表
         analysis_items = progress_manager.analysis_items
         
         # 更新文档状态为处理中
-        document = db.query(Document).filter(Document.id == document_id).first()
+        document = await db.get(Document, document_id)
         if not document:
             main_logger.error(f"文档 {document_id} 不存在")
             raise Exception("文档不存在")
@@ -98,7 +130,7 @@ async def analyze_document_with_ai(document_path: str, document_id: int):
         # 提取文档内容
         main_logger.info(f"开始提取文档 {document_id} 的内容，路径：{document_path}")
         processor = DocumentProcessor()
-        document_content = processor.process_document(document_path, document_id)
+        document_content = await asyncio.to_thread(processor.get_document_text, document_path, document_id)
         
         # 如果文档内容提取失败
         if not document_content:
@@ -114,7 +146,27 @@ async def analyze_document_with_ai(document_path: str, document_id: int):
         main_logger.info(f"文档 {document_id} 内容提取完成")
         progress_manager.update_progress(document_id, "文档内容提取完成", 20)
         document.status = "processing"
-        db.commit()
+        await db.commit()
+
+        # 在调用AI之前检查疑似重复的文献
+        duplicates = await check_near_duplicates(db, document_id, document_content)
+        if duplicates:
+            main_logger.info(f"文档 {document_id} 与已分析的文档疑似重复: {duplicates}")
+            if on_duplicate == "reuse":
+                await reuse_analysis(db, document_id, duplicates[0]["document_id"])
+                progress = progress_manager.ensure_progress(document_id)
+                progress["status"] = "completed"
+                progress["overall_progress"] = 100
+                await progress_manager.broadcast_progress(document_id, progress)
+                return True
+            if on_duplicate == "hold":
+                document.status = "duplicate"
+                await db.commit()
+                progress = progress_manager.ensure_progress(document_id)
+                progress["status"] = "duplicate"
+                progress["duplicates"] = duplicates
+                await progress_manager.broadcast_progress(document_id, progress)
+                return True
         
         # 调用AI服务分析文档内容
         # 使用ai_service.py中的函数进行文档分析
@@ -127,7 +179,7 @@ async def analyze_document_with_ai(document_path: str, document_id: int):
         try:
             # 更新进度
             progress_manager.update_progress(document_id, "正在调用AI服务分析文档", 30)
-            await progress_manager.broadcast_progress(document_id, progress_manager.get_progress(document_id))
+            await progress_manager.broadcast_progress(document_id, progress_manager.ensure_progress(document_id))
             
             # 使用ai_service.py中的函数进行文档分析
             # 在调用 analyze_document_content 前检查整体超时
@@ -136,10 +188,11 @@ async def analyze_document_with_ai(document_path: str, document_id: int):
                 await progress_manager.broadcast_progress(document_id, {"status": "error", "error_message": "整体分析超时，请稍后重试"})
                 raise Exception("整体分析超时，请稍后重试")
 
-            analysis_json = analyze_document_content(document_content)
+            # 在AI调用专用线程池中执行，限流等待和退避重试不会阻塞事件循环
+            analysis_json = await run_llm_task(analyze_document_content, document_content)
             main_logger.info(f"文档 {document_id} AI分析完成")
-            # 记录原始AI响应到日志文件
-            ai_response_logger.info(f"Document ID: {document_id}, AI Response: {json.dumps(analysis_json, ensure_ascii=False)}")
+            # 解析后的完整结果写入压缩归档，文本日志只保留开头部分
+            log_ai_response("Parsed AI Result", analysis_json, document_id=document_id)
         except Exception as e:
             main_logger.error(f"调用AI服务分析文档内容时出错: {str(e)}")
             await progress_manager.broadcast_progress(document_id, {"status": "error", "error_message": f"AI服务调用失败: {str(e)}"})            
@@ -150,7 +203,7 @@ async def analyze_document_with_ai(document_path: str, document_id: int):
         for item in analysis_items:
             main_logger.info(f"文档 {document_id} 正在处理分析项目: {item}")
             # 更新当前正在分析的项目
-            progress = progress_manager.get_progress(document_id)
+            progress = progress_manager.ensure_progress(document_id)
             progress["current_item"] = item
             await progress_manager.broadcast_progress(document_id, progress)
             
@@ -180,50 +233,11 @@ async def analyze_document_with_ai(document_path: str, document_id: int):
             # 短暂延迟，模拟分析过程
             await asyncio.sleep(0.5)
         
-        # 提取结构化数据
-        title = result_json.get("文献标题", "")
-        authors = json.dumps(result_json.get("作者列表", []), ensure_ascii=False)
-        publication = result_json.get("发表期刊/会议", "")
-        year = result_json.get("发表年份", "")
-        abstract = result_json.get("摘要", "")
-        keywords = json.dumps(result_json.get("关键词", []), ensure_ascii=False)
-        
-        # 提取AI识别的催化反应类型
-        ai_reaction_type = result_json.get("催化反应类型", "")
-        main_logger.info(f"文档 {document_id} AI识别的反应类型: {ai_reaction_type}")
-        
-        # 保存分析结果
-        analysis = Analysis(
-            document_id=document_id,
-            title=title,
-            authors=authors,
-            publication=publication,
-            year=year,
-            abstract=abstract,
-            keywords=keywords,
-            content=json.dumps(result_json, ensure_ascii=False, indent=2).encode('utf-8').decode('utf-8'),
-            raw_ai_response=json.dumps(analysis_json, ensure_ascii=False, indent=2).encode('utf-8').decode('utf-8') # 保存原始AI响应
-        )
-        
-        db.add(analysis)
-        db.commit()
-        
-        # 更新文档状态和AI识别的反应类型
-        document = db.query(Document).filter(Document.id == document_id).first()
-        if document:
-            document.status = "analyzed"
-            # 如果AI成功识别了反应类型，则更新文档的category字段
-            if ai_reaction_type and ai_reaction_type.strip():
-                document.category = ai_reaction_type
-                main_logger.info(f"文档 {document_id} 的分类已更新为: {ai_reaction_type}")
-            else:
-                # 如果AI没有识别出反应类型，保持category为空
-                document.category = ""
-                main_logger.info(f"文档 {document_id} 未能识别出催化反应类型，分类保持为空")
-            db.commit()
+        # 保存分析结果，与命令行批量导入共用
+        await save_analysis_result(db, document_id, analysis_json, result_json)
         
         # 更新最终进度状态
-        progress = progress_manager.get_progress(document_id)
+        progress = progress_manager.ensure_progress(document_id)
         progress["status"] = "completed"
         progress["overall_progress"] = 100
         await progress_manager.broadcast_progress(document_id, progress)
@@ -232,26 +246,111 @@ async def analyze_document_with_ai(document_path: str, document_id: int):
     except Exception as e:
         print(f"分析文档时出错: {str(e)}", flush=True)
         # 更新文档状态为错误
-        document = db.query(Document).filter(Document.id == document_id).first()
-        if document:
-            document.status = "error"
-            db.commit()
+        if db:
+            await db.rollback()
+            document = await db.get(Document, document_id)
+            if document:
+                document.status = "error"
+                await db.commit()
         
         # 更新进度状态为错误
-        progress = progress_manager.get_progress(document_id)
+        progress = progress_manager.ensure_progress(document_id)
         progress["status"] = "error"
         progress["error_message"] = str(e)
         await progress_manager.broadcast_progress(document_id, progress)
         
         return False
     finally:
+        ANALYSIS_JOBS.labels("running").dec()
         if db: # 确保在函数结束时关闭数据库会话
-            db.close()
+            await db.close()
+
+async def reanalyze_items_with_ai(document_id: int, items: List[str], overwrite: bool = False):
+    """仅重新分析指定项目，复用缓存的文档文本，并将结果合并到已有分析结果中
+
+    Args:
+        document_id: 文档ID
+        items: 需要重新分析的项目
+        overwrite: 是否覆盖已有的有效数据，默认只填补缺失或无效的项目
+    """
+    db = None
+    try:
+        db = AsyncSessionLocal()
+        main_logger.info(f"开始部分重新分析文档 {document_id}，项目: {items}")
+        document = await db.get(Document, document_id)
+        if not document:
+            raise Exception("文档不存在")
+        analysis = await db.scalar(
+            select(Analysis).where(Analysis.document_id == document_id)
+            .options(undefer(Analysis.content), undefer(Analysis.raw_ai_response))
+        )
+        if not analysis:
+            raise Exception("分析结果不存在，无法进行部分重新分析")
+
+        progress_manager.init_progress(document_id)
+        document_content = await asyncio.to_thread(DocumentProcessor().get_document_text, document.path, document_id)
+        if not document_content:
+            raise Exception("无法提取文档内容，请检查文件格式是否正确")
+        await progress_manager.broadcast_progress(document_id, progress_manager.ensure_progress(document_id))
+
+        new_fields = await run_llm_task(analyze_items, document_content, items)
+
+        existing_content = json.loads(analysis.content) if analysis.content else {}
+        raw_response = json.loads(analysis.raw_ai_response) if analysis.raw_ai_response else {}
+        invalid_existing = find_invalid_fields(existing_content, progress_manager.analysis_items)
+        merged_content = dict(existing_content)
+        for item in progress_manager.analysis_items:
+            progress = progress_manager.ensure_progress(document_id)
+            progress["current_item"] = item
+            if item in new_fields and (overwrite or item in invalid_existing):
+                merged_content[item] = new_fields[item]
+                raw_response[item] = new_fields[item]
+                if item == "活性数据" and "activity_data_markdown" in new_fields:
+                    raw_response["activity_data_markdown"] = new_fields["activity_data_markdown"]
+                main_logger.info(f"文档 {document_id} 项目 {item} 已通过部分重新分析更新")
+            if item not in invalid_existing or item in new_fields:
+                progress = progress_manager.update_progress(document_id, item, "completed")
+            else:
+                progress = progress_manager.update_progress(document_id, item, "skipped")
+            await progress_manager.broadcast_progress(document_id, progress)
+
+        db.add(AnalysisHistory.from_analysis(analysis))
+        apply_analysis_result(analysis, merged_content)
+        await store_activity_values(db, document_id, merged_content)
+        analysis.raw_ai_response = json.dumps(raw_response, ensure_ascii=False)
+        ai_reaction_type = merged_content.get("催化反应类型", "")
+        if isinstance(ai_reaction_type, str) and ai_reaction_type.strip():
+            document.category = ai_reaction_type
+        document.status = "analyzed"
+        await db.commit()
+
+        progress = progress_manager.ensure_progress(document_id)
+        progress["status"] = "completed"
+        progress["overall_progress"] = 100
+        await progress_manager.broadcast_progress(document_id, progress)
+        return True
+    except Exception as e:
+        main_logger.error(f"部分重新分析文档 {document_id} 时出错: {str(e)}", exc_info=True)
+        if db:
+            await db.rollback()
+            document = await db.get(Document, document_id)
+            if document:
+                # 已有的分析结果仍然有效，只有没有分析结果时才标记为错误
+                has_analysis = await db.scalar(select(Analysis.id).where(Analysis.document_id == document_id)) is not None
+                document.status = "analyzed" if has_analysis else "error"
+                await db.commit()
+        progress = progress_manager.ensure_progress(document_id)
+        progress["status"] = "error"
+        progress["error_message"] = str(e)
+        await progress_manager.broadcast_progress(document_id, progress)
+        return False
+    finally:
+        if db:
+            await db.close()
 
 # WebSocket路由
 @app.websocket("/ws/analysis/{document_id}")
 async def websocket_analysis_progress(websocket: WebSocket, document_id: int):
-    db = None
     try:
         # 记录连接尝试
         print(f"[WebSocket] 连接请求 文档ID: {document_id} 来源IP: {websocket.client.host}")
@@ -263,9 +362,8 @@ async def websocket_analysis_progress(websocket: WebSocket, document_id: int):
         print(f"[WebSocket] 文档ID: {document_id} 连接已接受")
         
         # 查询数据库验证文档
-        from models import Document, SessionLocal
-        db = SessionLocal()
-        document = db.query(Document).filter(Document.id == document_id).first()
+        async with AsyncSessionLocal() as db:
+            document = await db.get(Document, document_id)
         if not document:
             await websocket.close(code=4001, reason="文档不存在")
             print(f"[验证失败] 文档ID {document_id} 不存在")
@@ -291,10 +389,6 @@ async def websocket_analysis_progress(websocket: WebSocket, document_id: int):
             print(f"[关闭连接错误] 尝试关闭WebSocket连接时出错: {str(close_error)}")
     
     finally:
-        # 清理资源
-        if db is not None:
-            db.close()
-        
         # 记录详细关闭原因
         close_code = websocket.close_code if hasattr(websocket, 'close_code') and websocket.close_code else 1006
         close_reason = websocket.close_reason if hasattr(websocket, 'close_reason') and websocket.close_reason else "未知原因"
@@ -303,7 +397,20 @@ async def websocket_analysis_progress(websocket: WebSocket, document_id: int):
         # WebSocket连接的断开由progress_manager.connect内部处理
 
 
+@app.websocket("/ws/progress")
+async def websocket_multiplexed_progress(websocket: WebSocket):
+    """多路复用的进度WebSocket：一个连接订阅多个文档（或全部活跃文档），按固定间隔推送增量"""
+    await websocket.accept()
+    await progress_manager.connect_multiplexed(websocket)
+
+
 # API路由
+@app.get("/metrics")
+async def get_metrics():
+    """运行指标（Prometheus 文本格式）：上传大小、文本提取耗时、AI调用耗时与Token数、
+    JSON解析失败次数、队列长度、WebSocket连接数和SQL耗时"""
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/")
 async def read_root():
     return {"message": "文献分析工具API服务正在运行"}
@@ -311,95 +418,257 @@ async def read_root():
 @app.get("/api/analysis/progress/{document_id}")
 async def get_analysis_progress(document_id: int):
     """获取文档分析进度"""
-    progress = progress_manager.get_progress(document_id)
+    progress = await progress_manager.fetch_progress(document_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="文档不存在")
     return progress
 
-@app.post("/api/upload")
+# 上传接口直接读取请求体，手动声明请求格式以便接口文档展示文件字段
+UPLOAD_OPENAPI_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+def validate_duplicate_action(on_duplicate: Optional[str]):
+    if on_duplicate is not None and on_duplicate not in DUPLICATE_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"on_duplicate 只能是 {', '.join(DUPLICATE_ACTIONS)}")
+
+@app.post("/api/upload", openapi_extra=UPLOAD_OPENAPI_SCHEMA)
 async def upload_file(
+    request: Request,
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    on_duplicate: Optional[str] = Query(None, description="与已分析的文献疑似重复时的处理方式：hold、reuse 或 analyze"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """上传文献文件并保存到数据库"""
+    """上传文献文件并保存到数据库
+
+    请求体按块流式写入上传目录，同时计算SHA-256并检查文件大小和文件头，
+    超过大小限制时立即中止接收。
+    """
+    validate_duplicate_action(on_duplicate)
+    file_path = None
+    document_saved = False
     try:
-        # 检查文件类型
-        if not (file.filename.endswith(".pdf") or file.filename.endswith(".docx") or file.filename.endswith(".doc")):
-            raise HTTPException(status_code=400, detail="只支持PDF和Word文档格式")
-        
-        # 检查文件大小
-        file_size = 0
-        chunk_size = 1024 * 1024  # 1MB
-        file.file.seek(0, 2)  # 移动到文件末尾
-        file_size = file.file.tell()  # 获取文件大小
-        file.file.seek(0)  # 重置文件指针
-        
-        # 如果文件过大，返回错误
-        if file_size > 50 * 1024 * 1024:  # 50MB
-            raise HTTPException(status_code=400, detail="文件大小超过限制（最大50MB）")
-        
-        # 生成唯一文件名
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(uploads_dir, unique_filename)
-        
-        # 保存文件
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            main_logger.info(f"文件 {file.filename} 已保存到 {file_path}，大小: {file_size/1024/1024:.2f}MB")
-        except Exception as e:
-            main_logger.error(f"文件处理失败: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"文件处理失败: {str(e)}")
-        
-        # 确定文件类型
-        if file.filename.endswith(".pdf"):
-            file_type = "PDF"
-        else:
-            file_type = "Word"
+            upload = await save_upload_stream(request, uploads_dir)
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        except ClientDisconnect:
+            main_logger.warning("客户端在上传过程中断开连接")
+            raise HTTPException(status_code=400, detail="上传未完成，连接已断开")
+        file_path = upload.path
+        main_logger.info(f"文件 {upload.filename} 已保存到 {file_path}，大小: {upload.size/1024/1024:.2f}MB，"
+                         f"SHA-256: {upload.content_hash}")
+
+        duplicate_id = await db.scalar(select(Document.id).where(Document.content_hash == upload.content_hash).limit(1))
+        if duplicate_id is not None:
+            main_logger.info(f"文件 {upload.filename} 与已上传的文档 {duplicate_id} 内容相同")
+
+        # 转换为线性化PDF，便于预览时按需加载页面（qpdf不可用时跳过）
+        # 线性化会重写文件，content_hash 保留原始上传内容的哈希，以便识别同一文件的重复上传
+        if upload.extension == ".pdf":
+            try:
+                await asyncio.to_thread(DocumentProcessor.linearize_pdf, file_path)
+            except Exception as e:
+                main_logger.error(f"文件处理失败: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"文件处理失败: {str(e)}")
         
         # 创建数据库记录
         document = Document(
-            name=file.filename,
-            type=file_type,
+            name=upload.filename,
+            type=upload.file_type,
             path=file_path,
+            content_hash=upload.content_hash,
             category="",  # 初始为空，等待AI分析后填入催化反应类型
             status="uploaded"  # 先设置为已上传状态
         )
         
         db.add(document)
-        db.commit()
-        db.refresh(document)
+        await db.commit()
+        document_saved = True
+        await db.refresh(document)
         
         # 初始化分析进度，确保WebSocket可以立即获取进度信息
         progress_manager.init_progress(document.id)
         
         # 更新状态为处理中
         document.status = "processing"
-        db.commit()
+        await db.commit()
         
         # 在后台任务中分析文档
         try:
-            background_tasks.add_task(analyze_document_with_ai, file_path, document.id)
+            background_tasks.add_task(analyze_document_with_ai, file_path, document.id, on_duplicate)
             main_logger.info(f"已启动文档 {document.id} 的分析任务")
         except Exception as e:
             main_logger.error(f"启动分析任务失败: {str(e)}")
             document.status = "error"
-            db.commit()
+            await db.commit()
             raise HTTPException(status_code=500, detail=f"启动分析任务失败: {str(e)}")
         
-        return {"id": document.id, "name": file.filename, "status": "processing"}
+        return {"id": document.id, "name": upload.filename, "status": "processing"}
     
-    except HTTPException as e:
-        # 直接重新抛出HTTP异常
-        raise
     except Exception as e:
+        # 文档记录写入前失败时删除已保存的文件，避免留下孤立文件
+        if not document_saved and file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        if isinstance(e, HTTPException):
+            # 直接重新抛出HTTP异常
+            raise
         main_logger.error(f"文件上传失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
 
+# 批量上传后同时分析的文档数（每篇文档内部的AI请求另受 LLM_MAX_CONCURRENCY 限制）
+BATCH_ANALYSIS_CONCURRENCY = int(os.getenv("BATCH_ANALYSIS_CONCURRENCY", "2"))
+
+UPLOAD_BATCH_OPENAPI_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+            "required": ["files"],
+        }}},
+    }
+}
+
+async def analyze_batch_with_ai(batch_id: str, documents: List[Dict], on_duplicate: Optional[str] = None):
+    """依次分析一个批次中的文档，最多同时分析 BATCH_ANALYSIS_CONCURRENCY 篇"""
+    semaphore = asyncio.Semaphore(BATCH_ANALYSIS_CONCURRENCY)
+    started_at = time.time()
+
+    async def analyze_one(document: Dict):
+        async with semaphore:
+            ANALYSIS_JOBS.labels("queued").dec()
+            try:
+                await analyze_document_with_ai(document["path"], document["id"], on_duplicate)
+            except Exception as e:
+                main_logger.error(f"批次 {batch_id} 中文档 {document['id']} 分析失败: {str(e)}")
+
+    main_logger.info(f"开始分析批次 {batch_id}，共 {len(documents)} 篇文档")
+    ANALYSIS_JOBS.labels("queued").inc(len(documents))
+    await asyncio.gather(*(analyze_one(document) for document in documents))
+    main_logger.info(f"批次 {batch_id} 分析结束，耗时 {time.time() - started_at:.1f}秒")
+
+@app.post("/api/upload/batch", openapi_extra=UPLOAD_BATCH_OPENAPI_SCHEMA)
+async def upload_files_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    on_duplicate: Optional[str] = Query(None, description="与已分析的文献疑似重复时的处理方式：hold、reuse 或 analyze"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """批量上传文献文件
+
+    一次请求上传多个文件（表单字段 files 可重复），所有文档记录在同一个事务中写入，
+    并作为一个批次在后台分析。单个文件不符合要求时只返回该文件的错误，不影响其他文件。
+    """
+    validate_duplicate_action(on_duplicate)
+    try:
+        results = await save_upload_batch(request, uploads_dir)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    except ClientDisconnect:
+        main_logger.warning("客户端在批量上传过程中断开连接")
+        raise HTTPException(status_code=400, detail="上传未完成，连接已断开")
+
+    uploads = [result for _, result in results if not isinstance(result, UploadError)]
+    # 线性化在线程中并行执行（qpdf不可用时跳过）
+    await asyncio.gather(*(asyncio.to_thread(DocumentProcessor.linearize_pdf, upload.path)
+                           for upload in uploads if upload.extension == ".pdf"))
+
+    batch_id = str(uuid.uuid4())
+    documents = {
+        upload.path: Document(
+            name=upload.filename,
+            type=upload.file_type,
+            path=upload.path,
+            content_hash=upload.content_hash,
+            category="",  # 初始为空，等待AI分析后填入催化反应类型
+            status="processing",
+            batch_id=batch_id
+        )
+        for upload in uploads
+    }
+    if documents:
+        try:
+            db.add_all(documents.values())
+            await db.commit()
+        except Exception as e:
+            main_logger.error(f"批量上传写入数据库失败: {str(e)}")
+            await db.rollback()
+            for upload in uploads:
+                if os.path.exists(upload.path):
+                    os.remove(upload.path)
+            raise HTTPException(status_code=500, detail=f"批量上传失败: {str(e)}")
+
+        for document in documents.values():
+            progress_manager.init_progress(document.id)
+        background_tasks.add_task(
+            analyze_batch_with_ai, batch_id,
+            [{"id": document.id, "path": document.path} for document in documents.values()], on_duplicate
+        )
+    main_logger.info(f"批次 {batch_id}: 收到 {len(results)} 个文件，成功 {len(documents)} 个")
+
+    files = []
+    for filename, result in results:
+        if isinstance(result, UploadError):
+            files.append({"name": filename, "error": result.message})
+        else:
+            files.append({"name": filename, "id": documents[result.path].id, "status": "processing"})
+    return {
+        "batch_id": batch_id if documents else None,
+        "total": len(results),
+        "accepted": len(documents),
+        "failed": len(results) - len(documents),
+        "files": files
+    }
+
+@app.get("/api/upload/batch/{batch_id}")
+async def get_batch_progress(batch_id: str, db: AsyncSession = Depends(get_async_db)):
+    """获取批量上传批次的汇总分析进度
+
+    疑似重复而暂停（status 为 duplicate）的文档计入 held，进度为0；有这样的文档时
+    批次状态为 held，等待用户确认后才算完成。
+    """
+    rows = (await db.execute(
+        select(Document.id, Document.name, Document.status).where(Document.batch_id == batch_id).order_by(Document.id)
+    )).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="批次不存在")
+
+    progress = {row.id: await progress_manager.fetch_progress(row.id) for row in rows if row.status == "processing"}
+    documents = []
+    for row in rows:
+        if row.status == "processing":
+            percent = (progress.get(row.id) or {}).get("overall_progress", 0)
+        elif row.status == "duplicate":
+            percent = 0
+        else:
+            percent = 100
+        documents.append({"id": row.id, "name": row.name, "status": row.status, "overall_progress": percent})
+    counts = {status: sum(1 for row in rows if row.status == status)
+              for status in ("processing", "analyzed", "error", "duplicate")}
+    return {
+        "batch_id": batch_id,
+        "total": len(rows),
+        "processing": counts["processing"],
+        "completed": counts["analyzed"],
+        "failed": counts["error"],
+        "held": counts["duplicate"],
+        "overall_progress": int(sum(document["overall_progress"] for document in documents) / len(documents)),
+        "status": "processing" if counts["processing"] else ("held" if counts["duplicate"] else "completed"),
+        "documents": documents
+    }
+
 @app.get("/api/documents")
-async def get_documents(db: Session = Depends(get_db)):
+async def get_documents(db: AsyncSession = Depends(get_async_db)):
     """获取所有已上传的文档"""
-    documents = db.query(Document).all()
+    documents = (await db.scalars(select(Document))).all()
     return [doc.to_dict() for doc in documents]
 
 # @app.get("/api/documents/paginated")
@@ -410,7 +679,7 @@ async def get_documents(db: Session = Depends(get_db)):
 #     category: str = None,
 #     sort_by: str = 'created_at',
 #     sort_order: str = 'desc',
-#     db: Session = Depends(get_db)
+#     db: AsyncSession = Depends(get_async_db)
 # ):
 #     """分页获取文档列表"""
 #     try:
@@ -436,7 +705,7 @@ async def get_documents(db: Session = Depends(get_db)):
 #     category: str = None,
 #     sort_by: str = 'created_at',
 #     sort_order: str = 'desc',
-#     db: Session = Depends(get_db)
+#     db: AsyncSession = Depends(get_async_db)
 # ):
 #     """虚拟滚动获取文档数据"""
 #     try:
@@ -455,52 +724,148 @@ async def get_documents(db: Session = Depends(get_db)):
 #         raise HTTPException(status_code=500, detail="获取文档数据失败")
 
 @app.get("/api/documents/categories")
-async def get_document_categories(db: Session = Depends(get_db)):
+async def get_document_categories(db: AsyncSession = Depends(get_async_db)):
     """获取所有文档分类"""
     try:
-        categories = PaginationService.get_document_categories(db)
+        result = await db.scalars(select(Document.category).distinct().where(Document.category != ""))
+        categories = sorted(category for category in result.all() if category)
         return {"categories": categories}
     except Exception as e:
         main_logger.error(f"获取文档分类失败: {e}")
         raise HTTPException(status_code=500, detail="获取分类失败")
 
 @app.get("/api/documents/{document_id}")
-async def get_document(document_id: int, db: Session = Depends(get_db)):
+async def get_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取特定文档的详细信息"""
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="文档不存在")
     return document.to_dict()
 
+# 文档文件的Content-Type
+DOCUMENT_MEDIA_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".doc": "application/msword",
+}
+
 @app.get("/api/download/{document_id}")
-async def download_document(document_id: int, db: Session = Depends(get_db)):
-    """下载文档文件"""
-    document = db.query(Document).filter(Document.id == document_id).first()
+async def download_document(document_id: int, request: Request, inline: bool = False,
+                            db: AsyncSession = Depends(get_async_db)):
+    """下载文档文件
+
+    支持 Range 请求（206），PDF.js 可以按需加载页面；inline为True时在浏览器中直接打开。
+    """
+    document = await db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="文档不存在")
+    try:
+        stat_result = os.stat(document.path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="文件不存在")
     
-    return FileResponse(path=document.path, filename=document.name, media_type="application/octet-stream")
+    last_modified = datetime.fromtimestamp(stat_result.st_mtime)
+    etag = make_etag(document.id, stat_result.st_mtime, stat_result.st_size)
+    response = not_modified(request, etag, last_modified)
+    if response:
+        return response
+    media_type = DOCUMENT_MEDIA_TYPES.get(os.path.splitext(document.path)[1].lower(), "application/octet-stream")
+    return RangeFileResponse(document.path, request, stat_result, media_type, filename=document.name,
+                             inline=inline, headers=cache_headers(etag, last_modified))
+
+async def _get_pdf_source(document_id: int, db: AsyncSession):
+    """分页预览接口使用的PDF文档及其文件状态"""
+    document = await db.get(Document, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    if os.path.splitext(document.path)[1].lower() != ".pdf":
+        raise HTTPException(status_code=400, detail="只有PDF文档支持分页预览")
+    try:
+        stat_result = os.stat(document.path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return document, stat_result
+
+@app.get("/api/documents/{document_id}/pages")
+async def get_document_pages(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    """获取PDF文档的页数"""
+    document, _ = await _get_pdf_source(document_id, db)
+    try:
+        page_count = await asyncio.to_thread(get_page_count, document.id, document.path)
+    except PdfUnreadable as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"document_id": document.id, "page_count": page_count}
+
+@app.get("/api/documents/{document_id}/pages/{page}/text")
+async def get_document_page_text(document_id: int, page: int, request: Request,
+                                 db: AsyncSession = Depends(get_async_db)):
+    """获取PDF文档指定页的文本
+
+    首次请求时提取全部页面并缓存到磁盘；ETag由文件版本和页码决定，未变化时返回304。
+    """
+    document, stat_result = await _get_pdf_source(document_id, db)
+    last_modified = datetime.fromtimestamp(stat_result.st_mtime)
+    etag = make_etag(document.id, stat_result.st_mtime, stat_result.st_size, page, "text")
+    response = not_modified(request, etag, last_modified)
+    if response:
+        return response
+    try:
+        text = await asyncio.to_thread(get_page_text, document.id, document.path, page)
+        page_count = await asyncio.to_thread(get_page_count, document.id, document.path)
+    except PageNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PdfUnreadable as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return JSONResponse(
+        content={"document_id": document.id, "page": page, "page_count": page_count, "text": text},
+        headers=cache_headers(etag, last_modified)
+    )
+
+@app.get("/api/documents/{document_id}/pages/{page}/thumbnail")
+async def get_document_page_thumbnail(document_id: int, page: int, request: Request, width: Optional[int] = None,
+                                      db: AsyncSession = Depends(get_async_db)):
+    """获取PDF文档指定页的PNG缩略图
+
+    首次请求时渲染并缓存到磁盘；服务器未安装 pdftoppm 时返回501。
+    """
+    document, stat_result = await _get_pdf_source(document_id, db)
+    width = clamp_thumbnail_width(width)
+    last_modified = datetime.fromtimestamp(stat_result.st_mtime)
+    etag = make_etag(document.id, stat_result.st_mtime, stat_result.st_size, page, "thumbnail", width)
+    response = not_modified(request, etag, last_modified)
+    if response:
+        return response
+    try:
+        image = await asyncio.to_thread(get_page_thumbnail, document.id, document.path, page, width)
+    except PageNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ThumbnailUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except PdfUnreadable as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return Response(content=image, media_type="image/png", headers=cache_headers(etag, last_modified))
 
 @app.delete("/api/documents/{document_id}")
-async def delete_document(document_id: int, db: Session = Depends(get_db)):
+async def delete_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
     """删除文档及其相关数据"""
     try:
         # 查找文档
-        document = db.query(Document).filter(Document.id == document_id).first()
+        document = await db.get(Document, document_id)
         if not document:
             raise HTTPException(status_code=404, detail="文档不存在")
         
-        # 删除文件
+        # 删除文件：只删除上传目录中的文件，命令行导入时原地登记的文件属于用户，不能删除
         try:
-            if os.path.exists(document.path):
+            if is_uploaded_file(document.path) and os.path.exists(document.path):
                 os.remove(document.path)
         except Exception as e:
             main_logger.error(f"删除文件失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"删除文件失败: {str(e)}")
         
         # 删除数据库记录（级联删除会自动删除相关的分析记录）
-        db.delete(document)
-        db.commit()
+        await db.delete(document)
+        await db.commit()
+        await asyncio.to_thread(clear_page_cache, document_id)
         
         return {"message": "文档已成功删除"}
     except HTTPException as e:
@@ -513,10 +878,10 @@ async def delete_document(document_id: int, db: Session = Depends(get_db)):
 async def analyze_document(
     document_id: int,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """手动触发文档分析"""
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="文档不存在")
     
@@ -526,7 +891,7 @@ async def analyze_document(
     
     # 更新状态为处理中
     document.status = "processing"
-    db.commit()
+    await db.commit()
     
     # 初始化分析进度
     progress_manager.init_progress(document.id)
@@ -537,86 +902,299 @@ async def analyze_document(
     return {"message": "文档分析已开始", "document_id": document_id}
 
 @app.get("/api/analysis/{document_id}")
-async def get_analysis(document_id: int, db: Session = Depends(get_db)):
+async def get_analysis(document_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """获取文档的分析结果"""
-    analysis = db.query(Analysis).filter(Analysis.document_id == document_id).first()
+    # 先只查询版本信息，客户端缓存有效时不读取大字段
+    # 标准化活性数据重新生成时ID会变化，也计入版本
+    activity_version = (
+        select(func.max(ActivityValue.id)).where(ActivityValue.document_id == document_id).scalar_subquery()
+    )
+    version = (await db.execute(
+        select(Analysis.id, Analysis.updated_at, activity_version.label("activity_version"))
+        .where(Analysis.document_id == document_id)
+    )).first()
+    if not version:
+        raise HTTPException(status_code=404, detail="分析结果不存在")
+    etag = make_etag("analysis", version.id, version.updated_at, version.activity_version)
+    response = not_modified(request, etag, version.updated_at)
+    if response:
+        return response
+
+    analysis = await db.scalar(
+        select(Analysis).where(Analysis.document_id == document_id)
+        .options(undefer(Analysis.content), undefer(Analysis.raw_ai_response))
+    )
     if not analysis:
         raise HTTPException(status_code=404, detail="分析结果不存在")
     
     analysis_dict = analysis.to_dict()
     analysis_dict['raw_ai_response'] = analysis.raw_ai_response # 添加原始AI响应
-    return analysis_dict
+    activity_values = (await db.scalars(
+        select(ActivityValue).where(ActivityValue.document_id == document_id).order_by(ActivityValue.row_index)
+    )).all()
+    analysis_dict['normalized_activity'] = [value.to_dict() for value in activity_values]
+    return JSONResponse(analysis_dict, headers=cache_headers(etag, version.updated_at))
+
+@app.get("/api/analysis/{document_id}/history")
+async def get_analysis_history(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    """获取文档的历史分析结果（重新分析前的结果），按归档时间倒序"""
+    history = (await db.scalars(
+        select(AnalysisHistory)
+        .where(AnalysisHistory.document_id == document_id)
+        .options(undefer(AnalysisHistory.content))
+        .order_by(AnalysisHistory.archived_at.desc())
+    )).all()
+    return [item.to_dict() for item in history]
+
+class ReanalyzeRequest(BaseModel):
+    """重新分析请求参数"""
+    # 是否只重新分析部分项目；为False时执行完整分析
+    partial: bool = False
+    # 需要重新分析的项目，部分模式下为空时默认使用被跳过的项目
+    items: Optional[List[str]] = None
+    # 是否覆盖已有的有效数据
+    overwrite: bool = False
 
 @app.post("/api/documents/{document_id}/reanalyze")
-async def reanalyze_document(document_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    """重新启动文档分析"""
-    document = db.query(Document).filter(Document.id == document_id).first()
+async def reanalyze_document(
+    document_id: int,
+    background_tasks: BackgroundTasks,
+    request: Optional[ReanalyzeRequest] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """重新启动文档分析
+
+    默认重新执行完整分析；partial为True时只针对指定项目（默认为被跳过的项目）发起定向请求。
+    """
+    document = await db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="文档不存在")
 
-    # 可以选择在这里更新文档状态为 processing
-    # document.status = "processing"
-    # db.commit()
-    # db.refresh(document)
+    if request and request.partial:
+        unknown_items = [item for item in (request.items or []) if item not in progress_manager.analysis_items]
+        if unknown_items:
+            raise HTTPException(status_code=400, detail=f"未知的分析项目: {unknown_items}")
 
-    # 触发后台分析任务
-    background_tasks.add_task(analyze_document_with_ai, document.path, document.id)
+        analysis = await db.scalar(
+            select(Analysis).where(Analysis.document_id == document_id).options(undefer(Analysis.content))
+        )
+        if analysis:
+            items = request.items
+            if not items:
+                # 默认使用进度中记录的跳过项目，以及已保存结果中缺失或无效的项目
+                progress = progress_manager.analysis_progress.get(document_id, {})
+                content = json.loads(analysis.content) if analysis.content else {}
+                skipped = set(progress.get("skipped_items", [])) | set(find_invalid_fields(content, progress_manager.analysis_items))
+                items = [item for item in progress_manager.analysis_items if item in skipped]
+            if not items:
+                return {"message": "没有需要重新分析的项目", "document_id": document.id, "items": []}
+
+            background_tasks.add_task(reanalyze_items_with_ai, document.id, items, request.overwrite)
+            return {"message": "部分重新分析已启动", "document_id": document.id, "items": items}
+        main_logger.info(f"文档 {document_id} 没有已保存的分析结果，改为执行完整分析")
+
+    # 触发后台分析任务；用户明确要求重新分析，疑似重复时也照常分析
+    background_tasks.add_task(analyze_document_with_ai, document.path, document.id, "analyze")
 
     return {"message": "文档分析已重新启动", "document_id": document.id}
 
+@app.get("/api/documents/{document_id}/duplicates")
+async def get_document_duplicates(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    """查询与文档疑似重复的已分析文献（文档分析时计算签名，之前上传的文档需先执行 near_duplicates.py --backfill）"""
+    document = await db.scalar(select(Document).where(Document.id == document_id).options(undefer(Document.minhash)))
+    if not document:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    if not document.minhash:
+        return {"document_id": document_id, "has_signature": False, "duplicates": []}
+    duplicates = await find_near_duplicates(db, document_id, signature_from_bytes(document.minhash))
+    return {"document_id": document_id, "has_signature": True, "duplicates": duplicates}
+
+class ReuseAnalysisRequest(BaseModel):
+    """复用分析结果请求参数"""
+    # 来源文档，为空时使用相似度最高的疑似重复文献
+    source_document_id: Optional[int] = None
+
+@app.post("/api/documents/{document_id}/reuse-analysis")
+async def reuse_document_analysis(document_id: int, request: ReuseAnalysisRequest, db: AsyncSession = Depends(get_async_db)):
+    """复用疑似重复文献的分析结果，不再调用AI"""
+    document = await db.scalar(select(Document).where(Document.id == document_id).options(undefer(Document.minhash)))
+    if not document:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    source_id = request.source_document_id
+    if source_id is None:
+        duplicates = await find_near_duplicates(db, document_id, signature_from_bytes(document.minhash)) if document.minhash else []
+        if not duplicates:
+            raise HTTPException(status_code=404, detail="没有找到疑似重复的已分析文献")
+        source_id = duplicates[0]["document_id"]
+    if source_id == document_id:
+        raise HTTPException(status_code=400, detail="不能复用文档自身的分析结果")
+    try:
+        await reuse_analysis(db, document_id, source_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    # 只读取本进程内存中的进度，不在事件循环中做I/O；没有进度时无需推送
+    progress = progress_manager.get_progress(document_id)
+    if progress:
+        progress["status"] = "completed"
+        progress["overall_progress"] = 100
+        await progress_manager.broadcast_progress(document_id, progress)
+    return {"message": "已复用分析结果", "document_id": document_id, "source_document_id": source_id}
+
+@app.get("/api/duplicates/report")
+async def get_duplicates_report(
+    threshold: float = Query(NEAR_DUPLICATE_THRESHOLD, ge=0.0, le=1.0, description="最低相似度"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """整个文献库的疑似重复报告：按相似度连成组，每组列出文档和文档间的相似度"""
+    rows = (await db.execute(select(Document.id, Document.minhash))).all()
+    signatures = load_signatures(rows)
+    groups = await asyncio.to_thread(find_duplicate_groups, signatures, threshold)
+    names = dict((await db.execute(
+        select(Document.id, Document.name).where(Document.id.in_({i for group in groups for i in group["document_ids"]}))
+    )).all()) if groups else {}
+    for group in groups:
+        group["documents"] = [{"id": i, "name": names.get(i)} for i in group.pop("document_ids")]
+    return {
+        "threshold": threshold,
+        "documents_checked": len(signatures),
+        "documents_without_signature": len(rows) - len(signatures),
+        "groups": groups,
+    }
+
+async def visualization_version(db: AsyncSession, name: str):
+    """可视化数据的版本：分析结果数量、最近更新时间和ID之和，任一分析结果增删改都会变化"""
+    version = (await db.execute(
+        select(func.count(Analysis.id), func.max(Analysis.updated_at), func.sum(Analysis.id))
+    )).first()
+    return make_etag(name, *version), version[1]
+
 @app.get("/api/visualization/activity-data")
-async def get_activity_data(db: Session = Depends(get_db)):
+async def get_activity_data(request: Request, db: AsyncSession = Depends(get_async_db)):
     """获取所有文献的活性数据，用于可视化"""
-    analyses = db.query(Analysis).all()
+    etag, last_modified = await visualization_version(db, "activity-data")
+    response = not_modified(request, etag, last_modified)
+    if response:
+        return response
+    # 只读取需要的列，不加载原始AI响应
+    rows = (await db.execute(
+        select(Analysis.document_id, Analysis.year, Analysis.content, Document.name)
+        .join(Document, Document.id == Analysis.document_id)
+    )).all()
     activity_data = []
     
-    for analysis in analyses:
+    for analysis in rows:
         try:
             content = json.loads(analysis.content) if analysis.content else {}
             if "活性数据" in content and content["活性数据"]:
-                document = db.query(Document).filter(Document.id == analysis.document_id).first()
-                if document:
-                    activity_data.append({
-                        "document_id": analysis.document_id,
-                        "document_name": document.name,
-                        "activity_data": content["活性数据"],
-                        "year": analysis.year
-                    })
+                activity_data.append({
+                    "document_id": analysis.document_id,
+                    "document_name": analysis.name,
+                    "activity_data": content["活性数据"],
+                    "year": analysis.year
+                })
         except Exception as e:
             print(f"处理活性数据时出错: {str(e)}", flush=True)
     
-    return activity_data
+    return JSONResponse(activity_data, headers=cache_headers(etag, last_modified))
 
 @app.get("/api/visualization/catalyst-methods")
-async def get_catalyst_methods(db: Session = Depends(get_db)):
+async def get_catalyst_methods(request: Request, db: AsyncSession = Depends(get_async_db)):
     """获取所有文献的催化剂制备法，用于可视化"""
-    analyses = db.query(Analysis).all()
+    etag, last_modified = await visualization_version(db, "catalyst-methods")
+    response = not_modified(request, etag, last_modified)
+    if response:
+        return response
+    # 只读取需要的列，不加载原始AI响应
+    rows = (await db.execute(
+        select(Analysis.document_id, Analysis.year, Analysis.content, Document.name)
+        .join(Document, Document.id == Analysis.document_id)
+    )).all()
     catalyst_methods = []
     
-    for analysis in analyses:
+    for analysis in rows:
         try:
             content = json.loads(analysis.content) if analysis.content else {}
             if "催化剂制备法" in content and content["催化剂制备法"]:
-                document = db.query(Document).filter(Document.id == analysis.document_id).first()
-                if document:
-                    catalyst_methods.append({
-                        "document_id": analysis.document_id,
-                        "document_name": document.name,
-                        "catalyst_method": content["催化剂制备法"],
-                        "year": analysis.year
-                    })
+                catalyst_methods.append({
+                    "document_id": analysis.document_id,
+                    "document_name": analysis.name,
+                    "catalyst_method": content["催化剂制备法"],
+                    "year": analysis.year
+                })
         except Exception as e:
             print(f"处理催化剂制备法时出错: {str(e)}", flush=True)
     
-    return catalyst_methods
+    return JSONResponse(catalyst_methods, headers=cache_headers(etag, last_modified))
+
+
+class CompareRequest(BaseModel):
+    """多文献对比请求参数"""
+    document_ids: List[int]
+    # 横轴和纵轴：activity_value、temperature_c、pressure_mpa 或 year
+    x_axis: str = "temperature_c"
+    y_axis: str = "activity_value"
+    # 分组方式：catalyst、category 或 document
+    group_by: str = "catalyst"
+    # 图表宽度（像素），每组返回的点数不超过该值
+    width: int = 800
+    # 活性数值的单位，为空时使用数据最多的单位
+    activity_unit: Optional[str] = None
+    max_groups: int = DEFAULT_MAX_GROUPS
 
+@app.post("/api/visualization/compare")
+async def compare_documents(request: CompareRequest, db: AsyncSession = Depends(get_async_db)):
+    """多文献活性数据对比：服务端分组统计并返回降采样后的绘图数据"""
+    if not request.document_ids:
+        raise HTTPException(status_code=400, detail="请选择需要对比的文献")
+    rows = (await db.execute(
+        select(ActivityValue.document_id, Document.name, Document.category, ActivityValue.catalyst,
+               ActivityValue.activity_unit, ActivityValue.activity_value, ActivityValue.temperature_c,
+               ActivityValue.pressure_mpa, Analysis.year)
+        .join(Document, Document.id == ActivityValue.document_id)
+        .outerjoin(Analysis, Analysis.document_id == ActivityValue.document_id)
+        .where(ActivityValue.document_id.in_(set(request.document_ids)))
+    )).all()
+    try:
+        return await asyncio.to_thread(
+            compare_activity, rows, request.x_axis, request.y_axis, request.group_by,
+            request.width, request.activity_unit, request.max_groups
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/export/{dataset}")
+async def export_data(
+    dataset: str,
+    format: str = "csv",
+    category: Optional[List[str]] = Query(None),
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    document_id: Optional[List[int]] = Query(None)
+):
+    """导出分析结果（analyses）或活性数据（activity）
+
+    支持 csv、ndjson 和 parquet（需要安装 pyarrow）格式。数据从数据库分批读取并逐块输出，
+    导出大量数据时内存占用保持不变；category 和 document_id 可重复指定。
+    """
+    filters = ExportFilters(category, year_from, year_to, document_id)
+    try:
+        chunks = iter_export(dataset, format, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+    # 同步生成器由 Starlette 在线程池中迭代，读取数据库不会阻塞事件循环
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 
 # @app.get("/api/files/optimize/{document_id}")
-# async def optimize_file(document_id: int, db: Session = Depends(get_db)):
+# async def optimize_file(document_id: int, db: AsyncSession = Depends(get_async_db)):
 #     """优化文件"""
 #     try:
-#         document = db.query(Document).filter(Document.id == document_id).first()
+#         document = await db.get(Document, document_id)
 #         if not document:
 #             raise HTTPException(status_code=404, detail="文档不存在")
 #         
@@ -627,10 +1205,10 @@ async def get_catalyst_methods(db: Session = Depends(get_db)):
 #         raise HTTPException(status_code=500, detail="文件优化失败")
 
 # @app.get("/api/files/stream/{document_id}")
-# async def stream_file_content(document_id: int, chunk_size: int = 1024, db: Session = Depends(get_db)):
+# async def stream_file_content(document_id: int, chunk_size: int = 1024, db: AsyncSession = Depends(get_async_db)):
 #     """流式读取文件内容"""
 #     try:
-#         document = db.query(Document).filter(Document.id == document_id).first()
+#         document = await db.get(Document, document_id)
 #         if not document:
 #             raise HTTPException(status_code=404, detail="文档不存在")
 #         
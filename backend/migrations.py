@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""数据库结构迁移
+
+按版本号顺序执行迁移，已执行的版本记录在 schema_migrations 表中，
+因此可以直接在已有的 literature_analysis.db 上原地升级。新增迁移时在
+MIGRATIONS 末尾追加 (版本号, 说明, 函数)，不要修改已发布的迁移。
+
+用法:
+    python migrations.py           # 执行所有未执行的迁移
+    python migrations.py --status  # 查看迁移状态
+"""
+import argparse
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from models import ActivityValue, Analysis, AnalysisHistory, Base, CompressedText, Document, MinHashBand, engine as default_engine
+from unit_normalizer import backfill_activity_values
+
+_migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _create_base_tables(conn: Connection):
+    """创建文档表和分析结果表（已存在时跳过）"""
+    Base.metadata.create_all(bind=conn, tables=[Document.__table__, Analysis.__table__])
+
+
+def _archive_duplicate_analyses(conn: Connection):
+    """每篇文档只保留最新的一条分析结果，其余移入历史表"""
+    analyses = Analysis.__table__
+    history = AnalysisHistory.__table__
+    rows = conn.execute(
+        select(analyses.c.id, analyses.c.document_id, analyses.c.title, analyses.c.content,
+               analyses.c.raw_ai_response, analyses.c.created_at)
+        .order_by(analyses.c.document_id, analyses.c.updated_at.desc(), analyses.c.id.desc())
+    ).all()
+    seen = set()
+    archived_ids = []
+    now = datetime.now()
+    for row in rows:
+        if row.document_id not in seen:
+            seen.add(row.document_id)
+            continue
+        conn.execute(history.insert().values(
+            document_id=row.document_id, title=row.title, content=row.content,
+            raw_ai_response=row.raw_ai_response, created_at=row.created_at, archived_at=now
+        ))
+        archived_ids.append(row.id)
+    if archived_ids:
+        conn.execute(analyses.delete().where(analyses.c.id.in_(archived_ids)))
+        print(f"已将 {len(archived_ids)} 条重复的分析结果移入历史表")
+
+
+def _add_history_and_indexes(conn: Connection):
+    """新增分析历史表、常用查询索引，以及每篇文档唯一的当前分析结果"""
+    AnalysisHistory.__table__.create(bind=conn, checkfirst=True)
+    # 没有关联文档的分析结果无法访问，直接清理
+    conn.execute(Analysis.__table__.delete().where(Analysis.__table__.c.document_id.is_(None)))
+    _archive_duplicate_analyses(conn)
+    _create_indexes(conn, "ix_documents_id", "ix_documents_status", "ix_documents_category",
+                    "ix_documents_upload_time", "ix_analyses_id", "ux_analyses_document_id")
+
+
+def _create_indexes(conn: Connection, *names: str):
+    """按名称创建模型中定义的索引（已存在时跳过）"""
+    for table in (Document.__table__, Analysis.__table__):
+        existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in names and index.name not in existing:
+                index.create(bind=conn)
+
+
+# 压缩存储的大字段
+COMPRESSED_COLUMNS = {
+    "analyses": ("content", "raw_ai_response"),
+    "analysis_history": ("content", "raw_ai_response"),
+}
+
+
+def _compact_json(value: str) -> str:
+    """去掉JSON的缩进排版，无法解析时原样返回"""
+    try:
+        return json.dumps(json.loads(value), ensure_ascii=False)
+    except ValueError:
+        return value
+
+
+def _compress_large_columns(conn: Connection):
+    """将已有的分析结果和原始AI响应改为紧凑JSON并压缩存储"""
+    before = after = 0
+    for table, columns in COMPRESSED_COLUMNS.items():
+        for column in columns:
+            rows = conn.execute(text(f"SELECT id, {column} FROM {table} WHERE {column} IS NOT NULL")).all()
+            for row_id, value in rows:
+                if not isinstance(value, str):
+                    continue
+                compressed = CompressedText().process_bind_param(_compact_json(value), conn.dialect)
+                before += len(value.encode("utf-8"))
+                after += len(compressed)
+                conn.execute(text(f"UPDATE {table} SET {column} = :value WHERE id = :id"),
+                             {"value": compressed, "id": row_id})
+    if before:
+        print(f"大字段压缩: {before / 1024:.1f}KB -> {after / 1024:.1f}KB（执行 VACUUM 后释放文件空间）")
+
+
+def _file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _add_content_hash(conn: Connection):
+    """文档表新增文件内容哈希，并为已有的文件计算哈希"""
+    documents = Document.__table__
+    if "content_hash" not in {column["name"] for column in inspect(conn).get_columns("documents")}:
+        conn.execute(text("ALTER TABLE documents ADD COLUMN content_hash VARCHAR(64)"))
+    _create_indexes(conn, "ix_documents_content_hash")
+    rows = conn.execute(select(documents.c.id, documents.c.path).where(documents.c.content_hash.is_(None))).all()
+    for row_id, path in rows:
+        if path and os.path.exists(path):
+            conn.execute(documents.update().where(documents.c.id == row_id).values(content_hash=_file_sha256(path)))
+
+
+
+def _add_batch_id(conn: Connection):
+    """文档表新增批量上传的批次ID"""
+    if "batch_id" not in {column["name"] for column in inspect(conn).get_columns("documents")}:
+        conn.execute(text("ALTER TABLE documents ADD COLUMN batch_id VARCHAR(36)"))
+    _create_indexes(conn, "ix_documents_batch_id")
+
+
+def _add_activity_values(conn: Connection):
+    """新增标准化活性数据表，并根据已有的分析结果生成数据"""
+    ActivityValue.__table__.create(bind=conn, checkfirst=True)
+    total = backfill_activity_values(conn)
+    if total:
+        print(f"已生成 {total} 条标准化活性数据")
+
+
+def _add_minhash(conn: Connection):
+    """文档表新增MinHash签名，并新增LSH分段表（已有文档的签名用 near_duplicates.py --backfill 计算）"""
+    if "minhash" not in {column["name"] for column in inspect(conn).get_columns("documents")}:
+        conn.execute(text("ALTER TABLE documents ADD COLUMN minhash BLOB"))
+    MinHashBand.__table__.create(bind=conn, checkfirst=True)
+
+
+# (版本号, 说明, 迁移函数)
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "创建文档表和分析结果表", _create_base_tables),
+    (2, "新增分析历史表和查询索引", _add_history_and_indexes),
+    (3, "压缩存储分析结果和原始AI响应", _compress_large_columns),
+    (4, "文档表新增文件内容哈希", _add_content_hash),
+    (5, "文档表新增批量上传批次ID", _add_batch_id),
+    (6, "新增标准化活性数据表", _add_activity_values),
+    (7, "新增疑似重复检测的MinHash签名", _add_minhash),
+]
+
+
+def applied_versions(bind: Engine = default_engine) -> List[int]:
+    """已执行的迁移版本"""
+    with bind.connect() as conn:
+        if not inspect(conn).has_table(schema_migrations.name):
+            return []
+        return [row[0] for row in conn.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version))]
+
+
+@contextmanager
+def _migration_transaction(bind: Engine):
+    """迁移事务：SQLite下使用 BEGIN IMMEDIATE 获取写锁，并让建表/建索引语句也在事务内执行"""
+    with bind.connect() as conn:
+        if conn.dialect.name != "sqlite":
+            with conn.begin():
+                yield conn
+            return
+        dbapi_connection = conn.connection.dbapi_connection
+        isolation_level = dbapi_connection.isolation_level
+        # 关闭 sqlite3 模块的隐式事务，由这里显式控制
+        dbapi_connection.isolation_level = None
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+            conn.exec_driver_sql("COMMIT")
+        finally:
+            dbapi_connection.isolation_level = isolation_level
+
+
+def run_migrations(bind: Engine = default_engine) -> List[int]:
+    """执行所有未执行的迁移，每个迁移在独立的事务中完成
+
+    Returns:
+        List[int]: 本次执行的迁移版本
+    """
+    _migration_metadata.create_all(bind=bind)
+    done = set(applied_versions(bind))
+    executed = []
+    for version, name, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        with _migration_transaction(bind) as conn:
+            # 多个 worker 同时启动时，其他进程可能已经执行了该迁移
+            if conn.execute(select(schema_migrations.c.version).where(schema_migrations.c.version == version)).first():
+                continue
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.now()))
+        executed.append(version)
+        print(f"已执行数据库迁移 {version:03d}: {name}")
+    return executed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库结构迁移")
+    parser.add_argument("--status", action="store_true", help="只显示迁移状态，不执行")
+    args = parser.parse_args()
+
+    if args.status:
+        done = set(applied_versions())
+        for version, name, _ in MIGRATIONS:
+            print(f"[{'x' if version in done else ' '}] {version:03d} {name}")
+        return
+
+    executed = run_migrations()
+    if not executed:
+        print("数据库结构已是最新")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,116 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, create_engine, ForeignKey, JSON
+from sqlalchemy import BigInteger, Column, Integer, Float, String, Text, DateTime, create_engine, ForeignKey, JSON, Index, LargeBinary, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import sessionmaker, relationship, deferred
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
 import os
+import zlib
 from dotenv import load_dotenv
 import json
 
+from metrics import instrument_engine
+
 # 加载环境变量
 load_dotenv()
 
 # 获取数据库连接URL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./literature_analysis.db")
 
-# 创建数据库引擎
-engine = create_engine(DATABASE_URL)
+# SQLite等待写锁的超时时间（毫秒）以及连接池大小
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def _to_async_url(url: str) -> str:
+    """将同步数据库URL转换为异步驱动的URL"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+
+# 异步数据库连接URL，非SQLite数据库需通过 ASYNC_DATABASE_URL 指定异步驱动
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _to_async_url(DATABASE_URL))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite连接初始化：WAL模式允许读写并发，busy_timeout避免并发写入时立即报错"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.close()
+
+
+# 创建数据库引擎（同步，用于脚本和线程中的任务）
+if IS_SQLITE:
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT / 1000},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+    )
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+else:
+    engine = create_engine(DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+
+# 创建异步数据库引擎（用于API路由，不阻塞事件循环）
+if IS_SQLITE:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args={"timeout": SQLITE_BUSY_TIMEOUT / 1000},
+        # aiosqlite默认不使用连接池，这里显式复用连接
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+    )
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+else:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+
+# 记录SQL语句耗时（/metrics）
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # 创建基类
 Base = declarative_base()
 
+# 大字段压缩级别（zlib，1-9）
+COMPRESSION_LEVEL = int(os.getenv("DB_COMPRESSION_LEVEL", "6"))
+
+
+class CompressedText(TypeDecorator):
+    """以zlib压缩存储的文本字段
+
+    读取时兼容尚未压缩的旧数据（直接存储为文本的值）。
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        return zlib.compress(value, COMPRESSION_LEVEL)
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        try:
+            return zlib.decompress(value).decode("utf-8")
+        except zlib.error:
+            return value.decode("utf-8")
+
 # 文档模型
 class Document(Base):
     __tablename__ = "documents"
@@ -32,9 +122,29 @@ class Document(Base):
     upload_time = Column(DateTime, default=datetime.now)
     category = Column(String(100), nullable=False)
     status = Column(String(50), default="uploaded")
+    # 文件内容的SHA-256，上传时按原始内容计算（PDF随后会被线性化重写，存储的文件与此哈希不再一致，
+    # 但同一份原始文件再次上传时哈希相同，用于识别重复上传）
+    content_hash = Column(String(64))
+    # 批量上传的批次ID，单独上传的文档为空
+    batch_id = Column(String(36))
+    # 正文的MinHash签名，用于疑似重复检测（见 near_duplicates.py）
+    minhash = deferred(Column(LargeBinary))
     
     # 关系
     analysis = relationship("Analysis", back_populates="document", uselist=False, cascade="all, delete-orphan")
+    analysis_history = relationship("AnalysisHistory", back_populates="document", cascade="all, delete-orphan",
+                                    order_by="AnalysisHistory.archived_at")
+    activity_values = relationship("ActivityValue", back_populates="document", cascade="all, delete-orphan",
+                                   order_by="ActivityValue.row_index")
+    minhash_bands = relationship("MinHashBand", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_documents_status", "status"),
+        Index("ix_documents_category", "category"),
+        Index("ix_documents_upload_time", "upload_time"),
+        Index("ix_documents_content_hash", "content_hash"),
+        Index("ix_documents_batch_id", "batch_id"),
+    )
     
     def to_dict(self):
         return {
@@ -59,14 +169,20 @@ class Analysis(Base):
     year = Column(String(10), nullable=True)
     abstract = Column(Text, nullable=True)
     keywords = Column(Text, nullable=True)  # 存储为JSON字符串
-    content = Column(Text, nullable=True)  # 存储完整分析结果为JSON字符串
-    raw_ai_response = Column(Text, nullable=True) # 存储原始AI响应内容
+    # 大字段压缩存储并延迟加载，列表和元数据查询不会读取它们（需要时使用 undefer）
+    content = deferred(Column(CompressedText, nullable=True))  # 存储完整分析结果为JSON字符串
+    raw_ai_response = deferred(Column(CompressedText, nullable=True)) # 存储原始AI响应内容
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
     # 关系
     document = relationship("Document", back_populates="analysis")
     
+    # 每篇文档只有一条当前分析结果，旧结果保存在 analysis_history 中
+    __table_args__ = (
+        Index("ux_analyses_document_id", "document_id", unique=True),
+    )
+    
     def to_dict(self):
         return {
             "id": self.id,
@@ -80,9 +196,108 @@ class Analysis(Base):
             "content": json.loads(self.content) if self.content else {}
         }
 
-# 创建数据库表
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+# 历史分析结果模型（重新分析前的结果）
+class AnalysisHistory(Base):
+    __tablename__ = "analysis_history"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    title = Column(String(255), nullable=True)
+    content = deferred(Column(CompressedText, nullable=True))
+    raw_ai_response = deferred(Column(CompressedText, nullable=True))
+    created_at = Column(DateTime, nullable=True)  # 原分析结果的创建时间
+    archived_at = Column(DateTime, default=datetime.now)
+    
+    # 关系
+    document = relationship("Document", back_populates="analysis_history")
+    
+    @classmethod
+    def from_analysis(cls, analysis: "Analysis") -> "AnalysisHistory":
+        """根据当前分析结果创建历史记录"""
+        return cls(
+            document_id=analysis.document_id,
+            title=analysis.title,
+            content=analysis.content,
+            raw_ai_response=analysis.raw_ai_response,
+            created_at=analysis.created_at
+        )
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "document_id": self.document_id,
+            "title": self.title,
+            "content": json.loads(self.content) if self.content else {},
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None,
+            "archived_at": self.archived_at.strftime("%Y-%m-%d %H:%M:%S") if self.archived_at else None
+        }
+
+# 标准化活性数据模型（由当前分析结果的活性数据生成，见 unit_normalizer.py）
+class ActivityValue(Base):
+    __tablename__ = "activity_values"
+    
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    row_index = Column(Integer, nullable=False)  # 在活性数据列表中的位置
+    catalyst = Column(Text, nullable=True)
+    # 原始文本
+    activity_raw = Column(Text, nullable=True)
+    activity_unit_raw = Column(Text, nullable=True)
+    temperature_raw = Column(Text, nullable=True)
+    pressure_raw = Column(Text, nullable=True)
+    # 标准单位下的数值，范围数据的数值为中点
+    activity_value = Column(Float, nullable=True)
+    activity_low = Column(Float, nullable=True)
+    activity_high = Column(Float, nullable=True)
+    activity_uncertainty = Column(Float, nullable=True)
+    activity_unit = Column(String(100), nullable=True)
+    temperature_c = Column(Float, nullable=True)
+    temperature_low_c = Column(Float, nullable=True)
+    temperature_high_c = Column(Float, nullable=True)
+    pressure_mpa = Column(Float, nullable=True)
+    pressure_low_mpa = Column(Float, nullable=True)
+    pressure_high_mpa = Column(Float, nullable=True)
+    
+    # 关系
+    document = relationship("Document", back_populates="activity_values")
+    
+    __table_args__ = (
+        Index("ix_activity_values_document_id", "document_id"),
+        Index("ix_activity_values_activity_unit", "activity_unit"),
+    )
+    
+    def to_dict(self):
+        return {
+            "row_index": self.row_index,
+            "catalyst": self.catalyst,
+            "activity_raw": self.activity_raw,
+            "activity_unit_raw": self.activity_unit_raw,
+            "activity_value": self.activity_value,
+            "activity_low": self.activity_low,
+            "activity_high": self.activity_high,
+            "activity_uncertainty": self.activity_uncertainty,
+            "activity_unit": self.activity_unit,
+            "temperature_raw": self.temperature_raw,
+            "temperature_c": self.temperature_c,
+            "temperature_low_c": self.temperature_low_c,
+            "temperature_high_c": self.temperature_high_c,
+            "pressure_raw": self.pressure_raw,
+            "pressure_mpa": self.pressure_mpa,
+            "pressure_low_mpa": self.pressure_low_mpa,
+            "pressure_high_mpa": self.pressure_high_mpa,
+        }
+
+# MinHash签名的LSH分段，相同 (band, bucket) 的文档为疑似重复的候选
+class MinHashBand(Base):
+    __tablename__ = "minhash_bands"
+    
+    document_id = Column(Integer, ForeignKey("documents.id"), primary_key=True)
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_minhash_bands_band_bucket", "band", "bucket"),
+    )
 
 # 获取数据库会话
 def get_db():
@@ -90,4 +305,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 获取异步数据库会话
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
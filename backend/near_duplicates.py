@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""疑似重复文献检测（MinHash/LSH）
+
+同一篇论文的预印本、接收稿和正式出版版本文件内容不同，SHA-256 无法识别，
+但正文几乎相同。这里对提取出的文本计算 MinHash 签名：
+
+- 文本规范化后取连续 SHINGLE_SIZE 个词作为特征，签名为 NUM_PERM 个哈希函数下的最小值，
+  两份签名相同位置相等的比例即 Jaccard 相似度的估计
+- 签名分为 LSH_BANDS 段，每段的哈希保存在 minhash_bands 表中；只要有一段相同
+  就成为候选，再用完整签名计算相似度，达到 NEAR_DUPLICATE_THRESHOLD 才视为疑似重复
+
+分析文档时在调用AI之前检查，发现与已分析的文献疑似重复时，按 NEAR_DUPLICATE_ACTION
+暂停等待确认（hold）、直接复用已有分析结果（reuse）或照常分析（analyze，默认，只记录日志）。
+
+用法:
+    python near_duplicates.py --backfill         # 为尚未计算签名的文档计算签名
+    python near_duplicates.py --threshold 0.6    # 输出整个文献库的疑似重复报告
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Analysis, Document, MinHashBand
+
+# 签名长度（哈希函数个数）和LSH分段，每段 NUM_PERM // LSH_BANDS 个值
+NUM_PERM = 128
+LSH_BANDS = 32
+SHINGLE_SIZE = 5
+# 视为疑似重复的最低相似度
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.7"))
+# 分析前发现疑似重复时的处理方式
+DUPLICATE_ACTIONS = ("hold", "reuse", "analyze")
+NEAR_DUPLICATE_ACTION = os.getenv("NEAR_DUPLICATE_ACTION", "analyze")
+# 每次参与计算的特征数，控制中间数组的内存
+_SHINGLE_CHUNK = 4096
+
+# 大于 2^32 的素数，哈希函数为 (a*x + b) mod P；a < 2^31 保证乘积不超过 uint64
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, 2 ** 31, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 2 ** 31, NUM_PERM, dtype=np.uint64)
+_TOKEN = re.compile(r"[a-z]+|\d+|[\u4e00-\u9fff]")
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """文本规范化后按词切分，返回去重后的特征哈希（CRC32）"""
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < SHINGLE_SIZE:
+        return np.empty(0, dtype=np.uint64)
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                       dtype=np.uint64, count=len(shingles))
+
+
+def compute_signature(text: str) -> Optional[np.ndarray]:
+    """计算文本的 MinHash 签名，文本过短时返回None
+
+    Returns:
+        np.ndarray: 长度为 NUM_PERM 的 uint32 数组
+    """
+    hashes = _shingle_hashes(text or "")
+    if not len(hashes):
+        return None
+    signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(hashes), _SHINGLE_CHUNK):
+        chunk = hashes[start:start + _SHINGLE_CHUNK]
+        values = (chunk[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) % _PRIME
+        np.minimum(signature, values.min(axis=0), out=signature)
+    return (signature & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def signature_to_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4").tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4")
+
+
+def band_buckets(signature: np.ndarray) -> List[int]:
+    """签名每一段的哈希（有符号64位整数，便于保存到数据库）"""
+    rows = NUM_PERM // LSH_BANDS
+    return [int.from_bytes(hashlib.blake2b(signature_to_bytes(signature[band * rows:(band + 1) * rows]),
+                                           digest_size=8).digest(), "big", signed=True)
+            for band in range(LSH_BANDS)]
+
+
+def _band_rows(document_id: int, signature: np.ndarray) -> List[Dict]:
+    return [{"document_id": document_id, "band": band, "bucket": bucket}
+            for band, bucket in enumerate(band_buckets(signature))]
+
+
+def similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """估计签名与多个签名（每行一个）的 Jaccard 相似度"""
+    return (others == signature).mean(axis=1)
+
+
+async def store_signature(db: AsyncSession, document_id: int, signature: np.ndarray):
+    """保存文档的签名和LSH分段（随调用方的事务提交）"""
+    document = await db.get(Document, document_id)
+    document.minhash = signature_to_bytes(signature)
+    await db.execute(delete(MinHashBand).where(MinHashBand.document_id == document_id))
+    await db.execute(insert(MinHashBand), _band_rows(document_id, signature))
+
+
+async def find_near_duplicates(db: AsyncSession, document_id: int, signature: np.ndarray,
+                               threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[Dict]:
+    """查询与签名疑似重复的已分析文档，按相似度从高到低排列
+
+    Returns:
+        List[Dict]: 每项包含 document_id、name 和 similarity
+    """
+    buckets = list(enumerate(band_buckets(signature)))
+    candidate_ids = set((await db.scalars(
+        select(MinHashBand.document_id).where(tuple_(MinHashBand.band, MinHashBand.bucket).in_(buckets))
+    )).all()) - {document_id}
+    if not candidate_ids:
+        return []
+    rows = (await db.execute(
+        select(Document.id, Document.name, Document.minhash)
+        .join(Analysis, Analysis.document_id == Document.id)
+        .where(Document.id.in_(candidate_ids), Document.status == "analyzed", Document.minhash.is_not(None))
+    )).all()
+    if not rows:
+        return []
+    scores = similarity(signature, np.stack([signature_from_bytes(row.minhash) for row in rows]))
+    duplicates = [{"document_id": row.id, "name": row.name, "similarity": round(float(score), 3)}
+                  for row, score in zip(rows, scores) if score >= threshold]
+    return sorted(duplicates, key=lambda item: item["similarity"], reverse=True)
+
+
+async def check_near_duplicates(db: AsyncSession, document_id: int, text: str) -> List[Dict]:
+    """计算并保存文档的签名，返回疑似重复的已分析文档"""
+    signature = await asyncio.to_thread(compute_signature, text)
+    if signature is None:
+        return []
+    await store_signature(db, document_id, signature)
+    await db.commit()
+    return await find_near_duplicates(db, document_id, signature)
+
+
+def find_duplicate_groups(signatures: Dict[int, np.ndarray], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[Dict]:
+    """在整个文献库中查找疑似重复的文档组
+
+    按LSH分段找出候选文档对，用完整签名计算相似度，相似度达到阈值的文档对连成一组。
+
+    Args:
+        signatures: 文档ID -> 签名
+        threshold: 最低相似度
+
+    Returns:
+        List[Dict]: 每组包含 document_ids 和组内的 pairs（document_id_a、document_id_b、similarity）
+    """
+    if len(signatures) < 2:
+        return []
+    ids = np.fromiter(signatures.keys(), dtype=np.int64, count=len(signatures))
+    matrix = np.stack(list(signatures.values()))
+    rows = NUM_PERM // LSH_BANDS
+    pairs = set()
+    for band in range(LSH_BANDS):
+        # 每段的值视为一个整体比较，相同的文档落入同一个桶
+        keys = np.ascontiguousarray(matrix[:, band * rows:(band + 1) * rows]).view(np.dtype((np.void, rows * 4))).ravel()
+        _, bucket, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        for shared in np.flatnonzero(counts > 1):
+            members = np.flatnonzero(bucket == shared)
+            pairs.update((int(a), int(b)) for i, a in enumerate(members) for b in members[i + 1:])
+    if not pairs:
+        return []
+    left, right = np.array(sorted(pairs)).T
+    scores = (matrix[left] == matrix[right]).mean(axis=1)
+    keep = scores >= threshold
+
+    parent = list(range(len(ids)))
+
+    def root(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for a, b in zip(left[keep], right[keep]):
+        parent[root(a)] = root(b)
+    groups: Dict[int, Dict] = {}
+    for a, b, score in zip(left[keep], right[keep], scores[keep]):
+        group = groups.setdefault(root(a), {"document_ids": set(), "pairs": []})
+        group["document_ids"].update((int(ids[a]), int(ids[b])))
+        group["pairs"].append({"document_id_a": int(ids[a]), "document_id_b": int(ids[b]),
+                               "similarity": round(float(score), 3)})
+    result = [{"document_ids": sorted(group["document_ids"]),
+               "pairs": sorted(group["pairs"], key=lambda pair: pair["similarity"], reverse=True)}
+              for group in groups.values()]
+    return sorted(result, key=lambda group: len(group["document_ids"]), reverse=True)
+
+
+def load_signatures(rows: Iterable) -> Dict[int, np.ndarray]:
+    """(文档ID, 签名字节) -> 签名字典，跳过没有签名的文档"""
+    return {row[0]: signature_from_bytes(row[1]) for row in rows if row[1]}
+
+
+def _backfill(db) -> int:
+    """为尚未计算签名的文档提取文本并计算签名"""
+    from document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    documents = db.execute(select(Document.id, Document.path).where(Document.minhash.is_(None))).all()
+    done = 0
+    for document_id, path in documents:
+        if not path or not os.path.exists(path):
+            continue
+        signature = compute_signature(processor.get_document_text(path, document_id) or "")
+        if signature is None:
+            continue
+        db.execute(Document.__table__.update().where(Document.id == document_id)
+                   .values(minhash=signature_to_bytes(signature)))
+        db.execute(delete(MinHashBand).where(MinHashBand.document_id == document_id))
+        db.execute(insert(MinHashBand), _band_rows(document_id, signature))
+        db.commit()
+        done += 1
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="疑似重复文献检测")
+    parser.add_argument("--backfill", action="store_true", help="先为尚未计算签名的文档计算签名")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                        help=f"最低相似度（默认{NEAR_DUPLICATE_THRESHOLD}）")
+    args = parser.parse_args()
+
+    from migrations import run_migrations
+    from models import SessionLocal
+    run_migrations()
+    with SessionLocal() as db:
+        if args.backfill:
+            print(f"已为 {_backfill(db)} 篇文档计算签名")
+        rows = db.execute(select(Document.id, Document.minhash)).all()
+        names = dict(db.execute(select(Document.id, Document.name)).all())
+    signatures = load_signatures(rows)
+    groups = find_duplicate_groups(signatures, args.threshold)
+    print(f"共检查 {len(signatures)} 篇文档（{len(rows) - len(signatures)} 篇没有签名），"
+          f"发现 {len(groups)} 组疑似重复")
+    for index, group in enumerate(groups, 1):
+        print(f"\n第 {index} 组:")
+        for document_id in group["document_ids"]:
+            print(f"  [{document_id}] {names.get(document_id)}")
+        for pair in group["pairs"]:
+            print(f"  {pair['document_id_a']} ~ {pair['document_id_b']}: 相似度 {pair['similarity']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""PDF分页文本与缩略图缓存
+
+分页预览接口使用的数据在第一次请求时生成并缓存在磁盘上，之后的请求直接读取缓存文件：
+
+    cache/pages/{document_id}/source.json   原始文件的路径、修改时间、大小和页数
+    cache/pages/{document_id}/{页码}.txt     每页提取的文本（首次请求时一次提取全部页面）
+    cache/pages/{document_id}/{页码}_{宽度}.png  页面缩略图
+
+原始文件与 source.json 中记录的不一致时整个目录失效重建。缩略图由 poppler 的
+pdftoppm 渲染，系统未安装时缩略图不可用，分页文本不受影响。
+"""
+import json
+import os
+import shutil
+import subprocess
+import threading
+from typing import Dict, Optional
+
+import PyPDF2
+from PyPDF2.errors import PyPdfError
+
+from document_processor import CACHE_DIR
+from logger_config import doc_logger
+
+PAGE_CACHE_DIR = os.path.join(CACHE_DIR, "pages")
+PDFTOPPM_PATH = os.getenv("PDFTOPPM_PATH") or shutil.which("pdftoppm")
+THUMBNAIL_DEFAULT_WIDTH = 300
+THUMBNAIL_MIN_WIDTH = 64
+THUMBNAIL_MAX_WIDTH = 1200
+RENDER_TIMEOUT = 60
+# 通过了文件头检查但内容损坏（如截断）的PDF，PyPDF2解析时抛出的异常
+_PDF_READ_ERRORS = (PyPdfError, ValueError, KeyError)
+
+_SOURCE_FILE = "source.json"
+# 同一文档的缓存生成串行进行，避免并发请求重复提取
+_locks: Dict[int, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+class PageNotFound(Exception):
+    """页码超出文档页数"""
+
+
+class ThumbnailUnavailable(Exception):
+    """无法生成缩略图（未安装 pdftoppm 或渲染失败）"""
+
+
+class PdfUnreadable(Exception):
+    """PDF文件已损坏，无法解析"""
+
+
+def _document_lock(document_id: int) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(document_id, threading.Lock())
+
+
+def _document_dir(document_id: int) -> str:
+    return os.path.join(PAGE_CACHE_DIR, str(document_id))
+
+
+def _write_atomic(path: str, data: bytes):
+    """先写临时文件再替换，读取方不会看到写了一半的文件"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _source_info(file_path: str) -> Dict:
+    stat_result = os.stat(file_path)
+    return {"path": os.path.abspath(file_path), "mtime": stat_result.st_mtime, "size": stat_result.st_size}
+
+
+def _load_source(document_id: int, file_path: str) -> Dict:
+    """读取缓存目录的元数据，原始文件已变化时清空目录并重新统计页数"""
+    directory = _document_dir(document_id)
+    source_path = os.path.join(directory, _SOURCE_FILE)
+    current = _source_info(file_path)
+    try:
+        with open(source_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if all(cached.get(key) == value for key, value in current.items()):
+            return cached
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        with open(file_path, "rb") as f:
+            current["page_count"] = len(PyPDF2.PdfReader(f).pages)
+    except _PDF_READ_ERRORS as e:
+        doc_logger.warning(f"解析文档 {document_id} 失败: {str(e)}")
+        raise PdfUnreadable(f"PDF文件已损坏，无法解析: {str(e)}")
+    _write_atomic(source_path, json.dumps(current).encode("utf-8"))
+    return current
+
+
+def _check_page(source: Dict, page: int):
+    if page < 1 or page > source["page_count"]:
+        raise PageNotFound(f"页码超出范围: {page}（共 {source['page_count']} 页）")
+
+
+def get_page_count(document_id: int, file_path: str) -> int:
+    """文档的总页数，PDF文件已损坏时抛出 PdfUnreadable"""
+    with _document_lock(document_id):
+        return _load_source(document_id, file_path)["page_count"]
+
+
+def get_page_text(document_id: int, file_path: str, page: int) -> str:
+    """读取指定页的文本，缓存不存在时提取全部页面并写入缓存
+
+    Args:
+        document_id: 文档ID
+        file_path: PDF文件路径
+        page: 页码，从1开始
+
+    Returns:
+        str: 该页的文本
+
+    Raises:
+        PageNotFound: 页码超出范围
+        PdfUnreadable: PDF文件已损坏
+    """
+    with _document_lock(document_id):
+        source = _load_source(document_id, file_path)
+        _check_page(source, page)
+        directory = _document_dir(document_id)
+        text_path = os.path.join(directory, f"{page}.txt")
+        if not os.path.exists(text_path):
+            doc_logger.info(f"提取文档 {document_id} 的分页文本，共 {source['page_count']} 页")
+            try:
+                with open(file_path, "rb") as f:
+                    for number, pdf_page in enumerate(PyPDF2.PdfReader(f).pages, start=1):
+                        try:
+                            text = pdf_page.extract_text() or ""
+                        except Exception as e:
+                            doc_logger.warning(f"提取文档 {document_id} 第 {number} 页文本失败: {str(e)}")
+                            text = ""
+                        _write_atomic(os.path.join(directory, f"{number}.txt"), text.encode("utf-8"))
+            except _PDF_READ_ERRORS as e:
+                doc_logger.warning(f"解析文档 {document_id} 失败: {str(e)}")
+                raise PdfUnreadable(f"PDF文件已损坏，无法解析: {str(e)}")
+        with open(text_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+
+def clamp_thumbnail_width(width: Optional[int]) -> int:
+    """将请求的缩略图宽度限制在允许范围内"""
+    if not width:
+        return THUMBNAIL_DEFAULT_WIDTH
+    return min(max(width, THUMBNAIL_MIN_WIDTH), THUMBNAIL_MAX_WIDTH)
+
+
+def get_page_thumbnail(document_id: int, file_path: str, page: int, width: int) -> bytes:
+    """读取指定页的PNG缩略图，缓存不存在时用 pdftoppm 渲染
+
+    Args:
+        document_id: 文档ID
+        file_path: PDF文件路径
+        page: 页码，从1开始
+        width: 缩略图宽度（像素），调用方需先用 clamp_thumbnail_width 限制范围
+
+    Returns:
+        bytes: PNG图片内容
+
+    Raises:
+        PageNotFound: 页码超出范围
+        ThumbnailUnavailable: 未安装 pdftoppm 或渲染失败
+        PdfUnreadable: PDF文件已损坏
+    """
+    if not PDFTOPPM_PATH:
+        raise ThumbnailUnavailable("服务器未安装 pdftoppm，无法生成缩略图")
+    with _document_lock(document_id):
+        source = _load_source(document_id, file_path)
+        _check_page(source, page)
+        image_path = os.path.join(_document_dir(document_id), f"{page}_{width}.png")
+        if not os.path.exists(image_path):
+            output_prefix = f"{image_path}.{os.getpid()}.render"
+            try:
+                result = subprocess.run(
+                    [PDFTOPPM_PATH, "-png", "-singlefile", "-f", str(page), "-l", str(page),
+                     "-scale-to-x", str(width), "-scale-to-y", "-1", file_path, output_prefix],
+                    capture_output=True, timeout=RENDER_TIMEOUT
+                )
+            except (OSError, subprocess.SubprocessError) as e:
+                raise ThumbnailUnavailable(f"渲染缩略图失败: {str(e)}")
+            if result.returncode != 0 or not os.path.exists(output_prefix + ".png"):
+                doc_logger.warning(f"渲染文档 {document_id} 第 {page} 页缩略图失败: "
+                                   f"{result.stderr.decode(errors='replace').strip()}")
+                raise ThumbnailUnavailable("渲染缩略图失败")
+            os.replace(output_prefix + ".png", image_path)
+        with open(image_path, "rb") as f:
+            return f.read()
+
+
+def clear_page_cache(document_id: int):
+    """删除文档的分页缓存"""
+    shutil.rmtree(_document_dir(document_id), ignore_errors=True)
+    with _locks_guard:
+        _locks.pop(document_id, None)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""跨进程共享的分析进度后端
+
+uvicorn 以多个 worker 运行时，执行分析的进程和持有 WebSocket 连接的进程可能不同。
+进度后端负责把一个进程发布的进度传递给其他进程，并保存各文档的最新进度（任务状态）：
+
+- local: 仅进程内，单 worker 部署时使用（默认）
+- sqlite: 通过本地 SQLite 文件（WAL 模式）共享，发布写入事件表，其他进程定时轮询，
+  不依赖任何外部服务
+
+通过环境变量 PROGRESS_BACKEND 选择后端。
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROGRESS_BACKEND = os.getenv("PROGRESS_BACKEND", "local").lower()
+PROGRESS_DB_PATH = os.getenv(
+    "PROGRESS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "progress.db")
+)
+# 轮询间隔（秒）
+PROGRESS_POLL_INTERVAL = float(os.getenv("PROGRESS_POLL_INTERVAL", "0.25"))
+# 事件保留时间及清理间隔（秒）
+PROGRESS_EVENT_RETENTION = 60
+PROGRESS_PRUNE_INTERVAL = 30
+# 已结束任务的共享状态保留时间（秒），之后由数据库记录推导
+PROGRESS_STATE_TTL = 600
+# 处理中状态超过该时间（秒）未更新视为 worker 已退出
+PROGRESS_STALE_TIMEOUT = 3600
+
+
+class ProgressBackend:
+    """进度后端接口，默认实现只在当前进程内生效"""
+
+    shared = False
+
+    def __init__(self):
+        # 当前进程的标识，用于忽略自己发布的事件
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    async def publish(self, document_id: int, progress: Dict):
+        """发布文档的最新进度"""
+
+    def get(self, document_id: int) -> Optional[Dict]:
+        """读取其他进程保存的最新进度"""
+        return None
+
+    def active_document_ids(self) -> List[int]:
+        """正在处理中的文档ID"""
+        return []
+
+    async def listen(self, on_progress: Callable[[int, Dict], None], should_continue: Callable[[], bool]):
+        """接收其他进程发布的进度，直到 should_continue 返回 False"""
+
+
+class SQLiteProgressBackend(ProgressBackend):
+    """基于 SQLite 文件的进度后端
+
+    Args:
+        db_path: SQLite 文件路径，同一台机器上的所有 worker 需使用同一个文件
+        poll_interval: 轮询新事件的间隔（秒）
+    """
+
+    shared = True
+
+    def __init__(self, db_path: str = PROGRESS_DB_PATH, poll_interval: float = PROGRESS_POLL_INTERVAL):
+        super().__init__()
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._last_prune = 0.0
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS progress_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL,
+                worker_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_progress_events_created_at ON progress_events (created_at);
+            CREATE TABLE IF NOT EXISTS progress_state (
+                document_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, document_id: int, payload: str, status: str):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO progress_events (document_id, worker_id, payload, created_at) VALUES (?, ?, ?, ?)",
+                (document_id, self.worker_id, payload, now)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO progress_state (document_id, status, payload, updated_at) VALUES (?, ?, ?, ?)",
+                (document_id, status, payload, now)
+            )
+            if now - self._last_prune >= PROGRESS_PRUNE_INTERVAL:
+                self._last_prune = now
+                conn.execute("DELETE FROM progress_events WHERE created_at < ?", (now - PROGRESS_EVENT_RETENTION,))
+                conn.execute(
+                    "DELETE FROM progress_state WHERE (status != 'processing' AND updated_at < ?) OR updated_at < ?",
+                    (now - PROGRESS_STATE_TTL, now - PROGRESS_STALE_TIMEOUT)
+                )
+
+    async def publish(self, document_id: int, progress: Dict):
+        payload = json.dumps(progress, ensure_ascii=False)
+        await asyncio.to_thread(self._write, document_id, payload, progress.get("status", "processing"))
+
+    def get(self, document_id: int) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT payload FROM progress_state WHERE document_id = ?", (document_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def active_document_ids(self) -> List[int]:
+        rows = self._connect().execute(
+            "SELECT document_id FROM progress_state WHERE status = 'processing'"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def _latest_event_id(self) -> int:
+        row = self._connect().execute("SELECT MAX(id) FROM progress_events").fetchone()
+        return row[0] or 0
+
+    def _read_events(self, after_id: int):
+        return self._connect().execute(
+            "SELECT id, document_id, payload FROM progress_events WHERE id > ? AND worker_id != ? ORDER BY id",
+            (after_id, self.worker_id)
+        ).fetchall()
+
+    async def listen(self, on_progress: Callable[[int, Dict], None], should_continue: Callable[[], bool]):
+        last_id = await asyncio.to_thread(self._latest_event_id)
+        while should_continue():
+            await asyncio.sleep(self.poll_interval)
+            rows = await asyncio.to_thread(self._read_events, last_id)
+            # 同一轮中同一文档只应用最新的一条
+            latest: Dict[int, str] = {}
+            for event_id, document_id, payload in rows:
+                last_id = event_id
+                latest[document_id] = payload
+            for document_id, payload in latest.items():
+                on_progress(document_id, json.loads(payload))
+
+
+def create_progress_backend(name: str = PROGRESS_BACKEND) -> ProgressBackend:
+    """根据配置创建进度后端"""
+    if name == "sqlite":
+        return SQLiteProgressBackend()
+    if name != "local":
+        raise ValueError(f"不支持的进度后端: {name}")
+    return ProgressBackend()
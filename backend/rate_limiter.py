@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""LLM接口自适应限流
+
+提供进程内共享的令牌桶限流（每分钟请求数、每分钟Token数）、带抖动的指数退避重试
+（优先遵循 Retry-After 响应头），以及根据错误率自动调整的并发上限（AIMD）。
+调用方在同步线程中使用，等待期间只阻塞当前线程（ai_service 中为AI调用专用线程池的线程）。
+"""
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+from logger_config import main_logger as logger
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_minute > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_minute / 60.0)
+        self.updated_at = now
+
+    def acquire(self, amount: float = 1.0):
+        """取出指定数量的令牌，不足时等待"""
+        if not self.enabled:
+            return
+        # 单次请求超过桶容量时按容量计算，避免永远等待
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) * 60.0 / self.rate_per_minute
+            time.sleep(wait)
+
+    def adjust(self, amount: float):
+        """按实际用量修正令牌（正数扣除，负数归还），允许暂时为负"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+    def set_rate(self, rate_per_minute: float):
+        with self._lock:
+            self._refill()
+            self.rate_per_minute = rate_per_minute
+
+
+class AdaptiveConcurrency:
+    """根据错误率调整的并发上限：成功时加性增加，限流或服务端出错时乘性减少"""
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+            self._condition.notify_all()
+
+    def on_throttled(self):
+        with self._condition:
+            self.limit = max(self.min_limit, self.limit / 2)
+
+
+class RetryableError(Exception):
+    """可重试的接口错误，携带服务端建议的等待时间
+
+    Args:
+        throttled: 是否为限流（429），限流时同时降低请求速率；其他可重试错误（5xx、连接错误）只降低并发上限
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, throttled: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.throttled = throttled
+
+
+class AdaptiveRateLimiter:
+    """LLM调用的共享限流器
+
+    Args:
+        requests_per_minute: 每分钟请求数上限，0表示不限制
+        tokens_per_minute: 每分钟Token数上限，0表示不限制
+        max_concurrency: 最大并发请求数
+        max_retries: 可重试错误的最大重试次数
+        backoff_base: 退避基准时间（秒）
+        backoff_max: 单次退避的最长时间（秒）
+    """
+
+    # 连续成功多少次后尝试恢复一次速率
+    RECOVERY_INTERVAL = 20
+
+    def __init__(self, requests_per_minute: float = 60, tokens_per_minute: float = 0,
+                 max_concurrency: int = 4, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0):
+        self.max_requests_per_minute = requests_per_minute
+        self.max_tokens_per_minute = tokens_per_minute
+        self.request_bucket = TokenBucket(requests_per_minute, capacity=max(1.0, requests_per_minute / 6))
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._successes_since_throttle = 0
+        # 统计信息
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None and retry_after >= 0:
+            # 遵循服务端的 Retry-After，并加少量抖动避免同时重试
+            return min(self.backoff_max, retry_after) + random.uniform(0, self.backoff_base)
+        # Full Jitter 指数退避
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _on_success(self):
+        self.concurrency.on_success()
+        with self._lock:
+            self._successes_since_throttle += 1
+            if self._successes_since_throttle % self.RECOVERY_INTERVAL != 0:
+                return
+            # 持续成功时逐步恢复速率，直到配置的上限
+            for bucket, max_rate in ((self.request_bucket, self.max_requests_per_minute),
+                                     (self.token_bucket, self.max_tokens_per_minute)):
+                if bucket.enabled and bucket.rate_per_minute < max_rate:
+                    bucket.set_rate(min(max_rate, bucket.rate_per_minute * 1.1))
+
+    def _on_throttled(self):
+        self.concurrency.on_throttled()
+        with self._lock:
+            self._successes_since_throttle = 0
+            self.stats["throttled"] += 1
+            # 被限流时降低速率，使实际吞吐稳定在服务商上限之下
+            for bucket, max_rate in ((self.request_bucket, self.max_requests_per_minute),
+                                     (self.token_bucket, self.max_tokens_per_minute)):
+                if bucket.enabled:
+                    bucket.set_rate(max(max_rate * 0.1, bucket.rate_per_minute * 0.8))
+        logger.warning(f"LLM接口触发限流，并发上限调整为 {int(self.concurrency.limit)}，"
+                       f"请求速率调整为 {self.request_bucket.rate_per_minute:.1f}/min")
+
+    def call(self, func: Callable, estimated_tokens: int = 0,
+             usage_tokens: Optional[Callable] = None):
+        """在限流保护下执行调用，遇到可重试错误时退避重试
+
+        Args:
+            func: 实际发起请求的函数，可重试的失败应抛出 RetryableError
+            estimated_tokens: 预估消耗的Token数，用于Token限流
+            usage_tokens: 从返回结果中读取实际Token用量的函数
+
+        Returns:
+            func 的返回值
+        """
+        attempt = 0
+        while True:
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(estimated_tokens)
+            self.concurrency.acquire()
+            try:
+                with self._lock:
+                    self.stats["requests"] += 1
+                result = func()
+            except RetryableError as e:
+                self.concurrency.release()
+                if e.throttled:
+                    self._on_throttled()
+                else:
+                    # 服务端过载（5xx、连接错误）时同样减少并发，避免继续加重负载
+                    self.concurrency.on_throttled()
+                if attempt >= self.max_retries:
+                    with self._lock:
+                        self.stats["failures"] += 1
+                    logger.error(f"LLM接口调用重试 {attempt} 次后仍失败: {str(e)}")
+                    raise
+                delay = self._backoff_delay(attempt, e.retry_after)
+                attempt += 1
+                with self._lock:
+                    self.stats["retries"] += 1
+                logger.warning(f"LLM接口调用失败，{delay:.1f}秒后进行第 {attempt}/{self.max_retries} 次重试: {str(e)}")
+                time.sleep(delay)
+                continue
+            except Exception:
+                self.concurrency.release()
+                raise
+            self.concurrency.release()
+            self._on_success()
+            if usage_tokens is not None and estimated_tokens:
+                actual = usage_tokens(result)
+                if actual:
+                    self.token_bucket.adjust(actual - estimated_tokens)
+            return result
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或HTTP日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""AI响应解析工具
+
+单遍扫描LLM输出，定位JSON片段（支持代码块、尾随逗号和被截断的输出），
+并解析其中的Markdown表格。用于替代贪婪的 `\\{.*\\}` / `\\[.*\\]` 正则匹配。
+"""
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# JSON扫描时只关心的字符：括号、引号和转义符
+_JSON_TOKEN_RE = re.compile(r'[{}\[\]"\\,]')
+# 字符串内部只关心引号和转义符
+_STRING_TOKEN_RE = re.compile(r'["\\]')
+_CLOSERS = {'{': '}', '[': ']'}
+# 截断修复时最多回退的切分点数量
+_MAX_TRUNCATION_CUTS = 16
+
+_TABLE_SEPARATOR_RE = re.compile(r'^\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?$')
+_EMPTY_FENCE_RE = re.compile(r'```[A-Za-z]*\s*```')
+
+
+class JsonSpan:
+    """扫描得到的一个顶层JSON片段"""
+
+    __slots__ = ("start", "end", "closed", "_cuts", "_tail_closers", "_tail_in_string")
+
+    def __init__(self, start: int, end: int, closed: bool,
+                 cuts: Optional[List[Tuple[int, str]]] = None, tail_closers: str = "",
+                 tail_in_string: bool = False):
+        self.start = start
+        self.end = end
+        self.closed = closed
+        # 截断片段的候选切分点: (位置, 该位置需要补齐的闭合括号)
+        self._cuts = cuts or []
+        # 文本结尾处需要补齐的闭合括号，以及结尾是否停在字符串内部
+        self._tail_closers = tail_closers
+        self._tail_in_string = tail_in_string
+
+    def __repr__(self):
+        return f"JsonSpan(start={self.start}, end={self.end}, closed={self.closed})"
+
+
+def iter_json_spans(text: str, pos: int = 0):
+    """单遍扫描文本，依次产出顶层的JSON对象/数组片段
+
+    扫描器只跟踪括号栈和字符串状态，不做任何回溯；括号不匹配时丢弃当前片段
+    并从该位置继续扫描。文本结束时仍未闭合的片段以 closed=False 产出。
+
+    Args:
+        text: LLM原始输出
+        pos: 开始扫描的位置
+
+    Yields:
+        JsonSpan: 顶层JSON片段
+    """
+    stack: List[str] = []
+    start = -1
+    cuts: List[Tuple[int, str]] = []
+    length = len(text)
+
+    while pos < length:
+        if not stack:
+            # 顶层：直接跳到下一个可能的JSON起点
+            next_obj = text.find('{', pos)
+            next_arr = text.find('[', pos)
+            if next_obj < 0 and next_arr < 0:
+                return
+            if next_obj < 0 or (0 <= next_arr < next_obj):
+                pos = next_arr
+            else:
+                pos = next_obj
+            start = pos
+            stack.append(_CLOSERS[text[pos]])
+            cuts = [(pos + 1, stack[-1])]
+            pos += 1
+            continue
+
+        match = _JSON_TOKEN_RE.search(text, pos)
+        if match is None:
+            break
+        char = match.group()
+        pos = match.end()
+
+        if char == '"':
+            # 跳过整个字符串
+            while True:
+                string_match = _STRING_TOKEN_RE.search(text, pos)
+                if string_match is None:
+                    yield JsonSpan(start, length, False, cuts, ''.join(reversed(stack)), tail_in_string=True)
+                    return
+                pos = string_match.end()
+                if string_match.group() == '\\':
+                    pos += 1
+                    continue
+                break
+        elif char in '{[':
+            stack.append(_CLOSERS[char])
+            cuts.append((pos, ''.join(reversed(stack))))
+        elif char in '}]':
+            if stack[-1] != char:
+                # 括号不匹配，放弃该片段，从片段起点之后继续
+                stack.clear()
+                pos = start + 1
+                continue
+            stack.pop()
+            if not stack:
+                yield JsonSpan(start, pos, True)
+            else:
+                cuts.append((pos, ''.join(reversed(stack))))
+        elif char == ',':
+            cuts.append((match.start(), ''.join(reversed(stack))))
+
+    if stack:
+        yield JsonSpan(start, length, False, cuts, ''.join(reversed(stack)))
+
+
+def _strip_trailing_commas(fragment: str) -> str:
+    """删除字符串之外、闭合括号之前的尾随逗号"""
+    if ',' not in fragment:
+        return fragment
+    out = []
+    pos = 0
+    in_string = False
+    pending_comma = -1
+    length = len(fragment)
+    while pos < length:
+        char = fragment[pos]
+        if in_string:
+            if char == '\\':
+                pos += 2
+                continue
+            if char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            pending_comma = -1
+        elif char == ',':
+            pending_comma = len(out)
+        elif char in '}]':
+            if pending_comma >= 0:
+                out[pending_comma] = ''
+            pending_comma = -1
+        elif not char.isspace():
+            pending_comma = -1
+        out.append(char)
+        pos += 1
+    return ''.join(out)
+
+
+def _loads(fragment: str) -> Any:
+    try:
+        return json.loads(fragment)
+    except json.JSONDecodeError:
+        repaired = _strip_trailing_commas(fragment)
+        if repaired is fragment:
+            raise
+        return json.loads(repaired)
+
+
+def load_span(text: str, span: JsonSpan) -> Any:
+    """解析一个JSON片段，必要时修复尾随逗号和截断
+
+    Raises:
+        json.JSONDecodeError: 片段无法修复
+    """
+    fragment = text[span.start:span.end]
+    if span.closed:
+        return _loads(fragment)
+
+    # 截断输出：先尝试直接补齐，再从最近的切分点向前回退。
+    # 回退成空容器的结果没有意义，多半是正文中落单的括号（如 "见 [ref {...}"），不予采用
+    last_error = None
+    tail = fragment + ('"' if span._tail_in_string else '')
+    candidates = [tail + span._tail_closers]
+    candidates += [text[span.start:cut] + need for cut, need in reversed(span._cuts[-_MAX_TRUNCATION_CUTS:])]
+    for candidate in candidates:
+        try:
+            value = _loads(candidate)
+        except json.JSONDecodeError as e:
+            last_error = e
+            continue
+        if isinstance(value, (dict, list)) and not value:
+            last_error = json.JSONDecodeError("截断修复后为空容器", candidate, 0)
+            continue
+        return value
+    raise last_error or json.JSONDecodeError("无法修复被截断的JSON", fragment, 0)
+
+
+def extract_json(text: str, predicate: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, Optional[Tuple[int, int]]]:
+    """从LLM输出中提取JSON值
+
+    依次解析扫描到的片段，返回第一个满足 predicate 的值；没有满足条件的
+    片段时返回可解析片段中最长的一个。
+
+    未闭合的片段会一直延伸到文本结尾，可能只是正文中落单的括号（如 "单位为 [mmol"），
+    它无法解析或不满足 predicate 时，从片段起点之后重新扫描，后面真正的JSON仍能被找到。
+
+    Args:
+        text: LLM原始输出
+        predicate: 可选的筛选函数，例如 `lambda v: isinstance(v, dict)`
+
+    Returns:
+        (解析结果, (起始位置, 结束位置))；未找到时返回 (None, None)
+    """
+    if not text:
+        return None, None
+    fallback = None
+    fallback_len = -1
+    pos = 0
+    while pos is not None:
+        restart, pos = pos, None
+        for span in iter_json_spans(text, restart):
+            try:
+                value = load_span(text, span)
+            except json.JSONDecodeError:
+                if not span.closed:
+                    pos = span.start + 1
+                continue
+            if predicate is None or predicate(value):
+                return value, (span.start, span.end)
+            if not span.closed:
+                pos = span.start + 1
+                continue
+            if span.end - span.start > fallback_len:
+                fallback = (value, (span.start, span.end))
+                fallback_len = span.end - span.start
+    if predicate is None and fallback is not None:
+        return fallback
+    return None, None
+
+
+def remove_span(text: str, span: Optional[Tuple[int, int]]) -> str:
+    """从文本中移除指定片段及其留下的空代码块"""
+    if not span:
+        return text.strip()
+    remainder = text[:span[0]] + text[span[1]:]
+    return _EMPTY_FENCE_RE.sub('', remainder).strip()
+
+
+def _split_table_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|'):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split('|')]
+
+
+def parse_markdown_tables(text: str) -> List[Dict]:
+    """逐行解析文本中的所有Markdown表格
+
+    Args:
+        text: 包含Markdown表格的文本
+
+    Returns:
+        List[Dict]: 每个表格包含 headers、rows（按表头映射的字典）和 markdown（原始文本）
+    """
+    tables = []
+    if not text or '|' not in text:
+        return tables
+    lines = text.splitlines()
+    i = 0
+    total = len(lines)
+    while i < total - 1:
+        header_line = lines[i].strip()
+        if not header_line.startswith('|') or not _TABLE_SEPARATOR_RE.match(lines[i + 1].strip()):
+            i += 1
+            continue
+        headers = _split_table_row(header_line)
+        block = [lines[i].strip(), lines[i + 1].strip()]
+        rows = []
+        j = i + 2
+        while j < total and lines[j].strip().startswith('|'):
+            row_line = lines[j].strip()
+            block.append(row_line)
+            cells = _split_table_row(row_line)
+            cells += [''] * (len(headers) - len(cells))
+            rows.append(dict(zip(headers, cells)))
+            j += 1
+        tables.append({"headers": headers, "rows": rows, "markdown": '\n'.join(block)})
+        i = j
+    return tables
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""活性数据的数值解析与单位标准化
+
+AI提取的活性数据中，活性数值、测试温度和测试压力都是自由文本，单位五花八门
+（%、mol/g/h、s⁻¹、°C 与 K、MPa 与 bar），不同文献的数据无法放在同一坐标轴上比较。
+这里把每条活性数据解析为数值（支持范围 "250-300"、误差 "25.6 ± 1.2"、
+科学计数法 "1.2×10⁻³"），再换算为标准单位：
+
+    活性数值  反应速率 mmol g⁻¹ h⁻¹，TOF 等 s⁻¹，百分数 %；无法识别的单位保持原样
+    测试温度  °C
+    测试压力  MPa
+
+单位文本的解析结果会缓存，换算本身按批用 NumPy 一次完成。标准化结果保存在
+activity_values 表中（原始文本一并保存），分析结果保存时自动更新；
+解析规则调整后可以执行本脚本重新生成全部数据。
+
+用法:
+    python unit_normalizer.py    # 重新生成所有文献的标准化活性数据
+"""
+import argparse
+import json
+import math
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.engine import Connection
+
+from models import ActivityValue, Analysis, engine
+
+# 回填时每批处理的分析结果数
+BACKFILL_BATCH_SIZE = 200
+
+# 统一各种写法的负号、上标、范围符号和微符号
+_TRANSLATION = str.maketrans({
+    "−": "-", "–": "-", "—": "-", "⁻": "-", "⁺": "+", "～": "~", "，": ",", "；": ";",
+    "（": "(", "）": ")", "μ": "µ", "º": "°", "⋅": "·", "•": "·",
+    "⁰": "0", "¹": "1", "²": "2", "³": "3", "⁴": "4", "⁵": "5", "⁶": "6", "⁷": "7", "⁸": "8", "⁹": "9",
+})
+_NUMBER = r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:\s*(?:[eE][-+]?\d+|[×xX*]\s*10\s*\^?\s*[-+]?\d+))?"
+_RANGE_SEPARATOR = r"(?:-|~|to|至|到)"
+_QUANTITY = re.compile(
+    rf"(?P<value>{_NUMBER})\s*(?:(?:±|\+/-|\+-)\s*(?P<uncertainty>{_NUMBER})"
+    rf"|{_RANGE_SEPARATOR}\s*(?P<high>{_NUMBER}))?(?P<rest>.*)$", re.S)
+# 单位写在范围两端的情况，如 "250 °C - 300 °C"
+_UNIT_RANGE = re.compile(rf"^(?P<unit>[^\d,;(]+?)\s*{_RANGE_SEPARATOR}\s*(?P<high>{_NUMBER})(?P<rest>.*)$", re.S)
+_THOUSANDS_SEPARATOR = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+
+
+class Quantity(NamedTuple):
+    """从文本中解析出的数值
+
+    Args:
+        value: 数值，范围取中点
+        low: 范围下限
+        high: 范围上限
+        uncertainty: 误差（±）
+        unit: 数值后面的单位文本
+    """
+    value: float
+    low: Optional[float] = None
+    high: Optional[float] = None
+    uncertainty: Optional[float] = None
+    unit: str = ""
+
+
+def _to_float(text: str) -> float:
+    compact = re.sub(r"\s+", "", text)
+    return float(re.sub(r"[×xX*]10\^?", "e", compact))
+
+
+def parse_quantity(value) -> Optional[Quantity]:
+    """解析数值、范围和误差，没有数值时返回None
+
+    Examples:
+        25.6            -> Quantity(25.6)
+        "250-300 °C"    -> Quantity(275.0, 250.0, 300.0, None, "°C")
+        "25.6 ± 1.2 %"  -> Quantity(25.6, None, None, 1.2, "%")
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return Quantity(float(value)) if math.isfinite(value) else None
+    if not isinstance(value, str):
+        return None
+    text = _THOUSANDS_SEPARATOR.sub("", value.translate(_TRANSLATION))
+    match = _QUANTITY.search(text)
+    if not match:
+        return None
+    number = _to_float(match.group("value"))
+    uncertainty = abs(_to_float(match.group("uncertainty"))) if match.group("uncertainty") else None
+    high = _to_float(match.group("high")) if match.group("high") else None
+    rest = match.group("rest")
+    if high is None and uncertainty is None:
+        unit_range = _UNIT_RANGE.match(rest.strip())
+        if unit_range:
+            after = unit_range.group("rest").strip()
+            # 两端都写了单位才视为范围，避免把 "s-1" 中的指数当成范围
+            if after and after.startswith(unit_range.group("unit").strip()):
+                high = _to_float(unit_range.group("high"))
+                rest = unit_range.group("unit")
+    unit = re.split(r"[,;]", rest, maxsplit=1)[0].strip()
+    if high is None:
+        return Quantity(number, uncertainty=uncertainty, unit=unit)
+    low, high = min(number, high), max(number, high)
+    return Quantity((low + high) / 2, low, high, unit=unit)
+
+
+# 活性单位的基本单位：名称 -> (量纲, 换算为 mol/g/s/L 的系数)
+_UNIT_ATOMS = {
+    "mol": ("amount", 1.0), "kmol": ("amount", 1e3), "mmol": ("amount", 1e-3),
+    "µmol": ("amount", 1e-6), "umol": ("amount", 1e-6), "nmol": ("amount", 1e-9),
+    "g": ("mass", 1.0), "kg": ("mass", 1e3), "mg": ("mass", 1e-3), "µg": ("mass", 1e-6),
+    "s": ("time", 1.0), "sec": ("time", 1.0), "min": ("time", 60.0),
+    "h": ("time", 3600.0), "hr": ("time", 3600.0), "hour": ("time", 3600.0),
+    "L": ("volume", 1.0), "mL": ("volume", 1e-3), "ml": ("volume", 1e-3), "µL": ("volume", 1e-6),
+}
+# 物质的量和质量后面可以带物种或催化剂说明，如 gcat、molCO、mgPd
+_QUALIFIED_ATOMS = sorted((name for name, (dimension, _) in _UNIT_ATOMS.items() if dimension in ("amount", "mass")),
+                          key=len, reverse=True)
+_QUALIFIER_WORDS = {"cat", "cata", "catalyst", "metal"}
+# 量纲 (物质的量, 分子质量, 分母质量, 时间, 体积) -> (标准单位, 由 mol/g/s/L 换算的系数)
+_CANONICAL_ACTIVITY_UNITS = {
+    (0, 0, 0, -1, 0): ("s⁻¹", 1.0),
+    (1, 0, 1, -1, 0): ("mmol g⁻¹ h⁻¹", 1e3 * 3600),
+    (1, 0, 0, -1, 0): ("mmol h⁻¹", 1e3 * 3600),
+    (1, 0, 1, 0, 0): ("mmol g⁻¹", 1e3),
+    (0, 1, 1, -1, 0): ("g g⁻¹ h⁻¹", 3600.0),
+    (0, 0, 1, -1, 1): ("mL g⁻¹ h⁻¹", 1e3 * 3600),
+}
+_UNIT_TOKEN = re.compile(r"[A-Za-zµ]+(?:\s*\^?\s*[-+]\s*\d+|\s*\^\s*\d+)?|[/()]")
+
+
+def _match_atom(word: str) -> Optional[str]:
+    if word in _UNIT_ATOMS:
+        return word
+    for atom in _QUALIFIED_ATOMS:
+        rest = word[len(atom):]
+        if word.startswith(atom) and rest and (rest[0].isupper() or rest.lower() in _QUALIFIER_WORDS):
+            return atom
+    return None
+
+
+@lru_cache(maxsize=1024)
+def resolve_activity_unit(text: str) -> Tuple[Optional[str], float]:
+    """解析活性数值的单位
+
+    Returns:
+        Tuple[Optional[str], float]: (标准单位, 换算系数)；无法识别的单位原样返回，系数为1；没有单位时为 (None, 1)
+    """
+    clean = " ".join(text.translate(_TRANSLATION).split())
+    if not clean:
+        return None, 1.0
+    if "%" in clean:
+        return "%", 1.0
+    atoms: List[List] = []  # [基本单位, 指数, 是否显式写出指数]
+    group_signs = [1]
+    divide_next = False
+    for token in _UNIT_TOKEN.findall(clean):
+        if token == "/":
+            divide_next = True
+            continue
+        if token == "(":
+            group_signs.append(group_signs[-1] * (-1 if divide_next else 1))
+            divide_next = False
+            continue
+        if token == ")":
+            if len(group_signs) > 1:
+                group_signs.pop()
+            continue
+        word, _, exponent = re.match(r"([A-Za-zµ]+)\s*(\^?)\s*(.*)", token).groups()
+        sign = group_signs[-1] * (-1 if divide_next else 1)
+        divide_next = False
+        power = int(exponent.replace(" ", "")) if exponent else 1
+        atom = _match_atom(word)
+        if atom is None:
+            # "g cat⁻¹" 中指数写在说明词后面，属于前一个单位
+            if exponent and atoms and not atoms[-1][2]:
+                atoms[-1][1] *= sign * power
+                atoms[-1][2] = True
+            continue
+        atoms.append([atom, sign * power, bool(exponent)])
+    if not atoms:
+        return clean, 1.0
+
+    scale = 1.0
+    dimensions = {"amount": 0, "mass_num": 0, "mass_den": 0, "time": 0, "volume": 0}
+    for atom, power, _ in atoms:
+        dimension, factor = _UNIT_ATOMS[atom]
+        scale *= factor ** power
+        if dimension == "mass":
+            dimensions["mass_num" if power > 0 else "mass_den"] += abs(power)
+        else:
+            dimensions[dimension] += power
+    canonical = _CANONICAL_ACTIVITY_UNITS.get(tuple(dimensions.values()))
+    if canonical is None:
+        return clean, 1.0
+    return canonical[0], scale * canonical[1]
+
+
+_ROOM_TEMPERATURE = re.compile(r"室温|常温|room\s*temp|ambient\s*temp|^\s*r\.?t\.?\s*$", re.I)
+_ATMOSPHERIC_PRESSURE = re.compile(r"常压|大气压|atmospheric|ambient", re.I)
+# 温度单位 -> (系数, 偏移)，换算为 °C
+_TEMPERATURE_UNITS = [
+    (re.compile(r"^(°c|℃|oc|degc|c)(?![a-z])"), (1.0, 0.0)),
+    (re.compile(r"^k(?![a-z])"), (1.0, -273.15)),
+    (re.compile(r"^(°f|℉|f)(?![a-z])"), (5 / 9, -32 * 5 / 9)),
+]
+# 压力单位 -> 换算为 MPa 的系数，单位后可以带气体名称，如 "bar H2"
+_PRESSURE_UNITS = [
+    (re.compile(r"^mpa"), 1.0), (re.compile(r"^gpa"), 1e3), (re.compile(r"^kpa"), 1e-3),
+    (re.compile(r"^mbar"), 1e-4), (re.compile(r"^bar"), 0.1), (re.compile(r"^atm"), 0.101325),
+    (re.compile(r"^psi"), 0.00689476), (re.compile(r"^(torr|mmhg)"), 1.33322e-4), (re.compile(r"^pa(?![a-z])"), 1e-6),
+]
+
+
+@lru_cache(maxsize=256)
+def resolve_temperature_unit(text: str) -> Optional[Tuple[float, float]]:
+    """温度单位换算为 °C 的 (系数, 偏移)；没有单位时按 °C 处理，无法识别时返回None"""
+    clean = text.translate(_TRANSLATION).replace(" ", "").lower()
+    if not clean:
+        return 1.0, 0.0
+    for pattern, conversion in _TEMPERATURE_UNITS:
+        if pattern.match(clean):
+            return conversion
+    return None
+
+
+@lru_cache(maxsize=256)
+def resolve_pressure_unit(text: str) -> Optional[float]:
+    """压力单位换算为 MPa 的系数，没有单位或无法识别时返回None"""
+    clean = text.translate(_TRANSLATION).replace(" ", "").lower()
+    for pattern, factor in _PRESSURE_UNITS:
+        if pattern.match(clean):
+            return factor
+    return None
+
+
+def _parse_temperature(value) -> Tuple[Optional[Quantity], Optional[Tuple[float, float]]]:
+    quantity = parse_quantity(value)
+    if quantity is None:
+        if isinstance(value, str) and _ROOM_TEMPERATURE.search(value):
+            return Quantity(25.0), (1.0, 0.0)
+        return None, None
+    return quantity, resolve_temperature_unit(quantity.unit)
+
+
+def _parse_pressure(value) -> Tuple[Optional[Quantity], Optional[float]]:
+    quantity = parse_quantity(value)
+    if quantity is None:
+        if isinstance(value, str) and _ATMOSPHERIC_PRESSURE.search(value):
+            return Quantity(0.101325), 1.0
+        return None, None
+    return quantity, resolve_pressure_unit(quantity.unit)
+
+
+def _convert(quantities: List[Optional[Quantity]], scales: List[float], offsets: List[float]) -> np.ndarray:
+    """批量换算单位
+
+    Returns:
+        np.ndarray: N×4 数组，列依次为数值、下限、上限、误差，缺失或无法换算为NaN
+    """
+    raw = np.array([(q.value, q.low, q.high, q.uncertainty) if q else (None,) * 4 for q in quantities],
+                   dtype=float).reshape(-1, 4)
+    scale = np.asarray(scales, dtype=float)[:, None]
+    converted = raw * scale
+    # 误差只按比例换算，不加偏移
+    converted[:, :3] += np.asarray(offsets, dtype=float)[:, None]
+    return converted
+
+
+def _optional(value: float) -> Optional[float]:
+    # 保留12位有效数字，去掉换算产生的浮点误差
+    return None if np.isnan(value) else float(f"{value:.12g}")
+
+
+def _text(value) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def normalize_activity_data(activity_data: Dict[int, Iterable]) -> List[Dict]:
+    """把多篇文献的活性数据解析并换算为标准单位
+
+    Args:
+        activity_data: 文档ID -> 活性数据列表（分析结果中的"活性数据"）
+
+    Returns:
+        List[Dict]: activity_values 表的行，row_index 为该条数据在活性数据列表中的位置
+    """
+    rows: List[Dict] = []
+    activity: List[Optional[Quantity]] = []
+    activity_scales: List[float] = []
+    temperatures: List[Optional[Quantity]] = []
+    temperature_scales: List[float] = []
+    temperature_offsets: List[float] = []
+    pressures: List[Optional[Quantity]] = []
+    pressure_scales: List[float] = []
+    for document_id, entries in activity_data.items():
+        if not isinstance(entries, list):
+            continue
+        for row_index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            raw_value, raw_unit = entry.get("活性数值"), entry.get("单位")
+            quantity = parse_quantity(raw_value)
+            unit_text = raw_unit if isinstance(raw_unit, str) and raw_unit.strip() else (quantity.unit if quantity else "")
+            unit, scale = resolve_activity_unit(unit_text)
+            activity.append(quantity)
+            activity_scales.append(scale)
+
+            temperature, temperature_conversion = _parse_temperature(entry.get("测试温度"))
+            temperatures.append(temperature)
+            temperature_scales.append(temperature_conversion[0] if temperature_conversion else np.nan)
+            temperature_offsets.append(temperature_conversion[1] if temperature_conversion else 0.0)
+
+            pressure, pressure_factor = _parse_pressure(entry.get("测试压力"))
+            pressures.append(pressure)
+            pressure_scales.append(pressure_factor if pressure_factor else np.nan)
+
+            rows.append({
+                "document_id": document_id,
+                "row_index": row_index,
+                "catalyst": _text(entry.get("催化剂名称")),
+                "activity_raw": _text(raw_value),
+                "activity_unit_raw": _text(raw_unit),
+                "activity_unit": unit if quantity else None,
+                "temperature_raw": _text(entry.get("测试温度")),
+                "pressure_raw": _text(entry.get("测试压力")),
+            })
+    if not rows:
+        return rows
+
+    converted_activity = _convert(activity, activity_scales, [0.0] * len(rows))
+    converted_temperature = _convert(temperatures, temperature_scales, temperature_offsets)
+    converted_pressure = _convert(pressures, pressure_scales, [0.0] * len(rows))
+    for row, (value, low, high, uncertainty), temperature, pressure in zip(
+            rows, converted_activity, converted_temperature, converted_pressure):
+        row.update({
+            "activity_value": _optional(value),
+            "activity_low": _optional(low),
+            "activity_high": _optional(high),
+            "activity_uncertainty": _optional(uncertainty),
+            "temperature_c": _optional(temperature[0]),
+            "temperature_low_c": _optional(temperature[1]),
+            "temperature_high_c": _optional(temperature[2]),
+            "pressure_mpa": _optional(pressure[0]),
+            "pressure_low_mpa": _optional(pressure[1]),
+            "pressure_high_mpa": _optional(pressure[2]),
+        })
+    return rows
+
+
+def _load_activity_data(content) -> Optional[list]:
+    try:
+        content = json.loads(content) if content else {}
+    except ValueError:
+        return None
+    return content.get("活性数据") if isinstance(content, dict) else None
+
+
+def backfill_activity_values(conn: Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """根据所有分析结果重新生成标准化活性数据
+
+    Returns:
+        int: 生成的活性数据条数
+    """
+    analyses = Analysis.__table__
+    activity_values = ActivityValue.__table__
+    document_ids = [row[0] for row in conn.execute(
+        select(analyses.c.document_id).where(analyses.c.document_id.is_not(None)).order_by(analyses.c.document_id)
+    )]
+    total = 0
+    for start in range(0, len(document_ids), batch_size):
+        batch = document_ids[start:start + batch_size]
+        contents = conn.execute(
+            select(analyses.c.document_id, analyses.c.content).where(analyses.c.document_id.in_(batch))
+        ).all()
+        rows = normalize_activity_data({row.document_id: _load_activity_data(row.content) for row in contents})
+        conn.execute(delete(activity_values).where(activity_values.c.document_id.in_(batch)))
+        if rows:
+            conn.execute(activity_values.insert(), rows)
+        total += len(rows)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重新生成所有文献的标准化活性数据")
+    parser.parse_args()
+
+    from migrations import run_migrations
+    run_migrations()
+    with engine.begin() as conn:
+        total = backfill_activity_values(conn)
+    print(f"已生成 {total} 条标准化活性数据")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""流式接收上传文件
+
+直接解析请求体中的 multipart 数据，按块写入最终目录，不经过 UploadFile 的临时文件，
+单文件上传和批量上传共用同一套处理：
+
+- 每个数据块只处理一次：写入文件、更新SHA-256、累计大小
+- 超过大小限制时立即停止读取并删除已写入的部分
+- 文件头（魔数）与扩展名不符时立即拒绝，避免保存伪装的文件
+
+文件先写入 {目标文件}.part，全部接收且校验通过后再改名为目标文件。
+"""
+import hashlib
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple, Union
+
+import anyio
+import multipart
+from multipart.multipart import parse_options_header
+from starlette.requests import Request
+
+from metrics import UPLOAD_SIZE
+
+# 上传文件大小上限（MB）
+UPLOAD_MAX_SIZE = int(float(os.getenv("UPLOAD_MAX_SIZE_MB", "50")) * 1024 * 1024)
+# 批量上传单次请求的文件数量上限
+BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "200"))
+# multipart 边界和表单头部的额外字节
+MULTIPART_OVERHEAD = 64 * 1024
+
+# 支持的扩展名及对应的文件类型
+FILE_TYPES = {".pdf": "PDF", ".docx": "Word", ".doc": "Word"}
+# 文件头检查读取的字节数；PDF允许 %PDF- 出现在前1024字节内
+MAGIC_WINDOW = 1024
+_OLE2_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+
+class UploadError(Exception):
+    """上传的文件不符合要求
+
+    Args:
+        message: 返回给客户端的错误信息
+        status_code: HTTP状态码
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class StoredUpload:
+    """已保存的上传文件"""
+
+    def __init__(self, filename: str, path: str, size: int, content_hash: str):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+
+    @property
+    def extension(self) -> str:
+        return os.path.splitext(self.filename)[1].lower()
+
+    @property
+    def file_type(self) -> str:
+        return FILE_TYPES[self.extension]
+
+
+def _matches_magic(extension: str, head: bytes) -> bool:
+    """根据文件头判断内容是否与扩展名一致"""
+    if extension == ".pdf":
+        return b"%PDF-" in head[:MAGIC_WINDOW]
+    if extension == ".docx":
+        return head.startswith(b"PK\x03\x04")
+    if extension == ".doc":
+        # 旧版 .doc 为OLE2复合文档，也有直接保存为 .doc 的 docx
+        return head.startswith(_OLE2_SIGNATURE) or head.startswith(b"PK\x03\x04")
+    return False
+
+
+class _MultipartFileReader:
+    """把 multipart 解析器的回调整理为文件事件
+
+    事件依次为 ("begin", 文件名)、若干 ("data", 数据块)、("end", None)；
+    不是指定字段或没有文件名的表单字段忽略。
+    """
+
+    def __init__(self, boundary: bytes, field_name: str):
+        self.field_name = field_name
+        self.events: List[Tuple[str, Optional[object]]] = []
+        self._in_file = False
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self.parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode("latin-1") == self.field_name and b"filename" in options:
+            filename = os.path.basename(options[b"filename"].decode("utf-8", errors="replace"))
+            self.events.append(("begin", filename))
+            self._in_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.events.append(("data", data[start:end]))
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self.events.append(("end", None))
+
+    def take_events(self) -> List[Tuple[str, Optional[object]]]:
+        events, self.events = self.events, []
+        return events
+
+
+class _FileWriter:
+    """把一个文件字段的数据写入上传目录，同时计算哈希并校验大小和文件头
+
+    出错后不再写入，已写入的部分文件会被删除，之后的数据直接丢弃。
+    """
+
+    def __init__(self, filename: str, upload_dir: str, max_size: int):
+        self.filename = filename
+        self.max_size = max_size
+        self.error: Optional[UploadError] = None
+        self.extension = os.path.splitext(filename)[1].lower()
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._head = b""
+        self._magic_checked = False
+        self._file = None
+        self.final_path = os.path.join(upload_dir, f"{uuid.uuid4()}{self.extension}")
+        self.temp_path = self.final_path + ".part"
+        if self.extension not in FILE_TYPES:
+            self.error = UploadError("只支持PDF和Word文档格式")
+
+    async def write(self, chunk: bytes):
+        if self.error:
+            return
+        try:
+            self.size += len(chunk)
+            if self.size > self.max_size:
+                raise UploadError(f"文件大小超过限制（最大{_format_limit(self.max_size)}）", status_code=413)
+            if not self._magic_checked:
+                self._head += chunk[:MAGIC_WINDOW]
+                if len(self._head) >= MAGIC_WINDOW:
+                    if not _matches_magic(self.extension, self._head):
+                        raise UploadError("文件内容与扩展名不符")
+                    self._magic_checked = True
+            self._hasher.update(chunk)
+            if self._file is None:
+                self._file = await anyio.open_file(self.temp_path, "wb")
+            await self._file.write(chunk)
+        except UploadError as e:
+            self.error = e
+            await self.discard()
+
+    async def finish(self) -> StoredUpload:
+        """文件数据接收完毕，校验通过后改名为最终文件
+
+        Raises:
+            UploadError: 文件不符合要求
+        """
+        if not self.error:
+            if self.size == 0:
+                self.error = UploadError("上传的文件为空")
+            elif not self._magic_checked and not _matches_magic(self.extension, self._head):
+                self.error = UploadError("文件内容与扩展名不符")
+        if self.error:
+            await self.discard()
+            raise self.error
+        await self._file.aclose()
+        self._file = None
+        os.replace(self.temp_path, self.final_path)
+        UPLOAD_SIZE.observe(self.size)
+        return StoredUpload(self.filename, self.final_path, self.size, self._hasher.hexdigest())
+
+    async def discard(self):
+        """关闭并删除尚未完成的文件"""
+        if self._file is not None:
+            await self._file.aclose()
+            self._file = None
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def _format_limit(size: int) -> str:
+    return f"{size / 1024 / 1024:g}MB"
+
+
+def _parse_boundary(request: Request, max_body: int) -> bytes:
+    """检查请求格式和 Content-Length，返回 multipart 边界"""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("请使用 multipart/form-data 上传文件")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_body + MULTIPART_OVERHEAD:
+        raise UploadError(f"请求大小超过限制（最大{_format_limit(max_body)}）", status_code=413)
+    return params[b"boundary"]
+
+
+async def save_upload_stream(request: Request, upload_dir: str, field_name: str = "file",
+                             max_size: int = UPLOAD_MAX_SIZE) -> StoredUpload:
+    """流式接收 multipart 请求中的文件并保存到上传目录
+
+    只接收第一个文件，出错时立即停止读取请求体。
+
+    Args:
+        request: 上传请求，请求体尚未被读取
+        upload_dir: 保存目录，文件名为随机UUID加原扩展名
+        field_name: 文件所在的表单字段名
+        max_size: 文件大小上限（字节）
+
+    Returns:
+        StoredUpload: 保存后的文件信息，含大小和SHA-256
+
+    Raises:
+        UploadError: 请求格式错误、文件类型不支持、文件过大或内容与扩展名不符
+    """
+    reader = _MultipartFileReader(_parse_boundary(request, max_size), field_name)
+    writer: Optional[_FileWriter] = None
+    try:
+        async for data in request.stream():
+            reader.parser.write(data)
+            for kind, value in reader.take_events():
+                if kind == "begin":
+                    writer = _FileWriter(value, upload_dir, max_size)
+                elif kind == "data":
+                    await writer.write(value)
+                else:
+                    return await writer.finish()
+                if writer.error:
+                    raise writer.error
+        raise UploadError("未找到上传的文件")
+    finally:
+        if writer is not None:
+            await writer.discard()
+
+
+async def save_upload_batch(request: Request, upload_dir: str, field_name: str = "files",
+                            max_size: int = UPLOAD_MAX_SIZE,
+                            max_files: int = BATCH_MAX_FILES) -> List[Tuple[str, Union[StoredUpload, UploadError]]]:
+    """流式接收 multipart 请求中的多个文件并保存到上传目录
+
+    单个文件不符合要求时只记录该文件的错误，继续接收后面的文件；
+    超过文件数量上限的文件不保存。
+
+    Args:
+        request: 上传请求，请求体尚未被读取
+        upload_dir: 保存目录
+        field_name: 文件所在的表单字段名（可重复）
+        max_size: 单个文件大小上限（字节）
+        max_files: 单次请求的文件数量上限
+
+    Returns:
+        List[Tuple[str, Union[StoredUpload, UploadError]]]: 按上传顺序排列的 (文件名, 保存结果或错误)
+
+    Raises:
+        UploadError: 请求格式错误、请求过大或请求中没有文件
+    """
+    reader = _MultipartFileReader(_parse_boundary(request, max_size * max_files), field_name)
+    results: List[Tuple[str, Union[StoredUpload, UploadError]]] = []
+    writer: Optional[_FileWriter] = None
+    try:
+        async for data in request.stream():
+            reader.parser.write(data)
+            for kind, value in reader.take_events():
+                if kind == "begin":
+                    writer = _FileWriter(value, upload_dir, max_size)
+                    if len(results) >= max_files:
+                        writer.error = UploadError(f"超过单次上传的文件数量上限（{max_files}个）")
+                elif kind == "data":
+                    await writer.write(value)
+                else:
+                    try:
+                        results.append((writer.filename, await writer.finish()))
+                    except UploadError as e:
+                        results.append((writer.filename, e))
+                    writer = None
+    except BaseException:
+        # 请求中断时删除本次已保存的文件
+        for _, result in results:
+            if isinstance(result, StoredUpload) and os.path.exists(result.path):
+                os.remove(result.path)
+        raise
+    finally:
+        if writer is not None:
+            await writer.discard()
+    if not results:
+        raise UploadError("未找到上传的文件")
+    return results
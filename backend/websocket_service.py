@@ -5,37 +5,252 @@ import time
 import asyncio
 from datetime import datetime
 import logging
+from collections import deque, OrderedDict
 from typing import Dict, List, Callable, Optional
 
+from analysis_schema import ANALYSIS_ITEMS
+from progress_backend import create_progress_backend
+from metrics import QUEUE_DEPTH, WEBSOCKET_CONNECTIONS
+
 # 配置日志记录器
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 每个连接的发送队列长度，以及单条消息的发送超时（秒）
+SEND_QUEUE_SIZE = 32
+SEND_TIMEOUT = 10
+
+
+class ClientChannel:
+    """单个WebSocket连接的有界发送队列和独立的写任务
+
+    生产者只把消息放入队列，不等待网络发送。队列满时丢弃最旧的消息；
+    同一 coalesce_key 的连续消息（如进度快照）只保留最新一条。发送失败或超时的
+    连接会通过 on_failure 回调被移除。
+    """
+
+    def __init__(self, websocket: WebSocket, on_failure: Callable[["ClientChannel"], None],
+                 max_queue: int = SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.queue: deque = deque()
+        self.dropped = 0
+        self.closed = False
+        self._on_failure = on_failure
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    def send(self, message: str, coalesce_key: Optional[str] = None):
+        """将已序列化的消息放入发送队列"""
+        if self.closed:
+            return
+        if coalesce_key is not None and self.queue and self.queue[-1][0] == coalesce_key:
+            # 合并：用最新的快照替换尚未发送的旧快照
+            self.queue[-1] = (coalesce_key, message)
+        else:
+            if len(self.queue) >= self.max_queue:
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append((coalesce_key, message))
+        self._ready.set()
+
+    def send_json(self, data: Dict, coalesce_key: Optional[str] = None):
+        self.send(json.dumps(data, ensure_ascii=False), coalesce_key)
+
+    async def _writer(self):
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                self._ready.clear()
+                while self.queue and not self.closed:
+                    _, message = self.queue.popleft()
+                    await asyncio.wait_for(self.websocket.send_text(message), timeout=SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"[WebSocket发送失败] 移除无法发送的连接: {type(e).__name__} - {str(e)}")
+            self.closed = True
+            self._on_failure(self)
+
+    def close(self):
+        """停止写任务"""
+        self.closed = True
+        self.queue.clear()
+        if not self._task.done():
+            self._task.cancel()
+
+
+# 进度存储上限、终态进度的保留时间（秒）以及过期清理的最小间隔（秒）
+PROGRESS_MAX_ENTRIES = 1000
+PROGRESS_TERMINAL_TTL = 600
+PROGRESS_SWEEP_INTERVAL = 30
+# 终态：分析已结束（或疑似重复而暂停等待确认），进度可以从数据库中的 Document/Analysis 记录推导
+TERMINAL_STATUSES = ("completed", "error", "duplicate")
+
+
+class ProgressStore:
+    """有界的进度存储
+
+    终态（completed/error）的进度在保留 PROGRESS_TERMINAL_TTL 秒后清除，
+    其余进度超出容量时按最近最少使用（LRU）淘汰。提供分析流程用到的字典接口。
+    """
+
+    def __init__(self, max_entries: int = PROGRESS_MAX_ENTRIES, terminal_ttl: float = PROGRESS_TERMINAL_TTL):
+        self.max_entries = max_entries
+        self.terminal_ttl = terminal_ttl
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        # 文档首次被观察到处于终态的时间
+        self._terminal_since: Dict[int, float] = {}
+        self._last_sweep = time.monotonic()
+
+    def __contains__(self, document_id) -> bool:
+        return document_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, document_id: int) -> Dict:
+        progress = self._entries[document_id]
+        self._entries.move_to_end(document_id)
+        return progress
+
+    def __setitem__(self, document_id: int, progress: Dict):
+        self._entries[document_id] = progress
+        self._entries.move_to_end(document_id)
+        self._evict()
+
+    def get(self, document_id: int, default=None):
+        if document_id not in self._entries:
+            return default
+        return self[document_id]
+
+    def pop(self, document_id: int, default=None):
+        self._terminal_since.pop(document_id, None)
+        return self._entries.pop(document_id, default)
+
+    def items(self):
+        return list(self._entries.items())
+
+    def _evict(self):
+        now = time.monotonic()
+        if now - self._last_sweep >= PROGRESS_SWEEP_INTERVAL:
+            self._last_sweep = now
+            for document_id, progress in list(self._entries.items()):
+                if progress.get("status") in TERMINAL_STATUSES:
+                    since = self._terminal_since.setdefault(document_id, now)
+                    if now - since >= self.terminal_ttl:
+                        self.pop(document_id)
+                else:
+                    self._terminal_since.pop(document_id, None)
+        while len(self._entries) > self.max_entries:
+            document_id, _ = self._entries.popitem(last=False)
+            self._terminal_since.pop(document_id, None)
+
+
+def derive_progress_from_db(document_id: int, analysis_items: List[str]) -> Optional[Dict]:
+    """根据 Document 和 Analysis 记录推导进度，文档不存在时返回None"""
+    from sqlalchemy.orm import undefer
+    from models import Document, Analysis, SessionLocal
+    from analysis_schema import find_invalid_fields
+
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if document is None:
+            return None
+        analysis = db.query(Analysis).options(undefer(Analysis.content)).filter(Analysis.document_id == document_id).first()
+        content = json.loads(analysis.content) if analysis and analysis.content else {}
+    finally:
+        db.close()
+
+    invalid_items = find_invalid_fields(content, analysis_items) if content else {item: "缺失" for item in analysis_items}
+    finished = document.status in ("analyzed", "error")
+    # 疑似重复的文档在调用AI之前暂停，等待用户确认
+    held = document.status == "duplicate"
+    progress = {
+        "document_id": document_id,
+        "current_item": None if finished or held else (analysis_items[0] if analysis_items else None),
+        "current_item_index": len(analysis_items) - 1 if finished else 0,
+        "total_items": len(analysis_items),
+        "completed_items": [item for item in analysis_items if item not in invalid_items] if finished else [],
+        "skipped_items": [item for item in analysis_items if item in invalid_items] if finished else [],
+        "overall_progress": 100 if finished else 0,
+        "status": {"analyzed": "completed", "error": "error", "duplicate": "duplicate"}.get(document.status, "processing")
+    }
+    return progress
+
+
+# 多路复用连接的增量推送间隔（秒）
+MULTIPLEX_TICK = 0.25
+
+
+def compute_progress_delta(previous: Optional[Dict], current: Dict) -> Optional[Dict]:
+    """计算两个进度快照之间的增量
+
+    Returns:
+        {"set": 变化的字段, "append": 在原列表末尾追加的元素}；没有变化时返回None
+    """
+    if previous is None:
+        return {"set": current}
+    changed = {}
+    appended = {}
+    for key, value in current.items():
+        old_value = previous.get(key)
+        if old_value == value:
+            continue
+        if isinstance(value, list) and isinstance(old_value, list) and value[:len(old_value)] == old_value:
+            appended[key] = value[len(old_value):]
+        else:
+            changed[key] = value
+    if not changed and not appended:
+        return None
+    delta = {}
+    if changed:
+        delta["set"] = changed
+    if appended:
+        delta["append"] = appended
+    return delta
+
+
+def _snapshot(progress: Dict) -> Dict:
+    return {key: list(value) if isinstance(value, list) else value for key, value in progress.items()}
+
+
+class MultiplexSubscriber:
+    """多路复用连接的订阅状态"""
+
+    def __init__(self, channel: ClientChannel):
+        self.channel = channel
+        self.document_ids: set = set()
+        self.subscribe_all = False
+        # 已发送给该客户端的最新快照，用于计算增量
+        self.last_sent: Dict[int, Dict] = {}
+        # 自上次推送以来有变化的文档
+        self.dirty: set = set()
+
+    def wants(self, document_id: int) -> bool:
+        return self.subscribe_all or document_id in self.document_ids
+
+
 # 分析进度管理类
 class AnalysisProgressManager:
     def __init__(self):
         # 存储所有活跃的WebSocket连接
         self.active_connections: Dict[int, List[WebSocket]] = {}
+        # 每个WebSocket连接对应的发送通道
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        # 多路复用连接的订阅者及定时推送任务
+        self.multiplex_subscribers: Dict[WebSocket, MultiplexSubscriber] = {}
+        self._multiplex_task: Optional[asyncio.Task] = None
+        # 跨进程共享进度的后端，以及接收其他进程进度的任务
+        self.backend = create_progress_backend()
+        self._listen_task: Optional[asyncio.Task] = None
         # 存储每个文档的分析进度
-        self.analysis_progress: Dict[int, Dict] = {}
+        self.analysis_progress = ProgressStore()
         # 存储正在进行的分析任务
         self.analysis_tasks: Dict[int, asyncio.Task] = {}
         # 分析项目列表
-        self.analysis_items = [
-            "文献标题",
-            "作者列表",
-            "发表期刊/会议",
-            "发表年份",
-            "摘要",
-            "关键词",
-            "催化反应类型",
-            "活性数据",
-            "催化剂制备方法",
-            "表征手段及结论",
-            "主要founded发现",
-            "结论",
-            "实验价值与启示"
-        ]
+        self.analysis_items = list(ANALYSIS_ITEMS)
         # 每个项目的超时时间（秒）
         self.item_timeout = 10
     
@@ -50,24 +265,25 @@ class AnalysisProgressManager:
             if document_id not in self.active_connections:
                 self.active_connections[document_id] = []
             self.active_connections[document_id].append(websocket)
+            channel = ClientChannel(websocket, lambda failed: self._evict(failed, document_id))
+            self._ensure_listening()
+            self.channels[websocket] = channel
             logger.info(f"[WebSocket连接] 文档ID:{document_id}的连接已添加到活跃连接列表，当前连接数:{len(self.active_connections[document_id])}")
             
             # 发送连接确认消息
-            try:
-                await websocket.send_json({"type": "connection_established", "document_id": document_id})
-                logger.info(f"[WebSocket连接] 已发送连接确认消息到文档ID:{document_id}")
-            except Exception as e:
-                logger.error(f"[WebSocket错误] 发送连接确认消息失败: {str(e)}")
+            channel.send_json({"type": "connection_established", "document_id": document_id})
+            logger.info(f"[WebSocket连接] 已发送连接确认消息到文档ID:{document_id}")
             
-            # 如果已有进度信息，立即发送给新连接的客户端
-            if document_id in self.analysis_progress:
+            # 如果已有进度信息（内存中或可从数据库推导），立即发送给新连接的客户端
+            existing_progress = await self.fetch_progress(document_id)
+            if existing_progress is not None:
                 logger.info(f"[WebSocket连接] 向文档ID:{document_id}的新连接发送现有进度信息")
-                await websocket.send_json(self.analysis_progress[document_id])
+                channel.send_json(existing_progress, coalesce_key="progress")
             else:
                 # 初始化进度信息并发送
                 logger.info(f"[WebSocket连接] 文档ID:{document_id}没有进度信息，初始化并发送")
                 progress = self.init_progress(document_id)
-                await websocket.send_json(progress)
+                channel.send_json(progress, coalesce_key="progress")
                 
                 # 注意：不再在这里自动启动分析任务，因为分析任务应该在文献上传时就已经启动
             
@@ -78,16 +294,14 @@ class AnalysisProgressManager:
                     data = await asyncio.wait_for(websocket.receive_json(), timeout=30)
                     if data.get('type') == 'heartbeat':
                         last_heartbeat = time.time()
-                        await websocket.send_json({'type': 'heartbeat_response', 'timestamp': datetime.now().isoformat()})
+                        channel.send_json({'type': 'heartbeat_response', 'timestamp': datetime.now().isoformat()})
                         logger.info(f"[WebSocket心跳] 文档ID:{document_id}收到心跳并已响应")
                     elif data.get('type') == 'restart_analysis':
                         # 处理重新启动分析的请求
                         logger.info(f"[WebSocket消息] 文档ID:{document_id}请求重新启动分析")
                         try:
-                            # 重置进度
-                            self.init_progress(document_id)
-                            # 发送初始进度
-                            await websocket.send_json(self.analysis_progress[document_id])
+                            # 重置进度并发送初始进度
+                            channel.send_json(self.init_progress(document_id), coalesce_key="progress")
                             
                             # 如果存在旧的分析任务，先取消它
                             if document_id in self.analysis_tasks:
@@ -101,7 +315,7 @@ class AnalysisProgressManager:
                             success = await self.start_analysis(document_id)
                             
                             # 返回确认消息
-                            await websocket.send_json({
+                            channel.send_json({
                                 'type': 'restart_response', 
                                 'success': success,
                                 'message': '分析任务已重新启动' if success else '启动分析任务失败'
@@ -109,7 +323,7 @@ class AnalysisProgressManager:
                         except Exception as e:
                             error_msg = f"重启分析任务失败: {str(e)}"
                             logger.error(f"[WebSocket错误] {error_msg}")
-                            await websocket.send_json({
+                            channel.send_json({
                                 'type': 'restart_response', 
                                 'success': False, 
                                 'message': error_msg
@@ -145,6 +359,10 @@ class AnalysisProgressManager:
 
             logger.info(f"尝试断开文档 {document_id} 的连接，当前活跃连接: {self.active_connections}")
             
+            channel = self.channels.pop(websocket, None)
+            if channel is not None:
+                channel.close()
+
             if document_id in self.active_connections:
                 if websocket in self.active_connections[document_id]:
                     self.active_connections[document_id].remove(websocket)
@@ -159,20 +377,195 @@ class AnalysisProgressManager:
             logger.error(f"断开连接时发生异常: {str(e)}", exc_info=True)
     
     async def broadcast_progress(self, document_id: int, progress_data: Dict):
-        """向所有连接到特定文档的客户端广播进度信息"""
-        logger.info(f"[广播开始] 文档ID:{document_id} 客户端数:{len(self.active_connections.get(document_id, []))}")
-        if document_id in self.active_connections:
-            # 更新进度信息
-            self.analysis_progress[document_id] = progress_data
-            
-            # 广播给所有连接的客户端
-            for idx, connection in enumerate(self.active_connections[document_id]):
-                try:
-                    logger.debug(f"[广播进度] 文档ID:{document_id} 正在发送给第{idx+1}个客户端")
-                    await connection.send_json(progress_data)
-                except Exception as e:
-                    logger.error(f"发送进度更新时出错: {str(e)}")
+        """向所有连接到特定文档的客户端广播进度信息
+
+        消息只序列化一次并放入各连接的发送队列，不等待网络发送，
+        慢连接不会阻塞调用方或其他客户端。
+        """
+        connections = self.active_connections.get(document_id, [])
+        logger.info(f"[广播开始] 文档ID:{document_id} 客户端数:{len(connections)}")
+        progress_data = self._deliver(document_id, progress_data)
+        # 发布给其他进程，连接在其他 worker 上的客户端同样能收到进度
+        if self.backend.shared:
+            try:
+                await self.backend.publish(document_id, progress_data)
+            except Exception as e:
+                logger.error(f"[广播] 文档ID:{document_id} 发布共享进度失败: {str(e)}")
         logger.info(f"[广播完成] 文档ID:{document_id} 状态:{progress_data.get('status')} 当前进度:{progress_data.get('overall_progress')}%")
+
+    def _deliver(self, document_id: int, progress_data: Dict) -> Dict:
+        """更新本进程的进度并推送给本进程持有的连接，返回合并后的完整进度
+
+        只含部分字段的更新（如 {"status": "error", "error_message": ...}）合并到已有进度中，
+        不会丢掉已完成项目等其他字段。
+        """
+        existing = self.analysis_progress.get(document_id)
+        if existing is None:
+            progress_data = {"document_id": document_id, **progress_data}
+        elif existing is not progress_data:
+            existing.update(progress_data)
+            progress_data = existing
+        self.analysis_progress[document_id] = progress_data
+        self._mark_dirty(document_id)
+        connections = self.active_connections.get(document_id, [])
+        if connections:
+            message = json.dumps(progress_data, ensure_ascii=False)
+            for connection in list(connections):
+                channel = self.channels.get(connection)
+                if channel is not None:
+                    channel.send(message, coalesce_key="progress")
+        return progress_data
+
+    def _ensure_listening(self):
+        """有本地连接时接收其他进程发布的进度"""
+        if self.backend.shared and self._listen_task is None:
+            self._listen_task = asyncio.create_task(self._listen_loop())
+
+    async def _listen_loop(self):
+        try:
+            await self.backend.listen(
+                self._deliver,
+                lambda: bool(self.active_connections or self.multiplex_subscribers)
+            )
+        except Exception as e:
+            logger.error(f"[共享进度] 接收其他进程的进度时出错: {str(e)}")
+        finally:
+            self._listen_task = None
+
+    def _mark_dirty(self, document_id: int):
+        """标记文档进度有变化，由定时任务批量推送给订阅者"""
+        for subscriber in self.multiplex_subscribers.values():
+            if subscriber.wants(document_id):
+                subscriber.dirty.add(document_id)
+
+    def _flush_subscriber(self, subscriber: MultiplexSubscriber):
+        """向订阅者推送自上次以来的增量，所有文档合并为一条消息"""
+        if not subscriber.dirty:
+            return
+        updates = {}
+        for document_id in subscriber.dirty:
+            progress = self.analysis_progress.get(document_id)
+            if progress is None:
+                continue
+            delta = compute_progress_delta(subscriber.last_sent.get(document_id), progress)
+            if delta is not None:
+                updates[str(document_id)] = delta
+                subscriber.last_sent[document_id] = _snapshot(progress)
+        subscriber.dirty.clear()
+        if updates:
+            subscriber.channel.send_json({"type": "progress_delta", "updates": updates})
+
+    async def _multiplex_loop(self):
+        """按固定间隔批量推送增量，直到没有订阅者"""
+        try:
+            while self.multiplex_subscribers:
+                await asyncio.sleep(MULTIPLEX_TICK)
+                for subscriber in list(self.multiplex_subscribers.values()):
+                    self._flush_subscriber(subscriber)
+        finally:
+            self._multiplex_task = None
+
+    def _load_many(self, document_ids: List[int], include_active: bool):
+        """在线程中读取其他进程中正在处理的文档，以及各文档保存的进度（不修改内存中的进度）"""
+        active_ids = self.backend.active_document_ids() if include_active else []
+        loaded = {document_id: self._load_progress(document_id)
+                  for document_id in dict.fromkeys(document_ids + active_ids)}
+        return active_ids, loaded
+
+    async def _subscribe(self, subscriber: MultiplexSubscriber, document_ids: List[int], subscribe_all: bool):
+        """添加订阅，并立即推送被订阅文档的完整快照"""
+        if subscribe_all:
+            subscriber.subscribe_all = True
+            # "全部活跃"：当前正在处理的文档，以及之后出现进度更新的任何文档
+            document_ids = [doc_id for doc_id, progress in self.analysis_progress.items()
+                            if progress.get("status") == "processing"]
+        # 内存中没有进度的文档（已结束并被清出内存，或在其他进程中处理）在线程中读取
+        missing = [doc_id for doc_id in document_ids if doc_id not in self.analysis_progress]
+        active_ids, loaded = await asyncio.to_thread(self._load_many, missing, subscribe_all)
+        # 其他进程中正在处理的文档
+        document_ids += [doc_id for doc_id in active_ids if doc_id not in document_ids]
+        subscriber.document_ids.update(document_ids)
+        documents = {}
+        for document_id in document_ids:
+            progress = self._resolve_progress(document_id, loaded.get(document_id, (None, None)))
+            if progress is not None:
+                documents[str(document_id)] = progress
+                subscriber.last_sent[document_id] = _snapshot(progress)
+                subscriber.dirty.discard(document_id)
+        subscriber.channel.send_json({"type": "progress_snapshot", "documents": documents})
+
+    async def connect_multiplexed(self, websocket: WebSocket):
+        """处理多路复用的进度连接：一个连接订阅多个文档，只推送增量
+
+        客户端消息：
+            {"type": "subscribe", "document_ids": [1, 2]} 或 {"type": "subscribe", "all": true}
+            {"type": "unsubscribe", "document_ids": [1]}
+            {"type": "heartbeat"}
+        """
+        channel = ClientChannel(websocket, lambda failed: self._evict_multiplexed(failed))
+        subscriber = MultiplexSubscriber(channel)
+        self.channels[websocket] = channel
+        self.multiplex_subscribers[websocket] = subscriber
+        if self._multiplex_task is None:
+            self._multiplex_task = asyncio.create_task(self._multiplex_loop())
+        self._ensure_listening()
+        logger.info(f"[WebSocket多路复用] 新连接，当前订阅连接数:{len(self.multiplex_subscribers)}")
+        channel.send_json({"type": "connection_established"})
+        try:
+            last_heartbeat = time.time()
+            while True:
+                try:
+                    data = await asyncio.wait_for(websocket.receive_json(), timeout=30)
+                except asyncio.TimeoutError:
+                    if time.time() - last_heartbeat > 180:
+                        logger.warning("[WebSocket多路复用] 心跳超时(>180s)，准备断开连接")
+                        break
+                    continue
+                message_type = data.get('type')
+                if message_type == 'heartbeat':
+                    last_heartbeat = time.time()
+                    channel.send_json({'type': 'heartbeat_response', 'timestamp': datetime.now().isoformat()})
+                elif message_type == 'subscribe':
+                    document_ids = [int(doc_id) for doc_id in data.get('document_ids', [])]
+                    await self._subscribe(subscriber, document_ids, bool(data.get('all')))
+                elif message_type == 'unsubscribe':
+                    for doc_id in data.get('document_ids', []):
+                        subscriber.document_ids.discard(int(doc_id))
+                        subscriber.last_sent.pop(int(doc_id), None)
+                        subscriber.dirty.discard(int(doc_id))
+                    if data.get('all'):
+                        subscriber.subscribe_all = False
+                else:
+                    logger.info(f"[WebSocket多路复用] 收到未知类型消息: {data}")
+        except WebSocketDisconnect:
+            logger.info("[WebSocket多路复用] 连接已断开")
+        except Exception as e:
+            logger.error(f"[WebSocket多路复用] 处理消息时出错: {str(e)}")
+        finally:
+            self.disconnect_multiplexed(websocket)
+
+    def disconnect_multiplexed(self, websocket: WebSocket):
+        """移除多路复用连接"""
+        self.multiplex_subscribers.pop(websocket, None)
+        channel = self.channels.pop(websocket, None)
+        if channel is not None:
+            channel.close()
+
+    def _evict_multiplexed(self, channel: ClientChannel):
+        self.disconnect_multiplexed(channel.websocket)
+        asyncio.create_task(self._close_quietly(channel.websocket))
+
+    def _evict(self, channel: ClientChannel, document_id: int):
+        """移除发送失败的连接并尝试关闭它"""
+        self.disconnect(channel.websocket, document_id)
+        asyncio.create_task(self._close_quietly(channel.websocket))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await websocket.close(code=1011)
+        except Exception:
+            pass
     
     def init_progress(self, document_id: int):
         """初始化文档的分析进度"""
@@ -188,6 +581,7 @@ class AnalysisProgressManager:
             "status": "processing"
         }
         logger.info(f"[进度初始化完成] 文档ID:{document_id} 总项目数:{len(self.analysis_items)}")
+        self._mark_dirty(document_id)
         return self.analysis_progress[document_id]
     
     def update_progress(self, document_id: int, item_name: str, status: str = "completed"):
@@ -228,13 +622,12 @@ class AnalysisProgressManager:
         print(f"[分析启动] 开始启动文档ID:{document_id}的分析任务")
         
         # 避免循环导入
-        from models import Document, SessionLocal
+        from models import Document, AsyncSessionLocal
         
-        # 获取文档信息
-        db = SessionLocal()
-        print(f"[分析启动] 成功创建数据库会话")
         try:
-            document = db.query(Document).filter(Document.id == document_id).first()
+            # 获取文档信息
+            async with AsyncSessionLocal() as db:
+                document = await db.get(Document, document_id)
             if document:
                 # 取消已有的任务（如果存在）
                 if document_id in self.analysis_tasks and not self.analysis_tasks[document_id].done():
@@ -248,6 +641,9 @@ class AnalysisProgressManager:
                     
                     # 创建任务完成回调
                     def task_done_callback(task):
+                        # 已结束的任务不再保留
+                        if self.analysis_tasks.get(document_id) is task:
+                            del self.analysis_tasks[document_id]
                         try:
                             exception = task.exception()
                             if exception:
@@ -264,7 +660,7 @@ class AnalysisProgressManager:
                             print(f"[分析任务] 处理任务回调时出错: {str(e)}")
                     
                     # 创建并启动新任务
-                    task = asyncio.create_task(analyze_document_with_ai(document.path, document_id, db))
+                    task = asyncio.create_task(analyze_document_with_ai(document.path, document_id))
                     task.add_done_callback(task_done_callback)
                     self.analysis_tasks[document_id] = task
                     print(f"[分析启动] 已启动文档ID:{document_id}的分析任务")
@@ -278,15 +674,67 @@ class AnalysisProgressManager:
         except Exception as e:
             print(f"[分析启动] 启动分析任务时出错: {str(e)}")
             return False
-        finally:
-            if db:
-                db.close()
     
-    def get_progress(self, document_id: int):
-        """获取文档的当前分析进度"""
-        if document_id not in self.analysis_progress:
+    def get_progress(self, document_id: int) -> Optional[Dict]:
+        """获取本进程内存中文档的分析进度，没有时返回None
+
+        不做任何I/O，只能在事件循环线程中调用（分析流程使用）。需要补全内存中没有的进度时
+        使用 fetch_progress。
+        """
+        return self.analysis_progress.get(document_id)
+
+    def ensure_progress(self, document_id: int) -> Dict:
+        """获取本进程内存中文档的分析进度，没有时（如已被淘汰）重新初始化（分析流程使用）"""
+        progress = self.get_progress(document_id)
+        if progress is None:
+            progress = self.init_progress(document_id)
+        return progress
+
+    async def fetch_progress(self, document_id: int) -> Optional[Dict]:
+        """获取文档的当前分析进度
+
+        优先使用本进程内存中的进度（本进程的分析流程和收到的其他进程的进度都会写入其中）；
+        没有时在线程中读取共享进度后端，再没有时从数据库推导：已结束的文档直接返回推导结果
+        而不缓存，仍在处理中的文档重新初始化进度；文档不存在时返回None，不会创建记录。
+        """
+        progress = self.analysis_progress.get(document_id)
+        if progress is not None:
+            return progress
+        loaded = await asyncio.to_thread(self._load_progress, document_id)
+        return self._resolve_progress(document_id, loaded)
+
+    def _load_progress(self, document_id: int):
+        """读取共享进度后端或数据库中的进度，返回 (共享进度, 数据库推导的进度)
+
+        会阻塞，在线程中调用；不修改内存中的进度。
+        """
+        # 分析可能在其他进程中进行
+        if self.backend.shared:
+            shared_progress = self.backend.get(document_id)
+            if shared_progress is not None:
+                return shared_progress, None
+        return None, derive_progress_from_db(document_id, self.analysis_items)
+
+    def _resolve_progress(self, document_id: int, loaded) -> Optional[Dict]:
+        """在事件循环线程中根据 _load_progress 的结果确定进度"""
+        # 读取期间本进程可能已经有了进度
+        progress = self.analysis_progress.get(document_id)
+        if progress is not None:
+            return progress
+        shared_progress, derived = loaded
+        if shared_progress is not None:
+            return shared_progress
+        if derived is None:
+            return None
+        if derived["status"] == "processing":
             return self.init_progress(document_id)
-        return self.analysis_progress[document_id]
+        return derived
 
 # 创建全局实例
-progress_manager = AnalysisProgressManager()
\ No newline at end of file
+progress_manager = AnalysisProgressManager()
+
+# 输出 /metrics 时读取连接数和各连接发送队列中的消息数
+WEBSOCKET_CONNECTIONS.set_function(lambda: len(progress_manager.channels))
+QUEUE_DEPTH.labels("websocket_send").set_function(
+    lambda: sum(len(channel.queue) for channel in list(progress_manager.channels.values()))
+)
\ No newline at end of file
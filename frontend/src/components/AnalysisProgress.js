@@ -142,6 +142,8 @@ const AnalysisProgress = ({ documentId, visible, onClose, onRetry }) => {
         return 'success';
       case 'error':
         return 'exception';
+      case 'duplicate':
+        return 'normal';
       default:
         return 'active';
     }
@@ -154,6 +156,8 @@ const AnalysisProgress = ({ documentId, visible, onClose, onRetry }) => {
         return <Tag icon={<CheckCircleOutlined />} color="success">分析完成</Tag>;
       case 'error':
         return <Tag icon={<CloseCircleOutlined />} color="error">分析出错</Tag>;
+      case 'duplicate':
+        return <Tag color="gold">疑似重复，等待确认</Tag>;
       default:
         return <Tag icon={<LoadingOutlined />} color="processing">分析中</Tag>;
     }
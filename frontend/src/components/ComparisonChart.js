@@ -0,0 +1,147 @@
+import React, { useState, useEffect, useRef } from 'react';
+import { Card, Select, Space, Spin, Empty, Table, Tag, message } from 'antd';
+import Plot from 'react-plotly.js';
+import { compareDocuments } from '../services/api';
+
+const { Option } = Select;
+
+const AXIS_OPTIONS = [
+  { value: 'activity_value', label: '活性数值' },
+  { value: 'temperature_c', label: '测试温度 (°C)' },
+  { value: 'pressure_mpa', label: '测试压力 (MPa)' },
+  { value: 'year', label: '发表年份' }
+];
+
+const GROUP_OPTIONS = [
+  { value: 'catalyst', label: '按催化剂' },
+  { value: 'category', label: '按催化反应类型' },
+  { value: 'document', label: '按文献' }
+];
+
+const axisTitle = (axis) => (axis.unit ? `${axis.label} (${axis.unit})` : axis.label);
+
+/**
+ * 多文献对比组件
+ * 分组统计和降采样在服务端完成，选择数百篇文献时浏览器也只接收少量数据
+ */
+const ComparisonChart = ({ documentIds }) => {
+  const [xAxis, setXAxis] = useState('temperature_c');
+  const [yAxis, setYAxis] = useState('activity_value');
+  const [groupBy, setGroupBy] = useState('catalyst');
+  const [activityUnit, setActivityUnit] = useState(null);
+  const [result, setResult] = useState(null);
+  const [loading, setLoading] = useState(false);
+  const containerRef = useRef(null);
+
+  useEffect(() => {
+    if (!documentIds.length) {
+      setResult(null);
+      return;
+    }
+    let cancelled = false;
+    setLoading(true);
+    compareDocuments({
+      document_ids: documentIds,
+      x_axis: xAxis,
+      y_axis: yAxis,
+      group_by: groupBy,
+      activity_unit: activityUnit,
+      // 按图表的像素宽度返回点数
+      width: containerRef.current ? Math.round(containerRef.current.clientWidth) : 800
+    })
+      .then(data => { if (!cancelled) setResult(data); })
+      .catch(() => { if (!cancelled) message.error('无法获取对比数据'); })
+      .finally(() => { if (!cancelled) setLoading(false); });
+    return () => { cancelled = true; };
+  }, [documentIds, xAxis, yAxis, groupBy, activityUnit]);
+
+  const usesActivity = xAxis === 'activity_value' || yAxis === 'activity_value';
+  const traces = (result?.groups || []).map(group => ({
+    x: group.x,
+    y: group.y,
+    type: 'scattergl',
+    mode: 'markers',
+    name: `${group.name} (${group.count})`,
+    marker: { size: 7 }
+  }));
+
+  const statColumns = [
+    { title: '分组', dataIndex: 'name', key: 'name' },
+    { title: '数据条数', dataIndex: 'count', key: 'count', sorter: (a, b) => a.count - b.count },
+    { title: '最小值', dataIndex: 'min', key: 'min', sorter: (a, b) => a.min - b.min },
+    { title: '中位数', dataIndex: 'median', key: 'median', sorter: (a, b) => a.median - b.median },
+    { title: '平均值', dataIndex: 'mean', key: 'mean', sorter: (a, b) => a.mean - b.mean },
+    { title: '最大值', dataIndex: 'max', key: 'max', sorter: (a, b) => a.max - b.max }
+  ];
+
+  return (
+    <Card title="多文献对比" style={{ marginBottom: 16 }}>
+      <Space wrap style={{ marginBottom: 16 }}>
+        <span>横轴:</span>
+        <Select value={xAxis} onChange={setXAxis} style={{ width: 160 }}>
+          {AXIS_OPTIONS.map(option => <Option key={option.value} value={option.value}>{option.label}</Option>)}
+        </Select>
+        <span>纵轴:</span>
+        <Select value={yAxis} onChange={setYAxis} style={{ width: 160 }}>
+          {AXIS_OPTIONS.map(option => <Option key={option.value} value={option.value}>{option.label}</Option>)}
+        </Select>
+        <Select value={groupBy} onChange={setGroupBy} style={{ width: 160 }}>
+          {GROUP_OPTIONS.map(option => <Option key={option.value} value={option.value}>{option.label}</Option>)}
+        </Select>
+        {usesActivity && (
+          <>
+            <span>活性单位:</span>
+            <Select
+              value={result?.activity_unit || undefined}
+              onChange={setActivityUnit}
+              placeholder="数据最多的单位"
+              style={{ width: 200 }}
+            >
+              {(result?.activity_units || []).map(item => (
+                <Option key={item.unit} value={item.unit}>{item.unit}（{item.count}条）</Option>
+              ))}
+            </Select>
+          </>
+        )}
+      </Space>
+      <div ref={containerRef}>
+        <Spin spinning={loading}>
+          {result && result.total_points > 0 ? (
+            <>
+              <div style={{ marginBottom: 8 }}>
+                <Tag color="green">共 {result.total_points} 条数据</Tag>
+                <Tag color="blue">{result.groups.length} 个分组</Tag>
+                {result.omitted_groups > 0 && <Tag>另有 {result.omitted_groups} 个较小的分组未显示</Tag>}
+              </div>
+              <Plot
+                data={traces}
+                layout={{
+                  autosize: true,
+                  height: 480,
+                  xaxis: { title: axisTitle(result.x_axis) },
+                  yaxis: { title: axisTitle(result.y_axis) },
+                  legend: { orientation: 'h', y: -0.2 },
+                  margin: { t: 20 }
+                }}
+                useResizeHandler
+                style={{ width: '100%' }}
+                config={{ displaylogo: false, responsive: true }}
+              />
+              <Table
+                columns={statColumns}
+                dataSource={result.groups}
+                rowKey="name"
+                size="small"
+                pagination={{ pageSize: 10 }}
+              />
+            </>
+          ) : (
+            <Empty description={loading ? '正在计算...' : '所选文献没有可对比的标准化活性数据'} />
+          )}
+        </Spin>
+      </div>
+    </Card>
+  );
+};
+
+export default ComparisonChart;
@@ -19,6 +19,7 @@ const FilePreview = ({ file, onClose }) => {
   const [pageNumber, setPageNumber] = useState(1);
   const [scale, setScale] = useState(1.5);
   const [scrollMode, setScrollMode] = useState(true); // 默认开启滚动模式
+  const [thumbnailUrl, setThumbnailUrl] = useState(null); // PDF加载完成前显示的首页缩略图
   
   // 引用
   const containerRef = useRef(null);
@@ -34,9 +35,10 @@ const FilePreview = ({ file, onClose }) => {
     }
     
     return () => {
-      // 清理资源
-      if (content && content.url) {
-        URL.revokeObjectURL(content.url);
+      // 清理资源，停止尚未完成的范围请求
+      if (pdfDocRef.current) {
+        pdfDocRef.current.destroy();
+        pdfDocRef.current = null;
       }
     };
   }, [file]);
@@ -88,8 +90,7 @@ const FilePreview = ({ file, onClose }) => {
     setContent(null);
     setNumPages(null);
     setPageNumber(1);
-    
-    let fileUrl;
+    setThumbnailUrl(null);
     
     try {
       // 使用API服务获取文件
@@ -115,25 +116,28 @@ const FilePreview = ({ file, onClose }) => {
         throw new Error('无效的文档ID数值');
       }
       
-      // 从API获取文件预览内容
-      const fileBlob = await uploadApi.getFilePreview(documentId);
-      fileUrl = URL.createObjectURL(fileBlob);
-      
       // 根据文件类型处理预览内容
       if (file.fileType === 'PDF') {
-        // 使用PDF.js加载PDF文件
-        const loadingTask = pdfjsLib.getDocument(fileUrl);
+        // PDF.js加载期间先显示服务端缓存的首页缩略图
+        setThumbnailUrl(uploadApi.getPageThumbnailUrl(documentId, 1));
+        // 使用PDF.js按范围加载PDF文件，只下载渲染当前页所需的数据
+        const loadingTask = pdfjsLib.getDocument({
+          url: uploadApi.getFileUrl(documentId),
+          rangeChunkSize: 65536,
+          disableAutoFetch: true
+        });
         const pdf = await loadingTask.promise;
         setNumPages(pdf.numPages);
         pdfDocRef.current = pdf;
         
         // 设置预览内容
-        setContent({ type: 'pdf', pdf, url: fileUrl });
+        setContent({ type: 'pdf', pdf });
         
         // 渲染第一页
         await renderPage(pdf, 1);
       } else if (file.fileType === 'Word') {
         // Word文件需要转换为HTML
+        const fileBlob = await uploadApi.getFilePreview(documentId);
         const arrayBuffer = await fileBlob.arrayBuffer();
         const result = await mammoth.convertToHtml({ arrayBuffer });
         setContent({ type: 'word', html: result.value });
@@ -143,9 +147,6 @@ const FilePreview = ({ file, onClose }) => {
     } catch (error) {
       console.error('获取文件预览失败:', error);
       message.error(error.message || '获取文件预览失败，请稍后重试');
-      if (fileUrl) {
-        URL.revokeObjectURL(fileUrl);
-      }
     } finally {
       setLoading(false);
     }
@@ -209,7 +210,16 @@ const FilePreview = ({ file, onClose }) => {
       {loading ? (
         <div style={{ display: 'flex', justifyContent: 'center', alignItems: 'center', height: 400 }}>
           <Spin>
-            <div style={{ padding: '50px', textAlign: 'center' }}>加载预览中...</div>
+            {thumbnailUrl ? (
+              <img
+                src={thumbnailUrl}
+                alt="首页预览"
+                style={{ maxHeight: 400, border: '1px solid #d9d9d9' }}
+                onError={() => setThumbnailUrl(null)}
+              />
+            ) : (
+              <div style={{ padding: '50px', textAlign: 'center' }}>加载预览中...</div>
+            )}
           </Spin>
         </div>
       ) : content ? (
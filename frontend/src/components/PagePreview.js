@@ -0,0 +1,101 @@
+import React, { useState, useEffect } from 'react';
+import { Spin, Empty, Button, InputNumber, Typography, Row, Col } from 'antd';
+import { LeftOutlined, RightOutlined } from '@ant-design/icons';
+import { uploadApi } from '../services/api';
+
+const { Paragraph } = Typography;
+
+/**
+ * 原文分页预览组件
+ * 按页请求服务端缓存的文本和缩略图，不需要下载整个PDF
+ */
+const PagePreview = ({ documentId }) => {
+  const [pageCount, setPageCount] = useState(null);
+  const [pageNumber, setPageNumber] = useState(1);
+  const [pageText, setPageText] = useState('');
+  const [loading, setLoading] = useState(false);
+  const [thumbnailFailed, setThumbnailFailed] = useState(false);
+
+  /**
+   * 文档变化时获取页数
+   */
+  useEffect(() => {
+    setPageCount(null);
+    setPageNumber(1);
+    if (!documentId) return;
+    uploadApi.getPageCount(documentId)
+      .then(data => setPageCount(data.page_count))
+      .catch(() => setPageCount(0));
+  }, [documentId]);
+
+  /**
+   * 页码变化时获取该页文本
+   */
+  useEffect(() => {
+    if (!documentId || !pageCount) return;
+    let cancelled = false;
+    setLoading(true);
+    setThumbnailFailed(false);
+    uploadApi.getPageText(documentId, pageNumber)
+      .then(data => { if (!cancelled) setPageText(data.text); })
+      .catch(() => { if (!cancelled) setPageText(''); })
+      .finally(() => { if (!cancelled) setLoading(false); });
+    return () => { cancelled = true; };
+  }, [documentId, pageNumber, pageCount]);
+
+  if (pageCount === null) {
+    return <Spin />;
+  }
+  if (!pageCount) {
+    return <Empty description="该文档不支持分页预览" />;
+  }
+
+  return (
+    <div>
+      <div style={{ textAlign: 'center', marginBottom: 12 }}>
+        <Button
+          disabled={pageNumber <= 1}
+          onClick={() => setPageNumber(pageNumber - 1)}
+          icon={<LeftOutlined />}
+          style={{ marginRight: 10 }}
+        />
+        第 <InputNumber
+          min={1}
+          max={pageCount}
+          value={pageNumber}
+          onChange={(value) => value && setPageNumber(value)}
+          size="small"
+          style={{ width: 64 }}
+        /> 页，共 {pageCount} 页
+        <Button
+          disabled={pageNumber >= pageCount}
+          onClick={() => setPageNumber(pageNumber + 1)}
+          icon={<RightOutlined />}
+          style={{ marginLeft: 10 }}
+        />
+      </div>
+      <Row gutter={16}>
+        {!thumbnailFailed && (
+          <Col flex="none">
+            <img
+              src={uploadApi.getPageThumbnailUrl(documentId, pageNumber)}
+              alt={`第 ${pageNumber} 页`}
+              width={300}
+              style={{ border: '1px solid #d9d9d9' }}
+              onError={() => setThumbnailFailed(true)}
+            />
+          </Col>
+        )}
+        <Col flex="auto">
+          <Spin spinning={loading}>
+            <Paragraph style={{ whiteSpace: 'pre-wrap', maxHeight: 480, overflowY: 'auto' }}>
+              {pageText || '该页没有可提取的文本'}
+            </Paragraph>
+          </Spin>
+        </Col>
+      </Row>
+    </div>
+  );
+};
+
+export default PagePreview;
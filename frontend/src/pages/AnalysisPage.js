@@ -3,11 +3,12 @@ import { Typography, Card, Table, Tag, Space, Button, Tabs, Input, Select, Colla
 import { FileTextOutlined, FileWordOutlined, DownloadOutlined, SearchOutlined, LineChartOutlined, RobotOutlined, ThunderboltOutlined } from '@ant-design/icons';
 import AnalysisProgress from '../components/AnalysisProgress';
 import AIChat from '../components/AIChat';
+import PagePreview from '../components/PagePreview';
 
 
 import { handleApiError } from '../utils/errorHandler';
 import websocketService from '../services/websocketService';
-import { uploadApi, getAnalysisResult, getAnalysisProgress, getDocuments, deleteDocument } from '../services/api';
+import { uploadApi, getAnalysisResult, getAnalysisProgress, getDocuments, deleteDocument, getExportUrl, getDocumentDuplicates, reuseAnalysis, getDuplicatesReport } from '../services/api';
 
 const { Title, Paragraph, Text } = Typography;
 const { TabPane } = Tabs;
@@ -164,10 +165,11 @@ const AnalysisPage = () => {
   };
 
   /**
-   * 导出分析报告
+   * 导出当前分类下的分析结果或活性数据（CSV）
    */
-  const handleExportReport = () => {
-    message.success('分析报告已导出');
+  const handleExportReport = (dataset) => {
+    const categories = selectedCategory !== 'all' ? [selectedCategory] : [];
+    window.open(getExportUrl(dataset, 'csv', { categories }), '_blank');
   };
 
   /**
@@ -204,6 +206,86 @@ const AnalysisPage = () => {
     });
   };
 
+  /**
+   * 疑似重复的文献：显示相似的已分析文献，选择复用其分析结果或照常分析
+   */
+  const handleDuplicateDocument = async (record) => {
+    try {
+      const { duplicates } = await getDocumentDuplicates(record.id);
+      Modal.confirm({
+        title: '疑似重复的文献',
+        width: 560,
+        content: (
+          <div>
+            <Paragraph>{record.name} 与以下已分析的文献内容高度相似（可能是同一论文的不同版本）：</Paragraph>
+            <List
+              size="small"
+              dataSource={duplicates}
+              renderItem={item => (
+                <List.Item>
+                  <Text>{item.name}</Text>
+                  <Tag color="gold">相似度 {Math.round(item.similarity * 100)}%</Tag>
+                </List.Item>
+              )}
+            />
+          </div>
+        ),
+        okText: '复用已有分析',
+        cancelText: '仍然分析',
+        okButtonProps: { disabled: !duplicates.length },
+        onOk: async () => {
+          try {
+            await reuseAnalysis(record.id);
+            message.success('已复用分析结果');
+            fetchDocuments();
+          } catch (error) {
+            handleApiError(error, '复用分析结果失败');
+          }
+        },
+        // 禁用Esc关闭，取消按钮（仍然分析）是唯一会触发 onCancel 的操作
+        keyboard: false,
+        onCancel: () => handleRestartAnalysis(record.id)
+      });
+    } catch (error) {
+      handleApiError(error, '获取疑似重复文献失败');
+    }
+  };
+
+  /**
+   * 整个文献库的疑似重复报告
+   */
+  const handleShowDuplicatesReport = async () => {
+    try {
+      const report = await getDuplicatesReport();
+      Modal.info({
+        title: '疑似重复文献报告',
+        width: 720,
+        content: (
+          <div>
+            <Paragraph>
+              共检查 {report.documents_checked} 篇文献，发现 {report.groups.length} 组疑似重复
+              {report.documents_without_signature > 0 && `（${report.documents_without_signature} 篇尚未计算签名）`}
+            </Paragraph>
+            <List
+              size="small"
+              dataSource={report.groups}
+              renderItem={(group, index) => (
+                <List.Item>
+                  <div>
+                    <Text strong>第 {index + 1} 组（最高相似度 {Math.round(group.pairs[0].similarity * 100)}%）</Text>
+                    {group.documents.map(doc => <div key={doc.id}>{doc.name}</div>)}
+                  </div>
+                </List.Item>
+              )}
+            />
+          </div>
+        )
+      });
+    } catch (error) {
+      handleApiError(error, '获取疑似重复报告失败');
+    }
+  };
+
   /**
    * 重试分析
    */
@@ -314,9 +396,13 @@ const AnalysisPage = () => {
       align: 'center',
       render: (status, record) => (
         <Space>
-          <Tag color={status === 'analyzed' ? 'green' : status === 'processing' ? 'blue' : 'orange'}>
-            {status === 'analyzed' ? '已分析' : status === 'processing' ? '处理中' : '未处理'}
-          </Tag>
+          {status === 'duplicate' ? (
+            <Tag color="gold">疑似重复</Tag>
+          ) : (
+            <Tag color={status === 'analyzed' ? 'green' : status === 'processing' ? 'blue' : 'orange'}>
+              {status === 'analyzed' ? '已分析' : status === 'processing' ? '处理中' : '未处理'}
+            </Tag>
+          )}
         </Space>
       ),
     },
@@ -334,6 +420,8 @@ const AnalysisPage = () => {
               e.stopPropagation();
               if (record.status === 'analyzed') {
                 handleDocumentSelect(record);
+              } else if (record.status === 'duplicate') {
+                handleDuplicateDocument(record);
               } else {
                 setProgressDocumentId(record.id);
                 setProgressVisible(true);
@@ -607,6 +695,11 @@ const AnalysisPage = () => {
           key: '9',
           label: '实验价值与启示',
           children: experimentalValueInsightsContent
+        },
+        selectedDocument.type === 'PDF' && { // 原文分页预览面板，展开时才请求
+          key: '10',
+          label: '原文页面',
+          children: <PagePreview documentId={selectedDocument.id} />
         }
       ].filter(Boolean)} />
     );
@@ -680,6 +773,9 @@ const AnalysisPage = () => {
                   <Option value="其他反应">其他反应</Option>
                 </Select>
                 <Button type="primary" icon={<SearchOutlined />}>筛选</Button>
+                <Button icon={<DownloadOutlined />} onClick={() => handleExportReport('analyses')}>导出分析结果</Button>
+                <Button icon={<DownloadOutlined />} onClick={() => handleExportReport('activity')}>导出活性数据</Button>
+                <Button onClick={handleShowDuplicatesReport}>查找重复文献</Button>
               </Space>
             </div>
             <Table 
@@ -6,10 +6,14 @@ import { useSpring, animated } from 'react-spring';
 import Plot from 'react-plotly.js';
 import { getDocuments, getAnalysisResult } from '../services/api';
 import AIChat from '../components/AIChat';
+import ComparisonChart from '../components/ComparisonChart';
 
 const { Title, Paragraph } = Typography;
 const { Option } = Select;
 
+// 超过该数量的文献只使用服务端对比，不在浏览器中加载和合并全部活性数据
+const CLIENT_SIDE_DOCUMENT_LIMIT = 50;
+
 /**
  * 数据可视化页面组件
  * 负责展示文献分析数据的图表可视化
@@ -128,7 +132,7 @@ const DataVisualizationPage = () => {
     const handleDocumentChange = async (docIds) => {
         setSelectedDocumentIds(docIds);
         
-        if (docIds.length === 0) {
+        if (docIds.length === 0 || docIds.length > CLIENT_SIDE_DOCUMENT_LIMIT) {
             setAnalysisDataMap(new Map());
             setCombinedTableData([]);
             setCombinedChartData([]);
@@ -146,6 +150,8 @@ const DataVisualizationPage = () => {
                     const response = await getAnalysisResult(docId);
                     const rawAiResponse = response.raw_ai_response;
                     const parsedAiResponse = JSON.parse(rawAiResponse);
+                    // 服务端已解析并换算为标准单位的活性数据
+                    parsedAiResponse.normalized_activity = response.normalized_activity || [];
                     return { docId, data: parsedAiResponse };
                 } catch (error) {
                     console.error(`Error processing document ${docId}:`, error);
@@ -212,8 +218,33 @@ const DataVisualizationPage = () => {
         setCombinedChartData(allTableData);
     };
     
+    // 标准化数值列，不同文献的数据可以在同一坐标轴上比较
+    const NORMALIZED_COLUMNS = {
+        '活性数值(标准单位)': 'activity_value',
+        '标准单位': 'activity_unit',
+        '测试温度(°C)': 'temperature_c',
+        '测试压力(MPa)': 'pressure_mpa'
+    };
+
     // 从单个文档AI响应中提取表格数据
     const extractSingleDocumentData = (data, docName = '') => {
+        // 数组格式的活性数据直接使用，并附加服务端的标准化数值
+        if (data && !data.催化活性数据 && Array.isArray(data.活性数据) && data.活性数据.length > 0) {
+            const normalizedByRow = new Map((data.normalized_activity || []).map(item => [item.row_index, item]));
+            const headers = Object.keys(data.活性数据[0]);
+            return data.活性数据.map((row, rowIndex) => {
+                const rowData = {};
+                headers.forEach(header => {
+                    rowData[header] = row[header] ?? '';
+                });
+                const normalized = normalizedByRow.get(rowIndex) || {};
+                Object.entries(NORMALIZED_COLUMNS).forEach(([label, key]) => {
+                    rowData[label] = normalized[key] ?? '';
+                });
+                return rowData;
+            }).filter(row => Object.values(row).some(val => val !== ''));
+        }
+
         // 尝试从不同的字段中获取活性数据
         let activityData = null;
         
@@ -693,6 +724,16 @@ const DataVisualizationPage = () => {
                 </Card>
             )}
 
+            {selectedDocumentIds.length > 0 && (
+                <ComparisonChart documentIds={selectedDocumentIds} />
+            )}
+
+            {selectedDocumentIds.length > CLIENT_SIDE_DOCUMENT_LIMIT && (
+                <Card style={{ marginBottom: 16 }}>
+                    <Tag color="orange">已选择 {selectedDocumentIds.length} 份文献，超过 {CLIENT_SIDE_DOCUMENT_LIMIT} 份时只显示服务端汇总的对比结果</Tag>
+                </Card>
+            )}
+
             {combinedTableData.length > 0 && (
                 <Card title="合并数据表格" style={{ marginBottom: 16 }}>
                     <div style={{ marginBottom: 16 }}>
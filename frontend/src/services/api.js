@@ -52,6 +52,34 @@ const uploadApi = {
     });
   },
   
+  /**
+   * 批量上传文件，所有文件在一次请求中上传并作为一个批次分析
+   * @param {File[]} files - 文件列表
+   * @param {Function} onUploadProgress - 上传进度回调
+   * @returns {Promise} 包含batch_id和每个文件的id或错误信息
+   */
+  uploadBatch: (files, onUploadProgress) => {
+    const formData = new FormData();
+    files.forEach(file => formData.append('files', file));
+
+    return api.post('/api/upload/batch', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data'
+      },
+      timeout: 0,
+      onUploadProgress
+    });
+  },
+
+  /**
+   * 获取批次的汇总分析进度
+   * @param {string} batchId - 批次ID
+   * @returns {Promise}
+   */
+  getBatchProgress: (batchId) => {
+    return api.get(`/api/upload/batch/${batchId}`);
+  },
+
   /**
    * 获取文件预览
    * @param {string} fileId - 文件ID
@@ -62,6 +90,45 @@ const uploadApi = {
       responseType: 'blob'
     });
   },
+
+  /**
+   * 获取文件的直接访问地址（支持Range请求，PDF.js可按需加载页面）
+   * @param {string} document_id - 文档ID
+   * @returns {string}
+   */
+  getFileUrl: (document_id) => {
+    return `${API_URL}/api/download/${document_id}?inline=true`;
+  },
+
+  /**
+   * 获取PDF文档的页数
+   * @param {number} documentId - 文档ID
+   * @returns {Promise}
+   */
+  getPageCount: (documentId) => {
+    return api.get(`/api/documents/${documentId}/pages`);
+  },
+
+  /**
+   * 获取PDF文档指定页的文本（服务端缓存，带ETag）
+   * @param {number} documentId - 文档ID
+   * @param {number} page - 页码，从1开始
+   * @returns {Promise}
+   */
+  getPageText: (documentId, page) => {
+    return api.get(`/api/documents/${documentId}/pages/${page}/text`);
+  },
+
+  /**
+   * 获取PDF文档指定页缩略图的URL，可直接用于img标签
+   * @param {number} documentId - 文档ID
+   * @param {number} page - 页码，从1开始
+   * @param {number} width - 缩略图宽度（像素）
+   * @returns {string}
+   */
+  getPageThumbnailUrl: (documentId, page, width = 300) => {
+    return `${API_URL}/api/documents/${documentId}/pages/${page}/thumbnail?width=${width}`;
+  },
   
   /**
    * 分析文献
@@ -86,10 +153,73 @@ export const getAnalysisResult = (documentId) => {
   return api.get(`/api/analysis/${documentId}`);
 };
 
+/**
+ * 重新分析文献
+ * @param {number} documentId - 文档ID
+ * @param {Object} options - { partial, items, overwrite }，partial为true时只重新分析指定项目（默认为被跳过的项目）
+ * @returns {Promise}
+ */
+export const reanalyzeDocument = (documentId, options = {}) => {
+  return api.post(`/api/documents/${documentId}/reanalyze`, options);
+};
+
 export const getAnalysisProgress = (documentId) => {
   return api.get(`/api/analysis/progress/${documentId}`);
 };
 
+/**
+ * 查询与文档疑似重复的已分析文献
+ * @param {number} documentId - 文档ID
+ * @returns {Promise} { has_signature, duplicates: [{ document_id, name, similarity }] }
+ */
+export const getDocumentDuplicates = (documentId) => {
+  return api.get(`/api/documents/${documentId}/duplicates`);
+};
+
+/**
+ * 复用疑似重复文献的分析结果，不再调用AI
+ * @param {number} documentId - 文档ID
+ * @param {number} sourceDocumentId - 来源文档ID，为空时使用相似度最高的文献
+ * @returns {Promise}
+ */
+export const reuseAnalysis = (documentId, sourceDocumentId = null) => {
+  return api.post(`/api/documents/${documentId}/reuse-analysis`, { source_document_id: sourceDocumentId });
+};
+
+/**
+ * 整个文献库的疑似重复报告
+ * @param {number} threshold - 最低相似度，为空时使用服务端默认值
+ * @returns {Promise}
+ */
+export const getDuplicatesReport = (threshold) => {
+  return api.get('/api/duplicates/report', { params: threshold ? { threshold } : {} });
+};
+
+/**
+ * 多文献活性数据对比，服务端完成分组统计和降采样
+ * @param {Object} params - { document_ids, x_axis, y_axis, group_by, width, activity_unit, max_groups }
+ * @returns {Promise}
+ */
+export const compareDocuments = (params) => {
+  return api.post('/api/visualization/compare', params);
+};
+
+/**
+ * 获取导出文件的下载地址，浏览器直接下载流式生成的文件
+ * @param {string} dataset - analyses（每篇文献一行）或 activity（每条活性数据一行）
+ * @param {string} format - csv、ndjson 或 parquet
+ * @param {Object} filters - { categories, yearFrom, yearTo, documentIds }
+ * @returns {string}
+ */
+export const getExportUrl = (dataset, format = 'csv', filters = {}) => {
+  const params = new URLSearchParams({ format });
+  (filters.categories || []).forEach(category => params.append('category', category));
+  (filters.documentIds || []).forEach(id => params.append('document_id', id));
+  if (filters.yearFrom) params.append('year_from', filters.yearFrom);
+  if (filters.yearTo) params.append('year_to', filters.yearTo);
+  return `${API_URL}/api/export/${dataset}?${params.toString()}`;
+};
+
 export const chatWithAI = async (message) => {
   try {
     const response = await fetch(`${API_URL}/api/chat`, {
@@ -0,0 +1,189 @@
+/**
+ * 多路复用进度服务
+ * 通过单个WebSocket连接(/ws/progress)订阅多个文档的分析进度，
+ * 后端按固定间隔推送增量消息，本服务负责合并为完整的进度对象
+ */
+
+const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+let baseUrl;
+try {
+  const apiUrl = new URL(API_URL);
+  baseUrl = `${apiUrl.protocol}//${apiUrl.host}`;
+} catch (e) {
+  baseUrl = API_URL.replace(/(\/api.*$|\/+$)/, '');
+}
+const WS_URL = baseUrl.replace(/^http:/, 'ws:').replace(/^https:/, 'wss:');
+
+class ProgressStreamService {
+  constructor() {
+    this.socket = null;
+    this.isConnected = false;
+    this.progress = {}; // 文档ID -> 完整进度对象
+    this.listeners = new Map(); // 文档ID或'*' -> 回调集合
+    this.subscribedIds = new Set();
+    this.subscribeAll = false;
+    this.reconnectAttempts = 0;
+    this.maxReconnectAttempts = 5;
+    this.reconnectTimeout = null;
+    this.heartbeatInterval = null;
+    this.heartbeatIntervalTime = 60000;
+  }
+
+  /**
+   * 订阅文档进度
+   * @param {Array<number>|'all'} documentIds - 文档ID列表，或'all'表示所有活跃文档
+   * @param {Function} onProgress - 回调 (documentId, progress)
+   * @returns {Function} 取消订阅函数
+   */
+  subscribe(documentIds, onProgress) {
+    const all = documentIds === 'all';
+    const ids = all ? [] : documentIds.map(Number);
+    const keys = all ? ['*'] : ids;
+    keys.forEach(key => {
+      if (!this.listeners.has(key)) {
+        this.listeners.set(key, new Set());
+      }
+      this.listeners.get(key).add(onProgress);
+    });
+    if (all) {
+      this.subscribeAll = true;
+    }
+    ids.forEach(id => this.subscribedIds.add(id));
+
+    this.ensureConnected();
+    this.send({ type: 'subscribe', document_ids: ids, all });
+
+    return () => {
+      const removedIds = [];
+      keys.forEach(key => {
+        const set = this.listeners.get(key);
+        if (set) {
+          set.delete(onProgress);
+          if (set.size === 0) {
+            this.listeners.delete(key);
+            if (key === '*') {
+              this.subscribeAll = false;
+            } else {
+              this.subscribedIds.delete(key);
+              removedIds.push(key);
+            }
+          }
+        }
+      });
+      this.send({ type: 'unsubscribe', document_ids: removedIds, all: all && !this.subscribeAll });
+      if (this.listeners.size === 0) {
+        this.disconnect();
+      }
+    };
+  }
+
+  ensureConnected() {
+    if (this.socket) {
+      return;
+    }
+    this.socket = new WebSocket(`${WS_URL}/ws/progress`);
+
+    this.socket.onopen = () => {
+      this.isConnected = true;
+      this.reconnectAttempts = 0;
+      // 重连后恢复订阅
+      if (this.subscribedIds.size > 0 || this.subscribeAll) {
+        this.send({ type: 'subscribe', document_ids: Array.from(this.subscribedIds), all: this.subscribeAll });
+      }
+      this.heartbeatInterval = setInterval(() => {
+        this.send({ type: 'heartbeat', timestamp: new Date().getTime() });
+      }, this.heartbeatIntervalTime);
+    };
+
+    this.socket.onmessage = (event) => {
+      try {
+        this.handleMessage(JSON.parse(event.data));
+      } catch (error) {
+        console.error('解析进度消息时出错:', error);
+      }
+    };
+
+    this.socket.onclose = () => {
+      this.isConnected = false;
+      this.socket = null;
+      if (this.heartbeatInterval) {
+        clearInterval(this.heartbeatInterval);
+        this.heartbeatInterval = null;
+      }
+      if (this.listeners.size > 0 && this.reconnectAttempts < this.maxReconnectAttempts) {
+        const delay = Math.min(3000 * Math.pow(2, this.reconnectAttempts), 30000) + Math.random() * 1000;
+        this.reconnectAttempts += 1;
+        this.reconnectTimeout = setTimeout(() => this.ensureConnected(), delay);
+      }
+    };
+
+    this.socket.onerror = (event) => {
+      console.error('进度WebSocket连接错误:', event);
+    };
+  }
+
+  send(message) {
+    if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+      this.socket.send(JSON.stringify(message));
+    }
+  }
+
+  handleMessage(data) {
+    if (data.type === 'progress_snapshot') {
+      Object.entries(data.documents || {}).forEach(([id, progress]) => {
+        this.progress[id] = progress;
+        this.notify(id);
+      });
+    } else if (data.type === 'progress_delta') {
+      Object.entries(data.updates || {}).forEach(([id, delta]) => {
+        const current = { ...(this.progress[id] || {}) };
+        Object.assign(current, delta.set || {});
+        Object.entries(delta.append || {}).forEach(([key, items]) => {
+          current[key] = (current[key] || []).concat(items);
+        });
+        this.progress[id] = current;
+        this.notify(id);
+      });
+    }
+  }
+
+  notify(id) {
+    const progress = this.progress[id];
+    const callbacks = [
+      ...(this.listeners.get(Number(id)) || []),
+      ...(this.listeners.get('*') || [])
+    ];
+    callbacks.forEach(callback => callback(Number(id), progress));
+  }
+
+  /**
+   * 获取缓存的文档进度
+   * @param {number} documentId - 文档ID
+   */
+  getProgress(documentId) {
+    return this.progress[documentId] || null;
+  }
+
+  disconnect() {
+    if (this.reconnectTimeout) {
+      clearTimeout(this.reconnectTimeout);
+      this.reconnectTimeout = null;
+    }
+    if (this.socket) {
+      const socket = this.socket;
+      this.socket = null;
+      socket.onclose = null;
+      socket.close(1000, '客户端主动断开连接');
+    }
+    if (this.heartbeatInterval) {
+      clearInterval(this.heartbeatInterval);
+      this.heartbeatInterval = null;
+    }
+    this.isConnected = false;
+  }
+}
+
+// 创建单例实例
+const progressStreamService = new ProgressStreamService();
+
+export default progressStreamService;